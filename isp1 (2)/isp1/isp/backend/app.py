@@ -1,64 +1,597 @@
 # app.py
+import base64
+import bisect
+import contextvars
+import csv
+import io
+import itertools
+import json
+import math
 import os
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+import pathlib
+import queue
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import click
+from flask import Flask, Response, render_template, request, redirect, url_for, session, flash, jsonify, g
+from flask import before_render_template, template_rendered
+from markupsafe import Markup, escape
 import sqlite3
-from datetime import datetime
-import numpy as np # For numerical operations (e.g., mean)
+from datetime import datetime, timedelta
 
 app = Flask(__name__)
 app.secret_key = 'your_super_secret_key' # IMPORTANT: Replace with a strong, random key in production!
 
 DATABASE = 'database.db'
 
-# --- Database Initialization ---
-def init_db():
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
+# --- Database Connection Layer ---
+# Each request checks out at most one pooled connection (stored on flask.g) and hands it
+# back on teardown -- plus one from the analytics pool if it runs reports (see Analytics Read
+# Path). Connections are opened in WAL mode so readers don't block writers.
+DB_POOL_SIZE = 16 # Max connections checked out at once; further requests wait
+DB_POOL_TIMEOUT = 30 # Seconds to wait for a free connection before giving up
+DB_BUSY_TIMEOUT_MS = 5000 # How long SQLite retries on a locked database
+DB_CACHE_SIZE_KB = 20000 # Page cache per connection (~20 MB)
+DB_MMAP_SIZE = 256 * 1024 * 1024 # Memory-mapped I/O window
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection that remembers which database file it was opened on. Its cursors
+    and commits report to the current request's RequestStats (see Request Instrumentation)."""
+    database = None
+    pool_target = None # What ConnectionPool opened it for
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or InstrumentedCursor)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        stats = _request_stats.get()
+        if stats is None:
+            return super().commit()
+        started = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            stats.record_commit(time.perf_counter() - started)
+
+class ConnectionPool:
+    """Up to `size` connections checked out at once; idle ones are kept for reuse. `target()`
+    names the file connections should be open on and `opener(target)` opens one; idle
+    connections opened for another target (a repointed or replaced file) are closed."""
+
+    def __init__(self, size, opener, target):
+        self.size, self.opener, self.target = size, opener, target
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._stats = {
+            'checkouts': 0,
+            'connections_opened': 0,
+            'connections_reused': 0,
+            'connections_in_use': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+        }
 
-    # --- IMPORTANT DEVELOPMENT TIP: To reset your database schema during development ---
-    # If you add new columns or change table structures, your existing database.db
-    # might not update automatically due to 'CREATE TABLE IF NOT EXISTS'.
-    # To force a schema update and resolve "no such column" errors:
-    # 1. STOP your Flask application (if running).
-    # 2. MANUALLY DELETE the 'database.db' file from your 'backend' directory.
-    #    (e.g., in your file explorer, navigate to C:\Users\ADMIN\Documents\isp\backend\ and delete database.db)
-    # 3. RESTART your Flask application. The init_db() function will then create a fresh database.
-    #    You should see "Creating new database..." in your console.
-    # Alternatively, for quick resets (use with caution as it deletes all data):
-    # cursor.execute("DROP TABLE IF EXISTS feedback")
-    # cursor.execute("DROP TABLE IF EXISTS tasks")
-    # cursor.execute("DROP TABLE IF EXISTS attendance")
-    # cursor.execute("DROP TABLE IF EXISTS students")
-    # cursor.execute("DROP TABLE IF EXISTS courses")
-    # cursor.execute("DROP TABLE IF EXISTS users")
-    # cursor.execute("DROP TABLE IF EXISTS behaviour_ratings")
-    # cursor.execute("DROP TABLE IF EXISTS student_feedback_to_admin") # New table to drop
-
-
-    # Check if database file exists to print appropriate message
-    if not os.path.exists(DATABASE):
-        print("Creating new database...")
-    else:
-        print("Database already exists, checking schema...")
+    def checkout(self):
+        """Takes an idle connection, opening one if none is idle. Blocks while `size`
+        connections are already checked out."""
+        wait_started = time.perf_counter()
+        if not self._slots.acquire(timeout=DB_POOL_TIMEOUT):
+            raise sqlite3.OperationalError('Timed out waiting for a database connection')
+        waited = time.perf_counter() - wait_started
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.db_wait += waited
+
+        conn = None
+        try:
+            target = self.target()
+            while conn is None:
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                if conn.pool_target != target: # Repointed or replaced; drop stale connections
+                    conn.close()
+                    conn = None
+            reused = conn is not None
+            if not reused:
+                conn = self.opener(target)
+                conn.pool_target = target
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._stats['checkouts'] += 1
+            self._stats['connections_reused' if reused else 'connections_opened'] += 1
+            self._stats['connections_in_use'] += 1
+            self._stats['wait_time_total'] += waited
+            self._stats['wait_time_max'] = max(self._stats['wait_time_max'], waited)
+        return conn
+
+    def release(self, conn):
+        """Returns a connection to the pool, rolling back anything left uncommitted."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+        except sqlite3.Error:
+            conn.close()
+        finally:
+            with self._lock:
+                self._stats['connections_in_use'] -= 1
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['connections_idle'] = self._idle.qsize()
+        stats['pool_size'] = self.size
+        stats['wait_time_avg'] = stats['wait_time_total'] / stats['checkouts'] if stats['checkouts'] else 0.0
+        return stats
+
+def open_db_connection(database=None):
+    """Opens a new connection with the tuned pragmas used throughout the app."""
+    conn = sqlite3.connect(database or DATABASE, timeout=DB_BUSY_TIMEOUT_MS / 1000.0,
+                           factory=PooledConnection, check_same_thread=False)
+    conn.database = database or DATABASE
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA synchronous = NORMAL") # Safe with WAL; skips an fsync per commit
+    conn.execute(f"PRAGMA cache_size = -{DB_CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
+db_pool = ConnectionPool(DB_POOL_SIZE, open_db_connection, lambda: DATABASE)
+
+def checkout_db_connection():
+    return db_pool.checkout()
+
+def release_db_connection(conn):
+    db_pool.release(conn)
+
+def get_db():
+    """Returns the connection for the current request/app context."""
+    if 'db' not in g:
+        g.db = checkout_db_connection()
+    return g.db
+
+@app.teardown_appcontext
+def close_db(exception):
+    conn = g.pop('db', None)
+    if conn is not None:
+        release_db_connection(conn)
+    conn = g.pop('analytics_db', None)
+    if conn is not None:
+        analytics_pool.release(conn)
+
+def get_db_pool_stats():
+    return {**db_pool.stats(), 'analytics': analytics_pool.stats()}
+
+# --- Analytics Read Path ---
+# Reports (performance overview, exports, predictions, rankings, scenarios, score history)
+# read through get_analytics_db(): read-only connections (URI mode=ro plus query_only) from
+# their own ANALYTICS_POOL_SIZE pool, so a burst of reports can't hold the connections that
+# attendance and grading writes check out. All of a request's report queries run in one read
+# transaction, i.e. on one consistent WAL snapshot, while writers keep appending to the WAL.
+# With ANALYTICS_REPLICA set, reports read a copy of the database instead, taken with the
+# online backup API and swapped in with os.replace once older than ANALYTICS_REPLICA_MAX_AGE
+# (in a background thread; the live file is read until the first copy exists), so long
+# scans don't hold back checkpoints of the live WAL either.
+
+ANALYTICS_READS = os.environ.get('ANALYTICS_READS', '1') != '0' # '0' sends reports through get_db() again
+ANALYTICS_POOL_SIZE = int(os.environ.get('ANALYTICS_POOL_SIZE', 4))
+ANALYTICS_REPLICA = os.environ.get('ANALYTICS_REPLICA') or None # Replica file path; unset reads the live file
+ANALYTICS_REPLICA_MAX_AGE = float(os.environ.get('ANALYTICS_REPLICA_MAX_AGE', 300)) # Seconds
+
+_replica_refresh_lock = threading.Lock() # Held while this process copies the replica
+
+def open_analytics_connection(target):
+    """Read-only connection for a (path, inode) target from analytics_target()."""
+    database = target[0]
+    conn = sqlite3.connect(pathlib.Path(database).resolve().as_uri() + '?mode=ro', uri=True,
+                           timeout=DB_BUSY_TIMEOUT_MS / 1000.0, factory=PooledConnection, check_same_thread=False)
+    conn.database = database
+    conn.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA query_only = ON")
+    conn.execute(f"PRAGMA cache_size = -{DB_CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
+def refresh_analytics_replica(replica=None, database=None):
+    """Copies the live database to the replica file and swaps it in atomically. Returns the
+    seconds taken. Connections to the previous copy keep reading it until released."""
+    replica = replica or ANALYTICS_REPLICA
+    started = time.perf_counter()
+    temporary = f'{replica}.{os.getpid()}.tmp'
+    source = open_db_connection(database or DATABASE)
+    copy = sqlite3.connect(temporary)
+    try:
+        # In one step: the copy is one WAL read, which never blocks writers, whereas a stepped
+        # backup starts over whenever another connection writes between steps
+        source.backup(copy)
+        copy.execute("PRAGMA journal_mode = DELETE") # Read-only opens then need no -shm file
+    finally:
+        copy.close()
+        source.close()
+    os.replace(temporary, replica)
+    return time.perf_counter() - started
+
+def _refresh_replica_in_background():
+    if not _replica_refresh_lock.acquire(blocking=False):
+        return # Already refreshing
+
+    def run():
+        try:
+            refresh_analytics_replica()
+        except (sqlite3.Error, OSError) as e:
+            app.logger.warning('Analytics replica refresh failed: %s', e)
+        finally:
+            _replica_refresh_lock.release()
+    threading.Thread(target=run, name='analytics-replica', daemon=True).start()
 
+def analytics_target():
+    """(path, inode) of the file reports should read: the replica when configured and present
+    (starting a background refresh once it is stale), else the live database."""
+    if ANALYTICS_REPLICA:
+        try:
+            replica = os.stat(ANALYTICS_REPLICA)
+        except FileNotFoundError:
+            replica = None
+        if replica is None or time.time() - replica.st_mtime > ANALYTICS_REPLICA_MAX_AGE:
+            _refresh_replica_in_background()
+        if replica is not None:
+            return ANALYTICS_REPLICA, replica.st_ino
+    return DATABASE, None
+
+analytics_pool = ConnectionPool(ANALYTICS_POOL_SIZE, open_analytics_connection, analytics_target)
+
+def get_analytics_db():
+    """Read-only connection for the current request's report queries (see above); get_db()
+    when ANALYTICS_READS is off."""
+    if not ANALYTICS_READS:
+        return get_db()
+    if 'analytics_db' not in g:
+        conn = analytics_pool.checkout()
+        conn.execute("BEGIN") # Every report query in this request reads the same snapshot
+        g.analytics_db = conn
+    return g.analytics_db
+
+@app.cli.command('refresh-replica')
+def refresh_replica_command():
+    """Copy the database to ANALYTICS_REPLICA now (e.g. from cron)."""
+    if not ANALYTICS_REPLICA:
+        raise click.UsageError('Set ANALYTICS_REPLICA to the replica file path first.')
+    click.echo(f'Replica {ANALYTICS_REPLICA} refreshed in {refresh_analytics_replica():.2f}s.')
+
+# --- Request Instrumentation ---
+# Every request gets a RequestStats collector (held in a context variable so pooled
+# connections can find it without being passed around). Cursors add each statement's time,
+# fetched rows and the slowest statement to it; template renders are timed through Flask's
+# signals. On teardown the request is folded into per-endpoint sample windows that
+# /admin/metrics reports as Prometheus summaries (p50/p95/p99), and requests over budget
+# are logged. Queries run outside a request (CLI commands, streamed exports) aren't counted.
+METRICS_WINDOW = 1024 # Most recent requests per endpoint used for the quantiles
+METRICS_QUANTILES = (0.5, 0.95, 0.99)
+REQUEST_BUDGET_MS = float(os.environ.get('REQUEST_BUDGET_MS', 500)) # Log slower requests; 0 disables
+REQUEST_QUERY_BUDGET = int(os.environ.get('REQUEST_QUERY_BUDGET', 100)) # Log chattier requests; 0 disables
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN') # Lets a scraper read /admin/metrics without a session
+
+# (metric name, help text, RequestStats attribute) -- one summary per entry and endpoint
+REQUEST_METRICS = (
+    ('request_duration_seconds', 'Total request latency.', 'duration'),
+    ('sql_queries', 'SQL statements executed per request.', 'queries'),
+    ('sql_duration_seconds', 'Time spent in SQL per request.', 'sql_time'),
+    ('sql_rows', 'Rows fetched per request.', 'rows'),
+    ('sql_slowest_statement_seconds', 'Slowest single SQL statement per request.', 'slowest_time'),
+    ('template_duration_seconds', 'Template render time per request.', 'template_time'),
+    ('sql_write_duration_seconds', 'Time in write statements and commits per request, including waits for the write lock.',
+     'write_time'),
+    ('db_connection_wait_seconds', 'Time waiting for a pooled connection per request.', 'db_wait'),
+)
+READ_STATEMENTS = ('SELECT', 'WITH', 'PRAGMA', 'EXPLAIN', 'VALUES', 'BEGIN') # Anything else counts as a write
+
+_request_stats = contextvars.ContextVar('request_stats', default=None)
+
+class RequestStats:
+    """What one request spent on SQL and templates."""
+    __slots__ = ('started', 'queries', 'sql_time', 'rows', 'slowest_time', 'slowest_sql',
+                 'template_time', 'template_started', 'duration', 'status', 'write_time', 'db_wait')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = self.rows = 0
+        self.sql_time = self.slowest_time = self.template_time = self.duration = 0.0
+        self.write_time = self.db_wait = 0.0
+        self.slowest_sql = None
+        self.template_started = []
+        self.status = 500 # Overwritten by after_request unless the view raised
+
+    def record_statement(self, sql, elapsed):
+        self.queries += 1
+        self.sql_time += elapsed
+        if elapsed > self.slowest_time:
+            self.slowest_time, self.slowest_sql = elapsed, sql
+        if not sql.lstrip()[:7].upper().startswith(READ_STATEMENTS):
+            self.write_time += elapsed
+
+    def record_commit(self, elapsed):
+        self.sql_time += elapsed
+        self.write_time += elapsed
+
+    def record_fetch(self, rows, elapsed):
+        self.rows += rows
+        self.sql_time += elapsed
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that reports statements and fetched rows to the current RequestStats."""
+
+    def execute(self, sql, parameters=()):
+        stats = _request_stats.get()
+        if stats is None:
+            return super().execute(sql, parameters)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            stats.record_statement(sql, time.perf_counter() - started)
 
-    # Create tables if they don't exist
-    cursor.execute('''
+    def executemany(self, sql, seq_of_parameters):
+        stats = _request_stats.get()
+        if stats is None:
+            return super().executemany(sql, seq_of_parameters)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            stats.record_statement(sql, time.perf_counter() - started)
+
+    def fetchone(self):
+        stats = _request_stats.get()
+        if stats is None:
+            return super().fetchone()
+        started = time.perf_counter()
+        row = super().fetchone()
+        stats.record_fetch(row is not None, time.perf_counter() - started)
+        return row
+
+    def fetchmany(self, size=None):
+        stats = _request_stats.get()
+        if stats is None:
+            return super().fetchmany(self.arraysize if size is None else size)
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        stats.record_fetch(len(rows), time.perf_counter() - started)
+        return rows
+
+    def fetchall(self):
+        stats = _request_stats.get()
+        if stats is None:
+            return super().fetchall()
+        started = time.perf_counter()
+        rows = super().fetchall()
+        stats.record_fetch(len(rows), time.perf_counter() - started)
+        return rows
+
+    def __next__(self):
+        stats = _request_stats.get()
+        if stats is None:
+            return super().__next__()
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        finally:
+            stats.sql_time += time.perf_counter() - started
+        stats.rows += 1
+        return row
+
+class EndpointMetrics:
+    """Lifetime totals plus a window of recent samples for one endpoint."""
+
+    def __init__(self):
+        self.samples = {attr: deque(maxlen=METRICS_WINDOW) for _, _, attr in REQUEST_METRICS}
+        self.sums = dict.fromkeys(self.samples, 0.0)
+        self.count = 0
+        self.statuses = {}
+
+    def add(self, stats):
+        for attr, window in self.samples.items():
+            value = getattr(stats, attr)
+            self.sums[attr] += value
+            window.append(value)
+        self.count += 1
+        self.statuses[stats.status] = self.statuses.get(stats.status, 0) + 1
+
+_endpoint_metrics = {}
+_endpoint_metrics_lock = threading.Lock()
+
+def _quantile(sorted_values, q):
+    """Nearest-rank quantile of an already sorted list."""
+    return sorted_values[max(0, math.ceil(q * len(sorted_values)) - 1)]
+
+def _prometheus_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def render_prometheus_metrics():
+    """Formats the per-endpoint request metrics in the Prometheus text exposition format."""
+    with _endpoint_metrics_lock:
+        snapshot = {endpoint: (dict(m.statuses), m.count, dict(m.sums),
+                               {attr: sorted(window) for attr, window in m.samples.items()})
+                    for endpoint, m in sorted(_endpoint_metrics.items())}
+
+    lines = ['# HELP isp_requests_total Requests handled, by endpoint and HTTP status.',
+             '# TYPE isp_requests_total counter']
+    for endpoint, (statuses, _, _, _) in snapshot.items():
+        for status, count in sorted(statuses.items()):
+            lines.append(f'isp_requests_total{{endpoint="{_prometheus_label(endpoint)}",status="{status}"}} {count}')
+    for name, help_text, attr in REQUEST_METRICS:
+        lines += [f'# HELP isp_{name} {help_text}', f'# TYPE isp_{name} summary']
+        for endpoint, (_, count, sums, samples) in snapshot.items():
+            label = f'endpoint="{_prometheus_label(endpoint)}"'
+            for q in METRICS_QUANTILES:
+                lines.append(f'isp_{name}{{{label},quantile="{q}"}} {_quantile(samples[attr], q):.6g}')
+            lines.append(f'isp_{name}_sum{{{label}}} {sums[attr]:.6g}')
+            lines.append(f'isp_{name}_count{{{label}}} {count}')
+    return '\n'.join(lines) + '\n'
+
+def reset_request_metrics():
+    with _endpoint_metrics_lock:
+        _endpoint_metrics.clear()
+
+def _log_if_over_budget(endpoint, stats):
+    over_time = REQUEST_BUDGET_MS and stats.duration * 1000 > REQUEST_BUDGET_MS
+    over_queries = REQUEST_QUERY_BUDGET and stats.queries > REQUEST_QUERY_BUDGET
+    if not (over_time or over_queries):
+        return
+    slowest = ' '.join((stats.slowest_sql or '').split())[:200]
+    app.logger.warning('Request over budget: %s %s (%s) took %.1f ms -- %d queries, %.1f ms SQL, '
+                       '%d rows, %.1f ms templates; slowest statement %.1f ms: %s',
+                       request.method, request.path, endpoint, stats.duration * 1000, stats.queries,
+                       stats.sql_time * 1000, stats.rows, stats.template_time * 1000,
+                       stats.slowest_time * 1000, slowest)
+
+@app.before_request
+def start_request_stats():
+    stats = RequestStats()
+    g.request_stats = stats
+    g.request_stats_token = _request_stats.set(stats)
+
+@app.after_request
+def record_response_status(response):
+    stats = g.get('request_stats')
+    if stats is not None:
+        stats.status = response.status_code
+    return response
+
+@app.teardown_request
+def finish_request_stats(exception):
+    stats = g.pop('request_stats', None)
+    token = g.pop('request_stats_token', None)
+    if stats is None:
+        return
+    try:
+        _request_stats.reset(token)
+    except ValueError: # Teardown ran in a different context than before_request
+        _request_stats.set(None)
+    stats.duration = time.perf_counter() - stats.started
+    endpoint = request.endpoint or 'unmatched' # 404s share one series rather than one per path
+    with _endpoint_metrics_lock:
+        metrics = _endpoint_metrics.get(endpoint)
+        if metrics is None:
+            metrics = _endpoint_metrics[endpoint] = EndpointMetrics()
+        metrics.add(stats)
+    _log_if_over_budget(endpoint, stats)
+
+@before_render_template.connect_via(app)
+def _template_render_started(sender, template, context, **extra):
+    stats = g.get('request_stats')
+    if stats is not None:
+        stats.template_started.append(time.perf_counter())
+
+@template_rendered.connect_via(app)
+def _template_render_finished(sender, template, context, **extra):
+    stats = g.get('request_stats')
+    if stats is not None and stats.template_started:
+        stats.template_time += time.perf_counter() - stats.template_started.pop()
+
+# --- Schema Migrations ---
+# Each entry is (description, [SQL statements or callables taking the connection]); its position in the list is its schema
+# version. init_db() applies every migration newer than the database's PRAGMA user_version
+# in its own transaction, so schema changes never require deleting database.db. Only ever
+# append new migrations -- never edit one that has shipped.
+
+# What one row of each table adds to its student's student_daily_metrics row for that day:
+# table -> (day expression, {counter: value expression}, columns whose update moves it).
+# {row} becomes NEW or OLD; the expressions must never be NULL. Tasks are placed on their due
+# date (there is no completion date).
+DAILY_METRIC_SOURCES = {
+    'attendance': ('date({row}.date)', {
+        'attendance_total': '1',
+        'attendance_present': "{row}.status = 'present'",
+    }, 'student_id, date, status'),
+    'tasks': ('date({row}.due_date)', {
+        'marked_tasks': "CASE WHEN {row}.status = 'completed' AND {row}.mark IS NOT NULL THEN 1 ELSE 0 END",
+        'completed_mark_sum': "CASE WHEN {row}.status = 'completed' THEN COALESCE({row}.mark, 0) ELSE 0 END",
+    }, 'student_id, due_date, status, mark'),
+    'behaviour_ratings': ('date({row}.date)', {
+        'behaviour_count': '1',
+        'behaviour_sum': '{row}.rating',
+    }, 'student_id, date, rating'),
+    'feedback': ('date({row}.feedback_date)', {
+        'feedback_count': "CASE WHEN {row}.feedback_category IN ('Poor', 'Average', 'Good', 'Excellent') THEN 1 ELSE 0 END",
+        'feedback_sum': "CASE {row}.feedback_category WHEN 'Average' THEN 1 WHEN 'Good' THEN 2 WHEN 'Excellent' THEN 3 ELSE 0 END",
+    }, 'student_id, feedback_date, feedback_category'),
+}
+
+def _daily_metrics_upsert(table, row, sign):
+    """SQL adding (sign '+') or removing (sign '-') one row's contribution to student_daily_metrics."""
+    day, values, _ = DAILY_METRIC_SOURCES[table]
+    day = day.format(row=row)
+    columns = ', '.join(values)
+    expressions = ', '.join(f'{sign}({value.format(row=row)})' for value in values.values())
+    updates = ', '.join(f'{name} = {name} + excluded.{name}' for name in values)
+    return f'''
+            INSERT INTO student_daily_metrics (student_id, day, {columns})
+            SELECT {row}.student_id, {day}, {expressions} WHERE {day} IS NOT NULL
+            ON CONFLICT (student_id, day) DO UPDATE SET {updates};'''
+
+def _daily_metrics_triggers(table):
+    _, _, watched = DAILY_METRIC_SOURCES[table]
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {table}_daily_insert AFTER INSERT ON {table} BEGIN"
+        f"{_daily_metrics_upsert(table, 'new', '+')}\n        END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_daily_delete AFTER DELETE ON {table} BEGIN"
+        f"{_daily_metrics_upsert(table, 'old', '-')}\n        END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_daily_update AFTER UPDATE OF {watched} ON {table} BEGIN"
+        f"{_daily_metrics_upsert(table, 'old', '-')}{_daily_metrics_upsert(table, 'new', '+')}\n        END",
+    ]
+
+# Changes that can move a student's overall score: table -> [(event, students affected)].
+# Each records the students in score_changes with a new, higher seq (see get_student_rankings).
+SCORE_CHANGE_SOURCES = {
+    'student_metrics': [('INSERT', 'SELECT NEW.student_id AS student_id'), ('UPDATE', 'SELECT NEW.student_id AS student_id')],
+    'students': [('INSERT', 'SELECT NEW.id AS student_id'), ('UPDATE OF course_id', 'SELECT NEW.id AS student_id')],
+    'courses': [('UPDATE OF total_expected_tasks', 'SELECT id AS student_id FROM students WHERE course_id = NEW.id')],
+}
+
+def _score_change_triggers(table):
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {table}_score_change_{event.split()[0].lower()} AFTER {event} ON {table} BEGIN\n"
+        f"            INSERT OR REPLACE INTO score_changes (student_id, seq)\n"
+        f"            SELECT affected.student_id, (SELECT COALESCE(MAX(seq), 0) + 1 FROM score_changes)\n"
+        f"            FROM ({students}) AS affected;\n        END"
+        for event, students in SCORE_CHANGE_SOURCES[table]
+    ]
+
+SCHEMA_MIGRATIONS = [
+    ('Base schema', [
+        '''
         CREATE TABLE IF NOT EXISTS users (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             username TEXT UNIQUE NOT NULL,
             password TEXT NOT NULL,
             role TEXT NOT NULL
         )
-    ''')
-    cursor.execute('''
+        ''',
+        '''
         CREATE TABLE IF NOT EXISTS courses (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             name TEXT UNIQUE NOT NULL,
             total_expected_tasks INTEGER DEFAULT 10 -- New: For course completion calculation
         )
-    ''')
-    cursor.execute('''
+        ''',
+        '''
         CREATE TABLE IF NOT EXISTS students (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             unique_student_id TEXT UNIQUE NOT NULL, -- e.g., INT001, for display and internal reference
@@ -69,8 +602,8 @@ def init_db():
             FOREIGN KEY (course_id) REFERENCES courses(id),
             FOREIGN KEY (user_id) REFERENCES users(id)
         )
-    ''')
-    cursor.execute('''
+        ''',
+        '''
         CREATE TABLE IF NOT EXISTS tasks (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             student_id INTEGER NOT NULL, -- FK to students.id
@@ -83,8 +616,8 @@ def init_db():
             FOREIGN KEY (student_id) REFERENCES students(id),
             FOREIGN KEY (course_id) REFERENCES courses(id)
         )
-    ''')
-    cursor.execute('''
+        ''',
+        '''
         CREATE TABLE IF NOT EXISTS attendance (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             student_id INTEGER NOT NULL, -- FK to students.id
@@ -93,8 +626,8 @@ def init_db():
             FOREIGN KEY (student_id) REFERENCES students(id),
             UNIQUE(student_id, date) -- Ensure only one attendance record per student per day
         )
-    ''')
-    cursor.execute('''
+        ''',
+        '''
         CREATE TABLE IF NOT EXISTS feedback (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             task_id INTEGER, -- Can be NULL if general feedback
@@ -108,8 +641,8 @@ def init_db():
             FOREIGN KEY (student_id) REFERENCES students(id),
             FOREIGN KEY (admin_id) REFERENCES users(id)
         )
-    ''')
-    cursor.execute('''
+        ''',
+        '''
         CREATE TABLE IF NOT EXISTS behaviour_ratings (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             student_id INTEGER NOT NULL,
@@ -120,9 +653,8 @@ def init_db():
             FOREIGN KEY (admin_id) REFERENCES users(id),
             UNIQUE(student_id, date) -- One behaviour rating per student per day
         )
-    ''')
-    # NEW TABLE: For student feedback to admin
-    cursor.execute('''
+        ''',
+        '''
         CREATE TABLE IF NOT EXISTS student_feedback_to_admin (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             student_id INTEGER NOT NULL, -- FK to students.id
@@ -131,106 +663,323 @@ def init_db():
             timestamp TEXT NOT NULL, -- YYYY-MM-DD HH:MM:SS
             FOREIGN KEY (student_id) REFERENCES students(id)
         )
-    ''')
-    
-    # Add some initial data (for testing)
-    cursor.execute("INSERT OR IGNORE INTO users (username, password, role) VALUES (?, ?, ?)", ('admin', 'adminpass', 'admin'))
-    
-    # If 'intern1' user doesn't exist, create it and a corresponding student entry
-    cursor.execute("SELECT id FROM users WHERE username = 'intern1'")
-    intern1_user_id = cursor.fetchone()
-    if not intern1_user_id:
-        cursor.execute("INSERT INTO users (username, password, role) VALUES (?, ?, ?)", ('intern1', 'internpass', 'intern'))
-        intern1_user_id = cursor.lastrowid
-        cursor.execute("INSERT INTO students (unique_student_id, name, email, user_id) VALUES (?, ?, ?, ?)",
-                       ('INT001', 'Intern One', 'intern1@example.com', intern1_user_id))
-    
-    # Add sample courses if they don't exist, with total_expected_tasks
-    cursor.execute("INSERT OR IGNORE INTO courses (name, total_expected_tasks) VALUES (?, ?)", ('Web Development Basics', 10))
-    cursor.execute("INSERT OR IGNORE INTO courses (name, total_expected_tasks) VALUES (?, ?)", ('Data Science Fundamentals', 8))
-    cursor.execute("INSERT OR IGNORE INTO courses (name, total_expected_tasks) VALUES (?, ?)", ('Mobile App Development', 12))
-    cursor.execute("INSERT OR IGNORE INTO courses (name, total_expected_tasks) VALUES (?, ?)", ('Cloud Computing Essentials', 7))
-    cursor.execute("INSERT OR IGNORE INTO courses (name, total_expected_tasks) VALUES (?, ?)", ('Cybersecurity Basics', 9))
-    
-    # Get course IDs for sample tasks
-    cursor.execute("SELECT id FROM courses WHERE name = 'Web Development Basics'")
-    web_dev_course_id = cursor.fetchone()[0]
-    cursor.execute("SELECT id FROM courses WHERE name = 'Data Science Fundamentals'")
-    data_science_course_id = cursor.fetchone()[0]
-
-    # Update Intern One to be assigned to 'Web Development Basics'
-    cursor.execute("SELECT id FROM students WHERE unique_student_id = 'INT001'")
-    int001_student_id = cursor.fetchone()
-    if int001_student_id:
-        int001_student_id = int001_student_id[0]
-        cursor.execute("UPDATE students SET course_id = ? WHERE id = ?", (web_dev_course_id, int001_student_id))
-        
-        # Add sample tasks for Intern One if they don't exist, linked to course
-        cursor.execute("SELECT id FROM tasks WHERE student_id = ? AND title = ?", (int001_student_id, 'Complete Flask Tutorial'))
-        if not cursor.fetchone():
-            cursor.execute("INSERT INTO tasks (student_id, course_id, title, description, due_date, status, mark) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                           (int001_student_id, web_dev_course_id, 'Complete Flask Tutorial', 'completed', '2025-08-10', 'completed', 90)) # Marked completed with a mark
-        
-        cursor.execute("SELECT id FROM tasks WHERE student_id = ? AND title = ?", (int001_student_id, 'Research ML Models'))
-        if not cursor.fetchone():
-            cursor.execute("INSERT INTO tasks (student_id, course_id, title, description, due_date, status, mark) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                           (int001_student_id, web_dev_course_id, 'Research ML Models', 'Research different ML models for performance prediction.', '2025-08-05', 'completed', 85)) # Marked completed with a mark
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS student_metrics (
+            student_id INTEGER PRIMARY KEY, -- FK to students.id
+            attendance_total INTEGER NOT NULL DEFAULT 0,
+            attendance_present INTEGER NOT NULL DEFAULT 0,
+            tasks_total INTEGER NOT NULL DEFAULT 0,
+            completed_tasks INTEGER NOT NULL DEFAULT 0,
+            marked_tasks INTEGER NOT NULL DEFAULT 0, -- completed tasks with a non-NULL mark
+            completed_mark_sum REAL NOT NULL DEFAULT 0,
+            completed_in_course INTEGER NOT NULL DEFAULT 0, -- completed tasks of the student's own course
+            behaviour_count INTEGER NOT NULL DEFAULT 0,
+            behaviour_sum INTEGER NOT NULL DEFAULT 0,
+            feedback_count INTEGER NOT NULL DEFAULT 0,
+            feedback_sum INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY (student_id) REFERENCES students(id)
+        )
+        ''',
+    ]),
+    ('Covering indexes for hot queries', [
+        # tasks WHERE student_id = ? AND status = 'completed' -> AVG(mark), COUNT(*) per course
+        "CREATE INDEX IF NOT EXISTS idx_tasks_student_status ON tasks (student_id, status, course_id, mark)",
+        # tasks WHERE status = 'pending' ORDER BY due_date (pending/complete task lists, dashboard count)
+        "CREATE INDEX IF NOT EXISTS idx_tasks_status_due ON tasks (status, due_date, student_id)",
+        # attendance WHERE date = ? AND status = ? (dashboard counts)
+        "CREATE INDEX IF NOT EXISTS idx_attendance_date_status ON attendance (date, status)",
+        # attendance WHERE student_id = ? [AND date = ?] -> status (rates, roster join, intern history)
+        "CREATE INDEX IF NOT EXISTS idx_attendance_student_date_status ON attendance (student_id, date, status)",
+        # feedback WHERE student_id = ? -> feedback_category, ORDER BY feedback_date
+        "CREATE INDEX IF NOT EXISTS idx_feedback_student_date ON feedback (student_id, feedback_date, feedback_category)",
+        # behaviour_ratings WHERE student_id = ? -> AVG(rating)
+        "CREATE INDEX IF NOT EXISTS idx_behaviour_student_rating ON behaviour_ratings (student_id, rating)",
+        # student_feedback_to_admin ORDER BY timestamp DESC
+        "CREATE INDEX IF NOT EXISTS idx_student_feedback_timestamp ON student_feedback_to_admin (timestamp)",
+        # students ORDER BY name (student list, attendance roster, dropdowns); students.user_id
+        # and unique_student_id lookups already use their UNIQUE constraint indexes
+        "CREATE INDEX IF NOT EXISTS idx_students_name ON students (name, unique_student_id)",
+        "ANALYZE",
+    ]),
+    ('Backfill student_metrics', [
+        # data_version only exists from migration 4 on
+        lambda conn: rebuild_student_metrics(conn, commit=False, bump_versions=False),
+    ]),
+    ('Per-student data_version for cache invalidation', [
+        "ALTER TABLE student_metrics ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0",
+    ]),
+    ('Full-text search over feedback and intern messages', [
+        # External-content FTS5 tables: the text lives only in the base tables. The 2/3-character
+        # prefix indexes speed up word* searches
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS feedback_fts USING fts5(
+            comments, content='feedback', content_rowid='id', tokenize='porter unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+        ''',
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS student_feedback_fts USING fts5(
+            subject, message, content='student_feedback_to_admin', content_rowid='id',
+            tokenize='porter unicode61 remove_diacritics 2', prefix='2 3'
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS feedback_fts_insert AFTER INSERT ON feedback BEGIN
+            INSERT INTO feedback_fts (rowid, comments) VALUES (new.id, new.comments);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS feedback_fts_delete AFTER DELETE ON feedback BEGIN
+            INSERT INTO feedback_fts (feedback_fts, rowid, comments) VALUES ('delete', old.id, old.comments);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS feedback_fts_update AFTER UPDATE OF comments ON feedback BEGIN
+            INSERT INTO feedback_fts (feedback_fts, rowid, comments) VALUES ('delete', old.id, old.comments);
+            INSERT INTO feedback_fts (rowid, comments) VALUES (new.id, new.comments);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS student_feedback_fts_insert AFTER INSERT ON student_feedback_to_admin BEGIN
+            INSERT INTO student_feedback_fts (rowid, subject, message) VALUES (new.id, new.subject, new.message);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS student_feedback_fts_delete AFTER DELETE ON student_feedback_to_admin BEGIN
+            INSERT INTO student_feedback_fts (student_feedback_fts, rowid, subject, message)
+            VALUES ('delete', old.id, old.subject, old.message);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS student_feedback_fts_update AFTER UPDATE OF subject, message ON student_feedback_to_admin BEGIN
+            INSERT INTO student_feedback_fts (student_feedback_fts, rowid, subject, message)
+            VALUES ('delete', old.id, old.subject, old.message);
+            INSERT INTO student_feedback_fts (rowid, subject, message) VALUES (new.id, new.subject, new.message);
+        END
+        ''',
+        # student_feedback_to_admin WHERE student_id = ? (search filtered by student)
+        "CREATE INDEX IF NOT EXISTS idx_student_feedback_student ON student_feedback_to_admin (student_id, timestamp)",
+        # Index the rows that existed before the triggers
+        "INSERT INTO feedback_fts (feedback_fts) VALUES ('rebuild')",
+        "INSERT INTO student_feedback_fts (student_feedback_fts) VALUES ('rebuild')",
+    ]),
+    ('Per-student daily pre-aggregates for rolling score windows', [
+        # One row per student and day with activity, kept current by the triggers below, so a
+        # score window reads at most (days in window) rows per student
+        '''
+        CREATE TABLE IF NOT EXISTS student_daily_metrics (
+            student_id INTEGER NOT NULL, -- FK to students.id
+            day TEXT NOT NULL, -- YYYY-MM-DD
+            attendance_total INTEGER NOT NULL DEFAULT 0,
+            attendance_present INTEGER NOT NULL DEFAULT 0,
+            marked_tasks INTEGER NOT NULL DEFAULT 0, -- completed tasks with a mark, by due date
+            completed_mark_sum REAL NOT NULL DEFAULT 0,
+            behaviour_count INTEGER NOT NULL DEFAULT 0,
+            behaviour_sum INTEGER NOT NULL DEFAULT 0,
+            feedback_count INTEGER NOT NULL DEFAULT 0,
+            feedback_sum INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (student_id, day)
+        ) WITHOUT ROWID
+        ''',
+        *(statement for table in DAILY_METRIC_SOURCES for statement in _daily_metrics_triggers(table)),
+        lambda conn: rebuild_student_daily_metrics(conn, commit=False),
+    ]),
+    ('Nightly performance snapshots', [
+        '''
+        CREATE TABLE IF NOT EXISTS performance_snapshots (
+            snapshot_date TEXT NOT NULL, -- YYYY-MM-DD
+            student_id INTEGER NOT NULL, -- FK to students.id
+            overall_score REAL NOT NULL,
+            category TEXT NOT NULL,
+            attendance REAL NOT NULL, -- Metric values on the 0-100 scale
+            task_mark REAL NOT NULL,
+            behaviour REAL NOT NULL,
+            feedback REAL NOT NULL,
+            course_completion REAL NOT NULL,
+            created_at TEXT NOT NULL, -- YYYY-MM-DD HH:MM:SS
+            PRIMARY KEY (snapshot_date, student_id)
+        ) WITHOUT ROWID
+        ''',
+        # performance_snapshots WHERE student_id = ? ORDER BY snapshot_date (trend lines)
+        "CREATE INDEX IF NOT EXISTS idx_performance_snapshots_student ON performance_snapshots (student_id, snapshot_date)",
+    ]),
+    ('Weight profiles for what-if scoring', [
+        '''
+        CREATE TABLE IF NOT EXISTS weight_profiles (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL,
+            weights TEXT NOT NULL, -- JSON: metric name -> weight
+            thresholds TEXT NOT NULL, -- JSON: category -> minimum overall score
+            updated_at TEXT NOT NULL -- YYYY-MM-DD HH:MM:SS
+        )
+        ''',
+    ]),
+    ('Score change log for incremental rankings', [
+        # One row per student: the seq of the latest change to their score inputs
+        '''
+        CREATE TABLE IF NOT EXISTS score_changes (
+            student_id INTEGER PRIMARY KEY, -- FK to students.id
+            seq INTEGER NOT NULL
+        )
+        ''',
+        # score_changes WHERE seq > ? (students changed since the last refresh) and MAX(seq)
+        "CREATE INDEX IF NOT EXISTS idx_score_changes_seq ON score_changes (seq)",
+        *(statement for table in SCORE_CHANGE_SOURCES for statement in _score_change_triggers(table)),
+    ]),
+]
+SCHEMA_VERSION = len(SCHEMA_MIGRATIONS)
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate_db(conn):
+    """Applies pending migrations in order. Returns the list of versions applied."""
+    applied = []
+    current_version = get_schema_version(conn)
+    for version, (description, statements) in enumerate(SCHEMA_MIGRATIONS, start=1):
+        if version <= current_version:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for statement in statements:
+                if callable(statement): # Data migration implemented in Python
+                    statement(conn)
+                else:
+                    conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        print(f"Applied schema migration {version}: {description}")
+        applied.append(version)
+    return applied
 
-        cursor.execute("SELECT id FROM tasks WHERE student_id = ? AND title = ?", (int001_student_id, 'Build Simple API'))
-        if not cursor.fetchone():
-            cursor.execute("INSERT INTO tasks (student_id, course_id, title, description, due_date, status, mark) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                           (int001_student_id, web_dev_course_id, 'Build Simple API', 'Develop a basic REST API using Flask.', '2025-08-15', 'pending', 0))
-        
-        # Add sample attendance for Intern One
-        cursor.execute("SELECT id FROM attendance WHERE student_id = ? AND date = '2025-07-20'", (int001_student_id,))
-        if not cursor.fetchone():
-            cursor.execute("INSERT INTO attendance (student_id, date, status) VALUES (?, ?, ?)", (int001_student_id, '2025-07-20', 'present'))
-        cursor.execute("SELECT id FROM attendance WHERE student_id = ? AND date = '2025-07-21'", (int001_student_id,))
-        if not cursor.fetchone():
-            cursor.execute("INSERT INTO attendance (student_id, date, status) VALUES (?, ?, ?)", (int001_student_id, '2025-07-21', 'present'))
-        cursor.execute("SELECT id FROM attendance WHERE student_id = ? AND date = '2025-07-22'", (int001_student_id,))
-        if not cursor.fetchone():
-            cursor.execute("INSERT INTO attendance (student_id, date, status) VALUES (?, ?, ?)", (int001_student_id, '2025-07-22', 'absent'))
-
-        # Add sample feedback for Intern One (admin-to-student)
-        cursor.execute("SELECT id FROM users WHERE username = 'admin'")
-        admin_user_id = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT id FROM feedback WHERE student_id = ? AND comments LIKE '%Good work on Flask%'", (int001_student_id,))
-        if not cursor.fetchone():
-            cursor.execute("INSERT INTO feedback (student_id, admin_id, score, comments, feedback_date, feedback_category) VALUES (?, ?, ?, ?, ?, ?)",
-                           (int001_student_id, admin_user_id, 8.5, 'Good work on Flask tutorial, keep it up!', '2025-07-20', 'Good'))
-        cursor.execute("SELECT id FROM feedback WHERE student_id = ? AND comments LIKE '%Excellent research skills%'", (int001_student_id,))
-        if not cursor.fetchone():
-            cursor.execute("INSERT INTO feedback (student_id, admin_id, score, comments, feedback_date, feedback_category) VALUES (?, ?, ?, ?, ?, ?)",
-                           (int001_student_id, admin_user_id, 9.0, 'Excellent research skills demonstrated.', '2025-07-25', 'Excellent'))
-
-        # Add sample behaviour ratings for Intern One
-        cursor.execute("SELECT id FROM behaviour_ratings WHERE student_id = ? AND date = '2025-07-20'", (int001_student_id,))
-        if not cursor.fetchone():
-            cursor.execute("INSERT INTO behaviour_ratings (student_id, date, rating, admin_id) VALUES (?, ?, ?, ?)",
-                           (int001_student_id, '2025-07-20', 4, admin_user_id))
-        cursor.execute("SELECT id FROM behaviour_ratings WHERE student_id = ? AND date = '2025-07-21'", (int001_student_id,))
-        if not cursor.fetchone():
-            cursor.execute("INSERT INTO behaviour_ratings (student_id, date, rating, admin_id) VALUES (?, ?, ?, ?)",
-                           (int001_student_id, '2025-07-21', 5, admin_user_id))
-
-        # Add sample student-to-admin feedback
-        cursor.execute("SELECT id FROM student_feedback_to_admin WHERE student_id = ? AND subject = 'Website UI Suggestion'", (int001_student_id,))
-        if not cursor.fetchone():
-            cursor.execute("INSERT INTO student_feedback_to_admin (student_id, subject, message, timestamp) VALUES (?, ?, ?, ?)",
-                           (int001_student_id, 'Website UI Suggestion', 'Consider making the navigation menu more prominent.', datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
-        cursor.execute("SELECT id FROM student_feedback_to_admin WHERE student_id = ? AND subject = 'Query about Task 3'", (int001_student_id,))
-        if not cursor.fetchone():
-            cursor.execute("INSERT INTO student_feedback_to_admin (student_id, subject, message, timestamp) VALUES (?, ?, ?, ?)",
-                           (int001_student_id, 'Query about Task 3', 'Could you provide more examples for Task 3 requirements?', datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+@app.cli.command('migrate')
+def migrate_command():
+    """Apply pending schema migrations."""
+    applied = migrate_db(get_db())
+    click.echo(f"Schema is at version {get_schema_version(get_db())} ({len(applied)} migration(s) applied).")
 
+# --- Database Initialization ---
+def init_db():
+    """Brings the database schema up to date. When it already is, this is a single
+    PRAGMA read, so importing the app (e.g. in every gunicorn worker) stays cheap."""
+    is_new_database = not os.path.exists(DATABASE)
+    conn = open_db_connection()
+    try:
+        if get_schema_version(conn) == SCHEMA_VERSION:
+            return
+        # Check if database file exists to print appropriate message
+        if is_new_database:
+            print("Creating new database...")
+        else:
+            print("Database already exists, checking schema...")
+        # Create or upgrade tables and indexes (see SCHEMA_MIGRATIONS)
+        migrate_db(conn)
+        if is_new_database:
+            print("Run 'flask seed' to add the sample admin, intern and course data.")
+    finally:
+        conn.close()
 
-    conn.commit()
-    conn.close()
+# --- Sample Data ---
+# Loaded by 'flask seed'. Rows reference students/courses/users by their natural keys and
+# every statement is idempotent, so seeding twice adds nothing.
+SEED_USERS = [
+    ('admin', 'adminpass', 'admin'),
+    ('intern1', 'internpass', 'intern'),
+]
+SEED_COURSES = [
+    ('Web Development Basics', 10),
+    ('Data Science Fundamentals', 8),
+    ('Mobile App Development', 12),
+    ('Cloud Computing Essentials', 7),
+    ('Cybersecurity Basics', 9),
+]
+SEED_STUDENTS = [
+    {'student': 'INT001', 'name': 'Intern One', 'email': 'intern1@example.com', 'username': 'intern1', 'course': 'Web Development Basics'},
+]
+SEED_TASKS = [
+    {'student': 'INT001', 'course': 'Web Development Basics', 'title': 'Complete Flask Tutorial', 'description': 'completed', 'due_date': '2025-08-10', 'status': 'completed', 'mark': 90},
+    {'student': 'INT001', 'course': 'Web Development Basics', 'title': 'Research ML Models', 'description': 'Research different ML models for performance prediction.', 'due_date': '2025-08-05', 'status': 'completed', 'mark': 85},
+    {'student': 'INT001', 'course': 'Web Development Basics', 'title': 'Build Simple API', 'description': 'Develop a basic REST API using Flask.', 'due_date': '2025-08-15', 'status': 'pending', 'mark': 0},
+]
+SEED_ATTENDANCE = [
+    {'student': 'INT001', 'date': '2025-07-20', 'status': 'present'},
+    {'student': 'INT001', 'date': '2025-07-21', 'status': 'present'},
+    {'student': 'INT001', 'date': '2025-07-22', 'status': 'absent'},
+]
+SEED_FEEDBACK = [
+    {'student': 'INT001', 'admin': 'admin', 'score': 8.5, 'comments': 'Good work on Flask tutorial, keep it up!', 'date': '2025-07-20', 'category': 'Good'},
+    {'student': 'INT001', 'admin': 'admin', 'score': 9.0, 'comments': 'Excellent research skills demonstrated.', 'date': '2025-07-25', 'category': 'Excellent'},
+]
+SEED_BEHAVIOUR_RATINGS = [
+    {'student': 'INT001', 'admin': 'admin', 'date': '2025-07-20', 'rating': 4},
+    {'student': 'INT001', 'admin': 'admin', 'date': '2025-07-21', 'rating': 5},
+]
+SEED_STUDENT_FEEDBACK = [
+    {'student': 'INT001', 'subject': 'Website UI Suggestion', 'message': 'Consider making the navigation menu more prominent.'},
+    {'student': 'INT001', 'subject': 'Query about Task 3', 'message': 'Could you provide more examples for Task 3 requirements?'},
+]
+
+def seed_db(conn):
+    """Inserts the sample data in a single transaction and refreshes student_metrics."""
+    cursor = conn.cursor()
+    try:
+        cursor.executemany("INSERT OR IGNORE INTO users (username, password, role) VALUES (?, ?, ?)", SEED_USERS)
+        cursor.executemany("INSERT OR IGNORE INTO courses (name, total_expected_tasks) VALUES (?, ?)", SEED_COURSES)
+        cursor.executemany('''
+            INSERT OR IGNORE INTO students (unique_student_id, name, email, user_id, course_id)
+            VALUES (:student, :name, :email,
+                    (SELECT id FROM users WHERE username = :username),
+                    (SELECT id FROM courses WHERE name = :course))
+        ''', SEED_STUDENTS)
+        cursor.executemany('''
+            INSERT INTO tasks (student_id, course_id, title, description, due_date, status, mark)
+            SELECT s.id, c.id, :title, :description, :due_date, :status, :mark
+            FROM students s, courses c
+            WHERE s.unique_student_id = :student AND c.name = :course
+              AND NOT EXISTS (SELECT 1 FROM tasks t WHERE t.student_id = s.id AND t.title = :title)
+        ''', SEED_TASKS)
+        cursor.executemany('''
+            INSERT OR IGNORE INTO attendance (student_id, date, status)
+            SELECT id, :date, :status FROM students WHERE unique_student_id = :student
+        ''', SEED_ATTENDANCE)
+        cursor.executemany('''
+            INSERT INTO feedback (student_id, admin_id, score, comments, feedback_date, feedback_category)
+            SELECT s.id, u.id, :score, :comments, :date, :category
+            FROM students s, users u
+            WHERE s.unique_student_id = :student AND u.username = :admin
+              AND NOT EXISTS (SELECT 1 FROM feedback f WHERE f.student_id = s.id AND f.comments = :comments)
+        ''', SEED_FEEDBACK)
+        cursor.executemany('''
+            INSERT OR IGNORE INTO behaviour_ratings (student_id, date, rating, admin_id)
+            SELECT s.id, :date, :rating, u.id
+            FROM students s, users u
+            WHERE s.unique_student_id = :student AND u.username = :admin
+        ''', SEED_BEHAVIOUR_RATINGS)
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        cursor.executemany('''
+            INSERT INTO student_feedback_to_admin (student_id, subject, message, timestamp)
+            SELECT s.id, :subject, :message, :timestamp
+            FROM students s
+            WHERE s.unique_student_id = :student
+              AND NOT EXISTS (SELECT 1 FROM student_feedback_to_admin sf WHERE sf.student_id = s.id AND sf.subject = :subject)
+        ''', [dict(row, timestamp=timestamp) for row in SEED_STUDENT_FEEDBACK])
+        rebuild_student_metrics(conn, commit=False)
+        conn.commit()
+        invalidate_course_index()
+        invalidate_dashboard_counts()
+    except Exception:
+        conn.rollback()
+        raise
 
-# --- Initialize database immediately when the script runs ---
-init_db()
+@app.cli.command('seed')
+def seed_command():
+    """Load the sample admin, intern, course and activity data."""
+    seed_db(get_db())
+    click.echo("Sample data loaded.")
 
 # --- Helper function to check admin login ---
 def is_admin_logged_in():
@@ -242,26 +991,24 @@ def is_intern_logged_in():
 
 # --- Feature Calculation Functions ---
 def calculate_attendance_rate(student_db_id):
-    conn = sqlite3.connect(DATABASE)
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute("SELECT COUNT(*) FROM attendance WHERE student_id = ?", (student_db_id,))
     total_days = cursor.fetchone()[0]
     cursor.execute("SELECT COUNT(*) FROM attendance WHERE student_id = ? AND status = 'present'", (student_db_id,))
     present_days = cursor.fetchone()[0]
-    conn.close()
     return present_days / total_days if total_days > 0 else 0.0
 
 def calculate_average_task_mark(student_db_id):
-    conn = sqlite3.connect(DATABASE)
+    conn = get_db()
     cursor = conn.cursor()
     # Only consider marks for completed tasks
     cursor.execute("SELECT AVG(mark) FROM tasks WHERE student_id = ? AND status = 'completed'", (student_db_id,))
     avg_mark = cursor.fetchone()[0]
-    conn.close()
     return avg_mark if avg_mark is not None else 0.0
 
 def calculate_average_feedback_score_numeric(student_db_id):
-    conn = sqlite3.connect(DATABASE)
+    conn = get_db()
     cursor = conn.cursor()
     # Map qualitative feedback to numerical values for averaging
     # Using a 0-3 scale for Poor-Excellent, then normalizing to 0-100 later if needed
@@ -276,23 +1023,21 @@ def calculate_average_feedback_score_numeric(student_db_id):
         if category in feedback_category_map:
             numeric_values.append(feedback_category_map[category])
             
-    conn.close()
     # Convert average numeric category back to a 0-100 scale for consistency with other metrics
     # Max category value is 3 (Excellent). So (avg / 3) * 100
-    avg_numeric = np.mean(numeric_values) if numeric_values else 0.0
+    avg_numeric = sum(numeric_values) / len(numeric_values) if numeric_values else 0.0
     return (avg_numeric / 3.0) * 100.0 # Scale to 0-100
 
 def calculate_average_behaviour_rating(student_db_id):
-    conn = sqlite3.connect(DATABASE)
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute("SELECT AVG(rating) FROM behaviour_ratings WHERE student_id = ?", (student_db_id,))
     avg_rating = cursor.fetchone()[0]
-    conn.close()
     # Behaviour rating is 1-5. Scale to 0-100. (avg - 1) / 4 * 100
     return ((avg_rating - 1) / 4.0) * 100.0 if avg_rating is not None else 0.0
 
 def calculate_course_completion_percentage(student_db_id):
-    conn = sqlite3.connect(DATABASE)
+    conn = get_db()
     cursor = conn.cursor()
     
     # Get the course_id for the student
@@ -300,7 +1045,6 @@ def calculate_course_completion_percentage(student_db_id):
     student_course_id = cursor.fetchone()
     
     if not student_course_id or student_course_id[0] is None:
-        conn.close()
         return 0.0 # Student not assigned to a course
 
     student_course_id = student_course_id[0]
@@ -310,7 +1054,6 @@ def calculate_course_completion_percentage(student_db_id):
     total_expected_tasks = cursor.fetchone()[0]
 
     if total_expected_tasks == 0:
-        conn.close()
         return 0.0 # Avoid division by zero
 
     # Get completed tasks for this student for this course
@@ -318,19 +1061,40 @@ def calculate_course_completion_percentage(student_db_id):
                    (student_db_id, student_course_id))
     completed_tasks = cursor.fetchone()[0]
     
-    conn.close()
     return (completed_tasks / total_expected_tasks) * 100.0
 
 # --- Overall Performance Calculation ---
+# Weights for each metric (adjust as needed). The key order is also the column order
+# used by the batch scoring engine below.
+PERFORMANCE_WEIGHTS = {
+    'attendance': 0.20, # 20%
+    'task_mark': 0.30,  # 30%
+    'behaviour': 0.15,  # 15%
+    'feedback': 0.20,   # 20%
+    'course_completion': 0.15 # 15%
+}
+METRIC_NAMES = tuple(PERFORMANCE_WEIGHTS)
+# Lowest overall score for each category, best first; anything below the last is "Poor"
+CATEGORY_THRESHOLDS = {
+    'Excellent': 90,
+    'Good': 75,
+    'Average': 50,
+}
+PERFORMANCE_CATEGORIES = ('Poor', 'Average', 'Good', 'Excellent') # Worst to best
+
+def get_performance_category(overall_score, thresholds=None):
+    for category, minimum in (thresholds or CATEGORY_THRESHOLDS).items():
+        if overall_score >= minimum:
+            return category
+    return "Poor"
+
 def calculate_overall_performance_score(student_db_id):
-    # Weights for each metric (adjust as needed)
-    weights = {
-        'attendance': 0.20, # 20%
-        'task_mark': 0.30,  # 30%
-        'behaviour': 0.15,  # 15%
-        'feedback': 0.20,   # 20%
-        'course_completion': 0.15 # 15%
-    }
+    # O(1): reads the student's running counters from the student_metrics table
+    return calculate_student_performance(student_db_id)
+
+def calculate_overall_performance_score_from_rows(student_db_id):
+    # Reference implementation that scans the raw tables through the calculate_* helpers
+    weights = PERFORMANCE_WEIGHTS
 
     # Calculate individual scaled scores (all are already 0-100)
     attendance_score = calculate_attendance_rate(student_db_id) * 100
@@ -355,14 +1119,7 @@ def calculate_overall_performance_score(student_db_id):
     overall_score = max(0, min(100, overall_score))
 
     # Determine performance category
-    if overall_score >= 90:
-        category = "Excellent"
-    elif overall_score >= 75:
-        category = "Good"
-    elif overall_score >= 50:
-        category = "Average"
-    else:
-        category = "Poor"
+    category = get_performance_category(overall_score)
         
     return {
         'overall_score': round(overall_score, 2),
@@ -376,6 +1133,2077 @@ def calculate_overall_performance_score(student_db_id):
         }
     }
 
+# --- Batch Performance Calculation ---
+# calculate_overall_performance_score_from_rows() costs ~7 connections and 8 queries per
+# student. The functions below work on whole columns instead: the running counters behind
+# each metric are either aggregated from the raw tables with one GROUP BY query per table
+# (aggregate_student_counters) or read from the student_metrics table, and the weights
+# are applied column-wise with NumPy. NumPy is imported inside the functions that use it
+# so importing app.py (every process start) doesn't pay for it.
+
+SQLITE_MAX_PARAMS = 900 # Stay below SQLite's host parameter limit for IN (...) lists
+
+# Running counts and sums kept per student in student_metrics
+STUDENT_METRIC_COUNTERS = (
+    'attendance_total', 'attendance_present',
+    'tasks_total', 'completed_tasks', 'marked_tasks', 'completed_mark_sum', 'completed_in_course',
+    'behaviour_count', 'behaviour_sum',
+    'feedback_count', 'feedback_sum',
+)
+
+# Qualitative feedback mapped to 0-3 (Poor-Excellent), shared with the SQL aggregates
+FEEDBACK_CATEGORY_VALUES = {'Poor': 0, 'Average': 1, 'Good': 2, 'Excellent': 3}
+
+def _chunked(values, size=SQLITE_MAX_PARAMS):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+def _fetch_grouped(cursor, sql, student_ids, column='student_id', params=()):
+    """Runs a query containing a {filter} placeholder, either once for all students
+    (student_ids is None) or once per chunk of student ids. `params` bind any other
+    placeholders, which must come before {filter}."""
+    if student_ids is None:
+        cursor.execute(sql.format(filter=''), params)
+        return cursor.fetchall()
+    rows = []
+    for chunk in _chunked(student_ids):
+        placeholders = ','.join('?' * len(chunk))
+        cursor.execute(sql.format(filter=f'AND {column} IN ({placeholders})'), (*params, *chunk))
+        rows.extend(cursor.fetchall())
+    return rows
+
+def _scatter(ids, rows, columns):
+    """Places aggregate rows (student_id, v1, v2, ...) into arrays aligned with the
+    sorted `ids` array. Students without a row (and NULL aggregates) get 0."""
+    import numpy as np
+    arrays = [np.zeros(len(ids)) for _ in range(columns)]
+    if rows:
+        data = np.array(rows, dtype=float)
+        positions = np.searchsorted(ids, data[:, 0])
+        for col in range(columns):
+            arrays[col][positions] = np.nan_to_num(data[:, col + 1])
+    return arrays
+
+def _safe_ratio(numerator, denominator):
+    import numpy as np
+    result = np.zeros(len(numerator))
+    np.divide(numerator, denominator, out=result, where=denominator != 0)
+    return result
+
+def _normalize_student_ids(student_ids):
+    return None if student_ids is None else sorted({int(sid) for sid in student_ids})
+
+def aggregate_student_counters(cursor, student_ids=None):
+    """Computes the student_metrics counters from the raw tables.
+    Returns (ids, expected_tasks, counters) with counters keyed by STUDENT_METRIC_COUNTERS."""
+    import numpy as np
+    student_ids = _normalize_student_ids(student_ids)
+
+    # Students with the expected task count of their course
+    student_rows = _fetch_grouped(cursor, '''
+        SELECT s.id, c.total_expected_tasks
+        FROM students s LEFT JOIN courses c ON c.id = s.course_id
+        WHERE 1 = 1 {filter} ORDER BY s.id
+    ''', student_ids, column='s.id')
+    ids = np.array([row[0] for row in student_rows], dtype=np.int64)
+    expected_tasks = np.array([row[1] or 0 for row in student_rows], dtype=float)
+
+    counters = {}
+    # Attendance: total days and present days
+    counters['attendance_total'], counters['attendance_present'] = _scatter(ids, _fetch_grouped(cursor, '''
+        SELECT student_id, COUNT(*), SUM(status = 'present')
+        FROM attendance WHERE 1 = 1 {filter} GROUP BY student_id
+    ''', student_ids), 2)
+
+    # Tasks: all tasks, completed tasks and the marks of completed tasks
+    (counters['tasks_total'], counters['completed_tasks'],
+     counters['marked_tasks'], counters['completed_mark_sum']) = _scatter(ids, _fetch_grouped(cursor, '''
+        SELECT student_id, COUNT(*), SUM(status = 'completed'),
+               COUNT(CASE WHEN status = 'completed' THEN mark END),
+               SUM(CASE WHEN status = 'completed' THEN mark END)
+        FROM tasks WHERE 1 = 1 {filter} GROUP BY student_id
+    ''', student_ids), 4)
+
+    # Tasks: completed tasks that belong to the student's own course
+    counters['completed_in_course'], = _scatter(ids, _fetch_grouped(cursor, '''
+        SELECT t.student_id, COUNT(*)
+        FROM tasks t JOIN students s ON s.id = t.student_id AND t.course_id = s.course_id
+        WHERE t.status = 'completed' {filter} GROUP BY t.student_id
+    ''', student_ids, column='t.student_id'), 1)
+
+    # Behaviour: rating count and sum (1-5)
+    counters['behaviour_count'], counters['behaviour_sum'] = _scatter(ids, _fetch_grouped(cursor, '''
+        SELECT student_id, COUNT(*), SUM(rating)
+        FROM behaviour_ratings WHERE 1 = 1 {filter} GROUP BY student_id
+    ''', student_ids), 2)
+
+    # Feedback: mapped category count and sum; unknown categories are ignored
+    category_case = ' '.join(f"WHEN '{name}' THEN {value}" for name, value in FEEDBACK_CATEGORY_VALUES.items())
+    counters['feedback_count'], counters['feedback_sum'] = _scatter(ids, _fetch_grouped(cursor, f'''
+        SELECT student_id, COUNT(CASE feedback_category {category_case} END),
+               SUM(CASE feedback_category {category_case} END)
+        FROM feedback WHERE 1 = 1 {{filter}} GROUP BY student_id
+    ''', student_ids), 2)
+    return ids, expected_tasks, counters
+
+def load_student_counters(cursor, student_ids=None):
+    """Reads the counters from student_metrics (one row per student, no table scans).
+    Returns the same (ids, expected_tasks, counters) as aggregate_student_counters()."""
+    import numpy as np
+    student_ids = _normalize_student_ids(student_ids)
+    columns = ', '.join(f'COALESCE(m.{name}, 0)' for name in STUDENT_METRIC_COUNTERS)
+    rows = _fetch_grouped(cursor, f'''
+        SELECT s.id, COALESCE(c.total_expected_tasks, 0), {columns}
+        FROM students s
+        LEFT JOIN courses c ON c.id = s.course_id
+        LEFT JOIN student_metrics m ON m.student_id = s.id
+        WHERE 1 = 1 {{filter}} ORDER BY s.id
+    ''', student_ids, column='s.id')
+    data = np.array(rows, dtype=float).reshape(len(rows), len(STUDENT_METRIC_COUNTERS) + 2)
+    counters = {name: data[:, col + 2] for col, name in enumerate(STUDENT_METRIC_COUNTERS)}
+    return data[:, 0].astype(np.int64), data[:, 1], counters
+
+def metric_matrix_from_counters(expected_tasks, counters):
+    """Same formulas as the calculate_* helpers, applied to whole columns.
+    Returns one row per student and one column per METRIC_NAMES entry (0-100 scale)."""
+    import numpy as np
+    avg_rating = _safe_ratio(counters['behaviour_sum'], counters['behaviour_count'])
+    return np.column_stack([
+        _safe_ratio(counters['attendance_present'], counters['attendance_total']) * 100,
+        _safe_ratio(counters['completed_mark_sum'], counters['marked_tasks']),
+        np.where(counters['behaviour_count'] > 0, ((avg_rating - 1) / 4.0) * 100.0, 0.0),
+        (_safe_ratio(counters['feedback_sum'], counters['feedback_count']) / 3.0) * 100.0,
+        _safe_ratio(counters['completed_in_course'], expected_tasks) * 100.0,
+    ])
+
+def calculate_metric_matrix(student_ids=None, conn=None, window=None):
+    """Returns (ids, matrix) for all students or the given subset, read from student_metrics.
+    With a window (first_day, last_day), see load_window_counters()."""
+    conn = conn or get_db()
+    if window is None:
+        ids, expected_tasks, counters = load_student_counters(conn.cursor(), student_ids)
+    else:
+        ids, expected_tasks, counters = load_window_counters(conn.cursor(), window, student_ids)
+    return ids, metric_matrix_from_counters(expected_tasks, counters)
+
+def apply_performance_weights(matrix, weights=None):
+    """Weighted sum of the metric matrix, clipped to 0-100. Columns are accumulated in
+    METRIC_NAMES order so the floating point result is identical to the scalar
+    expression in calculate_overall_performance_score_from_rows()."""
+    import numpy as np
+    weights = weights or PERFORMANCE_WEIGHTS
+    overall = np.zeros(matrix.shape[0])
+    for col, metric in enumerate(METRIC_NAMES):
+        overall = overall + matrix[:, col] * weights[metric]
+    return np.clip(overall, 0, 100)
+
+def build_performance_result(metric_row, overall_score):
+    """Turns one row of the metric matrix into the dict returned by
+    calculate_overall_performance_score()."""
+    overall_score = float(overall_score)
+    return {
+        'overall_score': round(overall_score, 2),
+        'category': get_performance_category(overall_score),
+        'breakdown': {
+            metric: {'value': round(float(metric_row[col]), 2), 'weight': PERFORMANCE_WEIGHTS[metric]}
+            for col, metric in enumerate(METRIC_NAMES)
+        }
+    }
+
+def calculate_performance_scores_batch(student_ids=None, conn=None, window=None):
+    """Batch version of calculate_overall_performance_score(). Returns a dict mapping
+    student DB id -> performance result, for all students or the given subset, over their
+    whole history or the given window (first_day, last_day)."""
+    ids, matrix = calculate_metric_matrix(student_ids, conn, window)
+    overall = apply_performance_weights(matrix)
+    return {
+        student_db_id: build_performance_result(matrix[row], overall[row])
+        for row, student_db_id in enumerate(ids.tolist())
+    }
+
+def calculate_student_performance(student_db_id, conn=None, window=None):
+    """Single-student lookup through the batch engine (one query on student_metrics)."""
+    return calculate_performance_scores_batch([student_db_id], conn, window).get(int(student_db_id))
+
+# --- Materialized student_metrics table ---
+# Write routes call update_student_metrics() on the cursor they write with, before their
+# own commit, so the counters change in the same transaction as the underlying rows.
+
+def update_student_metrics(cursor, student_db_id, **deltas):
+    """Adds the given deltas (counter name -> amount) to a student's student_metrics row."""
+    unknown = set(deltas) - set(STUDENT_METRIC_COUNTERS)
+    if unknown:
+        raise ValueError(f"Unknown student_metrics counters: {', '.join(sorted(unknown))}")
+    cursor.execute("INSERT OR IGNORE INTO student_metrics (student_id) VALUES (?)", (student_db_id,))
+    # Every write bumps data_version, which invalidates the student's cached scores
+    assignments = ''.join(f'{name} = {name} + ?, ' for name in deltas)
+    cursor.execute(f"UPDATE student_metrics SET {assignments}data_version = data_version + 1 WHERE student_id = ?",
+                   (*deltas.values(), student_db_id))
+
+def update_student_metrics_many(cursor, counters, rows):
+    """Bulk form of update_student_metrics(): rows are (student_id, delta, ...) tuples with
+    one delta per name in `counters`, applied with two executemany statements."""
+    unknown = set(counters) - set(STUDENT_METRIC_COUNTERS)
+    if unknown:
+        raise ValueError(f"Unknown student_metrics counters: {', '.join(sorted(unknown))}")
+    rows = list(rows)
+    cursor.executemany("INSERT OR IGNORE INTO student_metrics (student_id) VALUES (?)", [(row[0],) for row in rows])
+    assignments = ''.join(f'{name} = {name} + ?, ' for name in counters)
+    cursor.executemany(f"UPDATE student_metrics SET {assignments}data_version = data_version + 1 WHERE student_id = ?",
+                       [(*row[1:], row[0]) for row in rows])
+
+def feedback_category_metric_deltas(feedback_category):
+    if feedback_category in FEEDBACK_CATEGORY_VALUES:
+        return {'feedback_count': 1, 'feedback_sum': FEEDBACK_CATEGORY_VALUES[feedback_category]}
+    return {}
+
+def rebuild_student_metrics(conn, commit=True, bump_versions=True):
+    """Recomputes student_metrics from the raw tables. Returns the row count.
+    Existing rows keep (and, with bump_versions, increment) their data_version."""
+    cursor = conn.cursor()
+    ids, _, counters = aggregate_student_counters(cursor)
+    columns = ', '.join(STUDENT_METRIC_COUNTERS)
+    placeholders = ', '.join('?' * (len(STUDENT_METRIC_COUNTERS) + 1))
+    updates = ', '.join(f'{name} = excluded.{name}' for name in STUDENT_METRIC_COUNTERS)
+    if bump_versions:
+        updates += ', data_version = data_version + 1'
+    rows = zip(ids.tolist(), *(counters[name].tolist() for name in STUDENT_METRIC_COUNTERS))
+    cursor.execute("DELETE FROM student_metrics WHERE student_id NOT IN (SELECT id FROM students)")
+    cursor.executemany(f'''
+        INSERT INTO student_metrics (student_id, {columns}) VALUES ({placeholders})
+        ON CONFLICT(student_id) DO UPDATE SET {updates}
+    ''', rows)
+    if commit:
+        conn.commit()
+    return len(ids)
+
+def verify_student_metrics(conn, tolerance=1e-6):
+    """Compares student_metrics against a fresh aggregation of the raw tables.
+    Returns a list of (student_id, counter, stored, expected) for every drifted value;
+    a missing student_metrics row is reported with counter 'row'."""
+    import numpy as np
+    cursor = conn.cursor()
+    ids, _, expected = aggregate_student_counters(cursor)
+    cursor.execute("SELECT student_id FROM student_metrics")
+    stored_ids = {row[0] for row in cursor.fetchall()}
+    _, _, stored = load_student_counters(cursor)
+
+    drift = [(student_id, 'row', None, None) for student_id in ids.tolist() if student_id not in stored_ids]
+    drift += [(student_id, 'row', 'orphan', None) for student_id in sorted(stored_ids - set(ids.tolist()))]
+    for name in STUDENT_METRIC_COUNTERS:
+        for row in np.flatnonzero(~np.isclose(stored[name], expected[name], rtol=0, atol=tolerance)):
+            drift.append((int(ids[row]), name, float(stored[name][row]), float(expected[name][row])))
+    return drift
+
+@app.cli.command('rebuild-metrics')
+def rebuild_metrics_command():
+    """Recompute the student_metrics and student_daily_metrics tables from scratch."""
+    conn = get_db()
+    drift = verify_student_metrics(conn)
+    count = rebuild_student_metrics(conn)
+    days = rebuild_student_daily_metrics(conn)
+    click.echo(f"Rebuilt student_metrics for {count} student(s); {len(drift)} drifted value(s) corrected.")
+    click.echo(f"Rebuilt student_daily_metrics ({days} student-day row(s)).")
+
+@app.cli.command('verify-metrics')
+def verify_metrics_command():
+    """Report drift between student_metrics and the raw tables."""
+    drift = verify_student_metrics(get_db())
+    for student_id, counter, stored, expected in drift:
+        click.echo(f"student {student_id}: {counter} stored={stored} expected={expected}")
+    click.echo(f"{len(drift)} drifted value(s) found." if drift else "student_metrics is consistent.")
+    if drift:
+        raise SystemExit(1)
+
+# --- Rolling Score Windows ---
+# student_daily_metrics holds each student's counters per day (maintained by triggers, see
+# DAILY_METRIC_SOURCES), so a score over the last N days sums at most N rows per student
+# instead of scanning their whole history. Course completion has no meaningful window and
+# always uses the lifetime counters.
+
+SCORE_WINDOWS = {'7d': 7, '30d': 30, '90d': 90} # Label -> days, ending today
+DAILY_METRIC_COUNTERS = ('attendance_total', 'attendance_present', 'marked_tasks', 'completed_mark_sum',
+                         'behaviour_count', 'behaviour_sum', 'feedback_count', 'feedback_sum')
+
+def score_window_bounds(window=None, date_from=None, date_to=None, today=None):
+    """Returns (first_day, last_day) as YYYY-MM-DD strings, or None for the whole history.
+    `window` is a SCORE_WINDOWS label; otherwise date_from/date_to give a custom range (either
+    end may be left open). Raises ValueError for an unknown label or malformed date."""
+    if window:
+        if window not in SCORE_WINDOWS:
+            raise ValueError(f'Unknown score window: {window}')
+        last_day = today or datetime.now().date()
+        return (last_day - timedelta(days=SCORE_WINDOWS[window] - 1)).isoformat(), last_day.isoformat()
+    if not (date_from or date_to):
+        return None
+    first_day = datetime.strptime(date_from, '%Y-%m-%d').date().isoformat() if date_from else '0000-01-01'
+    last_day = datetime.strptime(date_to, '%Y-%m-%d').date().isoformat() if date_to else '9999-12-31'
+    if first_day > last_day:
+        raise ValueError('The start date is after the end date')
+    return first_day, last_day
+
+def load_window_counters(cursor, window, student_ids=None):
+    """Like load_student_counters(), but the attendance, task mark, behaviour and feedback
+    counters only cover the days in window = (first_day, last_day)."""
+    ids, expected_tasks, counters = load_student_counters(cursor, student_ids)
+    student_ids = _normalize_student_ids(student_ids)
+    columns = ', '.join(f'SUM(d.{name})' for name in DAILY_METRIC_COUNTERS)
+    # Driving the join from students turns it into one primary key range seek per student
+    rows = _fetch_grouped(cursor, f'''
+        SELECT s.id, {columns}
+        FROM students s
+        JOIN student_daily_metrics d ON d.student_id = s.id AND d.day BETWEEN ? AND ?
+        WHERE 1 = 1 {{filter}} GROUP BY s.id
+    ''', student_ids, column='s.id', params=tuple(window))
+    counters.update(zip(DAILY_METRIC_COUNTERS, _scatter(ids, rows, len(DAILY_METRIC_COUNTERS))))
+    return ids, expected_tasks, counters
+
+def rebuild_student_daily_metrics(conn, commit=True):
+    """Recomputes student_daily_metrics from the raw tables. Returns the row count."""
+    selects = []
+    for table, (day, values, _) in DAILY_METRIC_SOURCES.items():
+        expressions = ', '.join(f'{values[name].format(row=table)} AS {name}' if name in values else f'0 AS {name}'
+                                for name in DAILY_METRIC_COUNTERS)
+        selects.append(f'SELECT {table}.student_id AS student_id, {day.format(row=table)} AS day, {expressions} '
+                       f'FROM {table} WHERE {day.format(row=table)} IS NOT NULL')
+    columns = ', '.join(DAILY_METRIC_COUNTERS)
+    sums = ', '.join(f'SUM({name})' for name in DAILY_METRIC_COUNTERS)
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM student_daily_metrics")
+    cursor.execute(f'''
+        INSERT INTO student_daily_metrics (student_id, day, {columns})
+        SELECT student_id, day, {sums} FROM ({' UNION ALL '.join(selects)}) GROUP BY student_id, day
+    ''')
+    if commit:
+        conn.commit()
+    return cursor.rowcount
+
+# --- Performance Snapshots ---
+# take_performance_snapshot() (flask snapshot-performance, meant to run nightly from cron)
+# stores every student's score breakdown for a date in performance_snapshots, so score
+# history and trend charts read precomputed rows. The student list is split into shards
+# scored by a process pool; each worker holds its own read-only connection. Rows are
+# written in a single transaction. A run only scores students without a snapshot for that
+# date, so re-running is idempotent and finishes whatever an earlier run didn't cover.
+
+SNAPSHOT_SHARD_SIZE = 2000 # Students per worker task
+SNAPSHOT_MIN_PARALLEL = 5000 # Below this many students, scoring inline beats starting processes
+SNAPSHOT_METRICS = METRIC_NAMES # Stored as one column each
+
+_snapshot_conn = None # Per worker process
+
+def _init_snapshot_worker(database):
+    global _snapshot_conn
+    _snapshot_conn = sqlite3.connect(pathlib.Path(database).resolve().as_uri() + '?mode=ro', uri=True)
+
+def score_snapshot_shard(student_ids, conn=None):
+    """Scores a list of students; returns (student_id, overall, category, *metrics) rows."""
+    ids, matrix = calculate_metric_matrix(student_ids, conn or _snapshot_conn)
+    overall = apply_performance_weights(matrix)
+    rows = []
+    for row, student_db_id in enumerate(ids.tolist()):
+        result = build_performance_result(matrix[row], overall[row])
+        rows.append((student_db_id, result['overall_score'], result['category'],
+                     *(result['breakdown'][metric]['value'] for metric in SNAPSHOT_METRICS)))
+    return rows
+
+def take_performance_snapshot(conn, snapshot_date=None, workers=None, force=False, shard_size=SNAPSHOT_SHARD_SIZE):
+    """Snapshots every student not yet snapshotted for snapshot_date (default today); with
+    force, recomputes the whole date. Returns a summary dict with the throughput."""
+    started = time.perf_counter()
+    snapshot_date = (datetime.strptime(snapshot_date, '%Y-%m-%d').date() if snapshot_date
+                     else datetime.now().date()).isoformat()
+    if force:
+        pending = [row[0] for row in conn.execute("SELECT id FROM students ORDER BY id")]
+    else:
+        pending = [row[0] for row in conn.execute('''
+            SELECT id FROM students
+            WHERE id NOT IN (SELECT student_id FROM performance_snapshots WHERE snapshot_date = ?)
+            ORDER BY id
+        ''', (snapshot_date,))]
+    shards = [pending[start:start + shard_size] for start in range(0, len(pending), shard_size)]
+    workers = workers or os.cpu_count() or 1
+
+    rows = []
+    if workers == 1 or len(pending) < SNAPSHOT_MIN_PARALLEL:
+        workers = 1
+        for shard in shards:
+            rows.extend(score_snapshot_shard(shard, conn))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(shards)), initializer=_init_snapshot_worker,
+                                 initargs=(conn.database,)) as pool:
+            for future in as_completed([pool.submit(score_snapshot_shard, shard) for shard in shards]):
+                rows.extend(future.result())
+    scored = time.perf_counter() - started
+
+    created_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    columns = ', '.join(SNAPSHOT_METRICS)
+    placeholders = ', '.join('?' * (len(SNAPSHOT_METRICS) + 5))
+    try:
+        if force:
+            conn.execute("DELETE FROM performance_snapshots WHERE snapshot_date = ?", (snapshot_date,))
+        conn.executemany(f'''
+            INSERT OR REPLACE INTO performance_snapshots
+                (snapshot_date, student_id, overall_score, category, {columns}, created_at)
+            VALUES ({placeholders})
+        ''', [(snapshot_date, *row, created_at) for row in rows])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    elapsed = time.perf_counter() - started
+    return {
+        'snapshot_date': snapshot_date,
+        'students': len(rows),
+        'skipped': 0 if force else conn.execute(
+            "SELECT COUNT(*) FROM performance_snapshots WHERE snapshot_date = ?", (snapshot_date,)).fetchone()[0] - len(rows),
+        'workers': workers,
+        'shards': len(shards),
+        'seconds': elapsed,
+        'scoring_seconds': scored,
+        'students_per_second': len(rows) / elapsed if elapsed else 0.0,
+    }
+
+def load_performance_history(conn, student_db_id, limit=90):
+    """The student's latest `limit` snapshots, oldest first, as dicts."""
+    rows = conn.execute(f'''
+        SELECT snapshot_date, overall_score, category, {', '.join(SNAPSHOT_METRICS)}
+        FROM performance_snapshots WHERE student_id = ?
+        ORDER BY snapshot_date DESC LIMIT ?
+    ''', (student_db_id, limit)).fetchall()
+    return [dict(zip(('snapshot_date', 'overall_score', 'category', *SNAPSHOT_METRICS), row)) for row in reversed(rows)]
+
+@app.cli.command('snapshot-performance')
+@click.option('--date', 'snapshot_date', default=None, help='Snapshot date (YYYY-MM-DD, default today).')
+@click.option('--workers', type=int, default=None, help='Worker processes (default: CPU count).')
+@click.option('--force', is_flag=True, help='Recompute students already snapshotted for the date.')
+def snapshot_performance_command(snapshot_date, workers, force):
+    """Store today's score breakdown for every student (run nightly)."""
+    summary = take_performance_snapshot(get_db(), snapshot_date, workers, force)
+    click.echo(f"Snapshot {summary['snapshot_date']}: {summary['students']} student(s) scored, "
+               f"{summary['skipped']} already done, {summary['workers']} worker(s), {summary['shards']} shard(s) "
+               f"in {summary['seconds']:.2f}s ({summary['students_per_second']:.0f} students/s).")
+
+# --- What-if Weight Scenarios ---
+# A weight profile is an alternative set of PERFORMANCE_WEIGHTS and CATEGORY_THRESHOLDS,
+# saved in weight_profiles. score_weight_profiles() loads the metric matrix once and scores
+# every profile with one matrix product (students x metrics @ metrics x profiles), then
+# compares each profile's categories with the current weighting.
+
+SCENARIO_TOP_MOVERS = 10 # Largest score changes listed per profile
+
+def validate_weight_profile(profile):
+    """Returns a normalized {'name', 'weights', 'thresholds'} copy of `profile`. Weights must
+    cover METRIC_NAMES, lie in 0-1 and sum to 1; thresholds (default CATEGORY_THRESHOLDS)
+    must be 0-100 and strictly ordered. Raises ValueError otherwise."""
+    if not isinstance(profile, dict):
+        raise ValueError('A weight profile must be an object')
+    name = str(profile.get('name') or '').strip()
+    if not name:
+        raise ValueError('A weight profile needs a name')
+    weights, thresholds = profile.get('weights'), profile.get('thresholds') or CATEGORY_THRESHOLDS
+    if not isinstance(weights, dict) or set(weights) != set(METRIC_NAMES):
+        raise ValueError(f"weights must give exactly: {', '.join(METRIC_NAMES)}")
+    if not isinstance(thresholds, dict) or set(thresholds) != set(CATEGORY_THRESHOLDS):
+        raise ValueError(f"thresholds must give exactly: {', '.join(CATEGORY_THRESHOLDS)}")
+    try:
+        weights = {metric: float(weights[metric]) for metric in METRIC_NAMES}
+        thresholds = {category: float(thresholds[category]) for category in CATEGORY_THRESHOLDS}
+    except (TypeError, ValueError):
+        raise ValueError('Weights and thresholds must be numbers')
+    if not all(0 <= weight <= 1 for weight in weights.values()) or abs(sum(weights.values()) - 1) > 1e-6:
+        raise ValueError('Weights must each be between 0 and 1 and add up to 1')
+    minimums = list(thresholds.values())
+    if not all(0 <= minimum <= 100 for minimum in minimums) or any(a <= b for a, b in zip(minimums, minimums[1:])):
+        raise ValueError(f"Thresholds must be between 0 and 100 with {' > '.join(CATEGORY_THRESHOLDS)}")
+    return {'name': name, 'weights': weights, 'thresholds': thresholds}
+
+def load_weight_profiles(conn, names=None):
+    """Saved profiles (all, or the given names in that order). Raises KeyError for an unknown name."""
+    rows = conn.execute("SELECT name, weights, thresholds FROM weight_profiles ORDER BY name").fetchall()
+    profiles = {name: {'name': name, 'weights': json.loads(weights), 'thresholds': json.loads(thresholds)}
+                for name, weights, thresholds in rows}
+    if names is None:
+        return list(profiles.values())
+    missing = [name for name in names if name not in profiles]
+    if missing:
+        raise KeyError(', '.join(missing))
+    return [profiles[name] for name in names]
+
+def save_weight_profile(conn, profile):
+    """Validates and inserts or replaces a profile by name. Returns the stored profile."""
+    profile = validate_weight_profile(profile)
+    conn.execute('''
+        INSERT INTO weight_profiles (name, weights, thresholds, updated_at) VALUES (?, ?, ?, ?)
+        ON CONFLICT (name) DO UPDATE SET weights = excluded.weights, thresholds = excluded.thresholds,
+                                         updated_at = excluded.updated_at
+    ''', (profile['name'], json.dumps(profile['weights']), json.dumps(profile['thresholds']),
+          datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+    conn.commit()
+    return profile
+
+def delete_weight_profile(conn, name):
+    deleted = conn.execute("DELETE FROM weight_profiles WHERE name = ?", (name,)).rowcount
+    conn.commit()
+    return bool(deleted)
+
+def _category_codes(scores, thresholds):
+    """Category index (position in PERFORMANCE_CATEGORIES) of each score in a students x
+    profiles array, given one row of CATEGORY_THRESHOLDS values per profile."""
+    import numpy as np
+    return (scores[:, :, None] >= np.asarray(thresholds)[None, :, :]).sum(axis=2)
+
+def score_weight_profiles(profiles, conn=None, student_ids=None):
+    """Re-scores all students (or the given subset) under each validated profile and reports,
+    per profile, the category distribution and its shift, category transitions, and the
+    students whose score moves the most, all relative to the current weights."""
+    import numpy as np
+    started = time.perf_counter()
+    conn = conn or get_db()
+    ids, matrix = calculate_metric_matrix(student_ids, conn)
+
+    # Column 0 is the current weighting, so the baseline goes through the same arithmetic and
+    # a profile identical to it reports no changes
+    everyone = [{'name': 'current', 'weights': PERFORMANCE_WEIGHTS, 'thresholds': CATEGORY_THRESHOLDS}, *profiles]
+    weights = np.array([[profile['weights'][metric] for profile in everyone] for metric in METRIC_NAMES])
+    thresholds = np.array([[profile['thresholds'][category] for category in reversed(CATEGORY_THRESHOLDS)]
+                           for profile in everyone]) # Worst to best, like PERFORMANCE_CATEGORIES[1:]
+    scores = np.clip(matrix @ weights, 0, 100)
+    codes = _category_codes(scores, thresholds)
+
+    base_scores, base_codes = scores[:, 0], codes[:, 0]
+    levels = len(PERFORMANCE_CATEGORIES)
+    # transitions[p, before, after] = students moving from category `before` to `after` under profile p
+    offsets = np.arange(len(everyone)) * levels * levels
+    transitions = np.bincount((offsets[None, :] + base_codes[:, None] * levels + codes).ravel(),
+                              minlength=len(everyone) * levels * levels).reshape(len(everyone), levels, levels)
+    distributions = transitions.sum(axis=1)
+
+    deltas = scores - base_scores[:, None]
+    mover_rows = {}
+    for column in range(1, len(everyone)):
+        top = min(SCENARIO_TOP_MOVERS, len(ids))
+        rows = np.argpartition(-np.abs(deltas[:, column]), top - 1)[:top] if top else []
+        mover_rows[column] = sorted((row for row in rows if abs(deltas[row, column]) > 1e-9),
+                                    key=lambda row: -abs(deltas[row, column]))
+    student_codes = dict(_fetch_grouped(conn.cursor(), "SELECT id, unique_student_id FROM students WHERE 1 = 1 {filter}",
+                                        sorted({int(ids[row]) for rows in mover_rows.values() for row in rows}), 'id'))
+
+    def distribution(column):
+        return dict(zip(PERFORMANCE_CATEGORIES, distributions[column].tolist()))
+
+    results = []
+    for column, profile in enumerate(everyone[1:], start=1):
+        changed = codes[:, column] != base_codes
+        results.append({
+            'name': profile['name'],
+            'weights': profile['weights'],
+            'thresholds': profile['thresholds'],
+            'mean_score': round(float(scores[:, column].mean()), 2) if len(ids) else 0.0,
+            'mean_shift': round(float(deltas[:, column].mean()), 2) if len(ids) else 0.0,
+            'distribution': distribution(column),
+            'distribution_shift': {category: int(distributions[column][level] - distributions[0][level])
+                                   for level, category in enumerate(PERFORMANCE_CATEGORIES)},
+            'changed': int(changed.sum()),
+            'upgraded': int((codes[:, column] > base_codes).sum()),
+            'downgraded': int((codes[:, column] < base_codes).sum()),
+            'transitions': [{'from': PERFORMANCE_CATEGORIES[before], 'to': PERFORMANCE_CATEGORIES[after],
+                             'students': int(transitions[column, before, after])}
+                            for before in range(levels) for after in range(levels)
+                            if before != after and transitions[column, before, after]],
+            'top_movers': [{'student_id': student_codes.get(int(ids[row])), 'before': round(float(base_scores[row]), 2),
+                            'after': round(float(scores[row, column]), 2),
+                            'from': PERFORMANCE_CATEGORIES[base_codes[row]], 'to': PERFORMANCE_CATEGORIES[codes[row, column]]}
+                           for row in mover_rows[column]],
+        })
+    return {
+        'students': len(ids),
+        'baseline': {'weights': PERFORMANCE_WEIGHTS, 'thresholds': CATEGORY_THRESHOLDS,
+                     'mean_score': round(float(base_scores.mean()), 2) if len(ids) else 0.0,
+                     'distribution': distribution(0)},
+        'profiles': results,
+        'seconds': round(time.perf_counter() - started, 4),
+    }
+
+# --- Performance Prediction (RandomForest) ---
+# The model is a joblib-pickled scikit-learn RandomForestClassifier: the active version
+# trained by `flask train-model` (see Model Training), or the bundled performance_model.pkl
+# until one has been. It is loaded lazily, once per process, and again as soon as another
+# version is activated, and always called with a whole feature matrix so a request pays
+# for a single predict_proba call however many students it covers.
+MODEL_PATH = os.path.join(app.root_path, 'performance_model.pkl')
+# Feature order the bundled model was trained on: attendance and task mark as 0-1 ratios and
+# the average behaviour rating on its 1-5 scale (0 when a student has no ratings yet)
+MODEL_FEATURES = ('attendance_rate', 'task_mark_ratio', 'behaviour_rating')
+MODEL_DIR = os.path.join(app.root_path, 'models') # Versioned models and their metadata
+MODEL_POINTER = os.path.join(MODEL_DIR, 'current.json') # Metadata of the active version, replaced atomically
+# Model classes 0-3 correspond to the performance categories from worst to best
+MODEL_CLASS_LABELS = {0: 'Poor', 1: 'Average', 2: 'Good', 3: 'Excellent'}
+# FlatForest wins by a wide margin for small batches; past this many rows sklearn's
+# compiled predict_proba is faster (see benchmarks/bench_forest.py). Both give identical output.
+FLAT_FOREST_MAX_ROWS = 2000
+
+_performance_model_state = None # (pointer key, model, FlatForest, metadata)
+_performance_model_lock = threading.Lock()
+
+class FlatForest:
+    """A RandomForestClassifier compiled into flat NumPy node arrays.
+
+    All trees' nodes are concatenated into feature/threshold/left/right/value arrays with
+    global node indices; leaves point at themselves so every sample takes the same number
+    of steps. predict_proba() walks all trees for a whole batch at once and returns exactly
+    what sklearn returns: inputs are compared as float32 like sklearn's trees do, and the
+    per-tree probabilities are normalized and summed in estimator order before dividing by
+    the tree count."""
+
+    ROW_CHUNK = 128 # Rows evaluated together; keeps the decision matrix cache-sized
+
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth, classes):
+        import numpy as np
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.max_depth = max_depth
+        self.classes_ = classes
+        # children[2 * node + went_left] -> next node, so each step is a single gather
+        self._children = np.column_stack([right, left]).ravel()
+        self._class_values = [np.ascontiguousarray(value[:, col]) for col in range(value.shape[1])]
+
+    @classmethod
+    def from_sklearn(cls, forest):
+        import numpy as np
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            node_ids = np.arange(tree.node_count)
+            is_leaf = tree.children_left < 0
+            value = tree.value[:, 0, :].astype(np.float64)
+            normalizer = value.sum(axis=1, keepdims=True)
+            normalizer[normalizer == 0.0] = 1.0
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left) + offset)
+            rights.append(np.where(is_leaf, node_ids, tree.children_right) + offset)
+            values.append(value / normalizer)
+            roots.append(offset)
+            offset += tree.node_count
+        return cls(
+            feature=np.concatenate(features).astype(np.intp),
+            threshold=np.concatenate(thresholds),
+            left=np.concatenate(lefts).astype(np.intp),
+            right=np.concatenate(rights).astype(np.intp),
+            value=np.concatenate(values),
+            roots=np.array(roots, dtype=np.intp),
+            max_depth=max(estimator.tree_.max_depth for estimator in forest.estimators_),
+            classes=forest.classes_,
+        )
+
+    def apply(self, X):
+        """Leaf reached in every tree, shape (n_trees, n_samples)."""
+        import numpy as np
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        leaves = np.empty((len(self.roots), X.shape[0]), dtype=np.intp)
+        node_count = len(self.feature)
+        for start in range(0, X.shape[0], self.ROW_CHUNK):
+            chunk = X[start:start + self.ROW_CHUNK]
+            # Every node's split decision for every row, flattened row-major
+            went_left = (chunk[:, self.feature] <= self.threshold).ravel()
+            row_offsets = np.arange(chunk.shape[0], dtype=np.intp) * node_count
+            node = np.repeat(self.roots[:, None], chunk.shape[0], axis=1)
+            for _ in range(self.max_depth):
+                node = self._children[2 * node + went_left[row_offsets + node]]
+            leaves[:, start:start + chunk.shape[0]] = node
+        return leaves
+
+    def predict_proba(self, X):
+        import numpy as np
+        leaves = self.apply(X)
+        # Summing over axis 0 adds the trees one after another, in estimator order
+        proba = np.column_stack([values[leaves].sum(axis=0) for values in self._class_values])
+        proba /= leaves.shape[0]
+        return proba
+
+    def predict(self, X):
+        return self.classes_.take(self.predict_proba(X).argmax(axis=1))
+
+def get_model_pointer_key():
+    """Identifies the active model version: changes whenever MODEL_POINTER is replaced (one
+    stat call, no loading). None while the bundled model is in use."""
+    try:
+        stat = os.stat(MODEL_POINTER)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+def _load_performance_model():
+    """(model, FlatForest, metadata) of the active version, loaded once per process and
+    reloaded when MODEL_POINTER changes (thread-safe)."""
+    global _performance_model_state
+    key = get_model_pointer_key()
+    state = _performance_model_state
+    if state is None or state[0] != key:
+        with _performance_model_lock:
+            state = _performance_model_state
+            if state is None or state[0] != key:
+                import joblib # Deferred: pulls in scikit-learn
+                if key is None:
+                    path, metadata = MODEL_PATH, {'version': 'bundled', 'features': list(MODEL_FEATURES)}
+                else:
+                    with open(MODEL_POINTER) as f:
+                        metadata = json.load(f)
+                    path = os.path.join(MODEL_DIR, metadata['model_file'])
+                model = joblib.load(path)
+                state = _performance_model_state = (key, model, FlatForest.from_sklearn(model), metadata)
+    return state[1:]
+
+def get_performance_model():
+    """Returns the process-wide scikit-learn model, loading it on first use."""
+    return _load_performance_model()[0]
+
+def get_forest_evaluator():
+    """Returns the process-wide FlatForest compiled from the model."""
+    return _load_performance_model()[1]
+
+def get_model_metadata():
+    """Returns the active model's metadata (at least 'version' and 'features')."""
+    return _load_performance_model()[2]
+
+def model_features_from_counters(counters, features=MODEL_FEATURES, expected_tasks=None):
+    """Builds a model's feature matrix (one row per student, one column per name in
+    `features`): MODEL_FEATURES for the bundled model, METRIC_NAMES (the 0-100 metrics of
+    metric_matrix_from_counters, which need expected_tasks) for trained ones."""
+    import numpy as np
+    columns = {
+        'attendance_rate': lambda: _safe_ratio(counters['attendance_present'], counters['attendance_total']),
+        'task_mark_ratio': lambda: _safe_ratio(counters['completed_mark_sum'], counters['marked_tasks']) / 100.0,
+        'behaviour_rating': lambda: _safe_ratio(counters['behaviour_sum'], counters['behaviour_count']),
+    }
+    if set(features) & set(METRIC_NAMES):
+        matrix = metric_matrix_from_counters(expected_tasks, counters)
+        columns.update({metric: lambda col=col: matrix[:, col] for col, metric in enumerate(METRIC_NAMES)})
+    unknown = [name for name in features if name not in columns]
+    if unknown:
+        raise ValueError(f"Unknown model features: {', '.join(unknown)}")
+    return np.column_stack([columns[name]() for name in features])
+
+def predict_student_performance(student_db_id, conn=None):
+    """Model prediction for one student: (label, {class label: probability}) or None."""
+    ids, labels, probabilities, class_labels = predict_performance_batch([student_db_id], conn)
+    if not len(ids):
+        return None
+    return labels[0], dict(zip(class_labels, probabilities[0].tolist()))
+
+def predict_performance_batch(student_ids=None, conn=None):
+    """Predicts the performance category of all students (or a subset) in one
+    predict_proba call (FlatForest for small batches). Returns (ids, labels, probabilities, class_labels) where
+    probabilities has one column per entry of class_labels."""
+    import numpy as np
+    conn = conn or get_db()
+    ids, expected_tasks, counters = load_student_counters(conn.cursor(), student_ids)
+    sklearn_model, forest, metadata = _load_performance_model()
+    model = forest if len(ids) <= FLAT_FOREST_MAX_ROWS else sklearn_model
+    class_labels = [MODEL_CLASS_LABELS.get(int(cls), str(cls)) for cls in model.classes_]
+    if not len(ids):
+        return ids, [], np.zeros((0, len(class_labels))), class_labels
+    probabilities = model.predict_proba(model_features_from_counters(counters, metadata['features'], expected_tasks))
+    labels = [class_labels[index] for index in probabilities.argmax(axis=1)]
+    return ids, labels, probabilities, class_labels
+
+# --- Model Training ---
+# `flask train-model` retrains the RandomForest on the live database: one batched read of
+# student_metrics gives the METRIC_NAMES matrix (the same numbers the calculate_* helpers
+# produce) and each student's current category as the label, and the forest is fitted with
+# n_jobs=-1 (every core). Each run writes models/performance_model-<version>.pkl and a
+# matching .json (feature order, training rows, class counts, holdout accuracy, timings),
+# then activates it by replacing MODEL_POINTER with os.replace: workers notice the new
+# pointer on their next prediction and load the new version, no restart needed.
+# `flask activate-model <version>` rolls back to (or forward to) any stored version.
+MODEL_TRAINING_DEFAULTS = {
+    'n_estimators': 100,
+    'max_depth': None,
+    'test_size': 0.2, # Share of students held out to report accuracy
+    'random_state': 42,
+    'n_jobs': -1,
+}
+
+def model_artifact_paths(version):
+    """(model, metadata) file paths of a stored model version."""
+    base = os.path.join(MODEL_DIR, f'performance_model-{version}')
+    return base + '.pkl', base + '.json'
+
+def _write_atomically(path, write):
+    """Writes through `write(file)` to a temporary file, then renames it over `path`."""
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as f:
+        write(f)
+    os.replace(temporary, path)
+
+def extract_training_data(conn):
+    """(ids, features, labels) for every student in one read of student_metrics: the
+    METRIC_NAMES matrix and the index of each student's category in PERFORMANCE_CATEGORIES."""
+    import numpy as np
+    ids, matrix = calculate_metric_matrix(None, conn)
+    scores = apply_performance_weights(matrix)
+    labels = _category_codes(scores[:, None], [list(CATEGORY_THRESHOLDS.values())])[:, 0]
+    return ids, matrix, labels.astype(np.int64)
+
+def train_performance_model(conn, n_estimators=None, max_depth=None, test_size=None, random_state=None,
+                            n_jobs=None, activate=True):
+    """Fits a RandomForestClassifier on the current data, stores it as a new version and
+    (unless activate=False) makes it the active model. Returns its metadata."""
+    import joblib
+    import numpy as np
+    import sklearn
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.model_selection import train_test_split
+    params = {key: default if value is None else value for (key, default), value in zip(
+        MODEL_TRAINING_DEFAULTS.items(), (n_estimators, max_depth, test_size, random_state, n_jobs))}
+    timings = {}
+
+    started = time.perf_counter()
+    ids, features, labels = extract_training_data(conn)
+    timings['extract'] = time.perf_counter() - started
+    if len(np.unique(labels)) < 2:
+        raise ValueError('Training needs students in at least two performance categories.')
+
+    started = time.perf_counter()
+    holdout = None
+    if params['test_size'] and len(ids) >= 10:
+        _, counts = np.unique(labels, return_counts=True)
+        stratify = labels if counts.min() >= 2 else None # Stratifying needs two students per class
+        train_x, holdout_x, train_y, holdout_y = train_test_split(
+            features, labels, test_size=params['test_size'], random_state=params['random_state'], stratify=stratify)
+        holdout = (holdout_x, holdout_y)
+    else:
+        train_x, train_y = features, labels
+    model = RandomForestClassifier(n_estimators=params['n_estimators'], max_depth=params['max_depth'],
+                                   random_state=params['random_state'], n_jobs=params['n_jobs'])
+    model.fit(train_x, train_y)
+    model.set_params(n_jobs=None) # Predictions are single small batches; don't fan out per request
+    timings['fit'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    accuracy = float(model.score(*holdout)) if holdout else None
+    timings['evaluate'] = time.perf_counter() - started
+
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    version = time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())
+    suffix = 1
+    while os.path.exists(model_artifact_paths(version)[0]):
+        suffix += 1
+        version = f"{time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())}-{suffix}"
+    model_path, metadata_path = model_artifact_paths(version)
+    started = time.perf_counter()
+    _write_atomically(model_path, lambda f: joblib.dump(model, f))
+    timings['write'] = time.perf_counter() - started
+
+    metadata = {
+        'version': version,
+        'model_file': os.path.basename(model_path),
+        'features': list(METRIC_NAMES),
+        'classes': [MODEL_CLASS_LABELS[int(cls)] for cls in model.classes_],
+        'training_rows': int(len(train_y)),
+        'holdout_rows': int(len(holdout[1])) if holdout else 0,
+        'class_counts': {MODEL_CLASS_LABELS[int(cls)]: int(count) for cls, count in zip(*np.unique(labels, return_counts=True))},
+        'holdout_accuracy': accuracy,
+        'params': params,
+        'timings': {step: round(seconds, 4) for step, seconds in timings.items()},
+        'sklearn_version': sklearn.__version__,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+    }
+    _write_atomically(metadata_path, lambda f: f.write(json.dumps(metadata, indent=2).encode()))
+    if activate:
+        activate_performance_model(version)
+    return metadata
+
+def activate_performance_model(version):
+    """Makes a stored version the active model by atomically replacing MODEL_POINTER with a
+    copy of its metadata. Returns the metadata."""
+    model_path, metadata_path = model_artifact_paths(version)
+    if not os.path.exists(model_path) or not os.path.exists(metadata_path):
+        raise FileNotFoundError(f'No stored model version {version!r}')
+    with open(metadata_path, 'rb') as f:
+        metadata = f.read()
+    _write_atomically(MODEL_POINTER, lambda f: f.write(metadata))
+    return json.loads(metadata)
+
+def list_model_versions():
+    """Metadata of every stored model version, oldest first."""
+    if not os.path.isdir(MODEL_DIR):
+        return []
+    versions = []
+    for name in sorted(os.listdir(MODEL_DIR)):
+        if name.startswith('performance_model-') and name.endswith('.json'):
+            with open(os.path.join(MODEL_DIR, name)) as f:
+                versions.append(json.load(f))
+    return versions
+
+@app.cli.command('train-model')
+@click.option('--trees', 'n_estimators', type=int, default=None, help='Trees in the forest (default 100).')
+@click.option('--max-depth', type=int, default=None, help='Maximum tree depth (default unlimited).')
+@click.option('--test-size', type=float, default=None, help='Share of students held out for accuracy (default 0.2, 0 for none).')
+@click.option('--seed', 'random_state', type=int, default=None, help='Random seed (default 42).')
+@click.option('--jobs', 'n_jobs', type=int, default=None, help='Parallel fitting jobs (default -1: every core).')
+@click.option('--no-activate', is_flag=True, help='Store the new version without making it the active model.')
+def train_model_command(n_estimators, max_depth, test_size, random_state, n_jobs, no_activate):
+    """Retrain the performance model on the current database."""
+    try:
+        metadata = train_performance_model(get_db(), n_estimators, max_depth, test_size, random_state, n_jobs,
+                                           activate=not no_activate)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    timings = ', '.join(f'{step} {seconds:.2f}s' for step, seconds in metadata['timings'].items())
+    accuracy = metadata['holdout_accuracy']
+    click.echo(f"Model {metadata['version']}: {metadata['training_rows']} training row(s), "
+               f"holdout accuracy {'n/a' if accuracy is None else f'{accuracy:.3f}'} ({timings}).")
+    click.echo('Stored only; activate with `flask activate-model ' + metadata['version'] + '`.' if no_activate
+               else 'Active; running workers switch on their next prediction.')
+
+@app.cli.command('activate-model')
+@click.argument('version', required=False)
+def activate_model_command(version):
+    """Make a stored model version active (lists versions when none is given)."""
+    if version is None:
+        active = get_model_metadata()['version']
+        for metadata in list_model_versions():
+            accuracy = metadata['holdout_accuracy']
+            click.echo(f"{'*' if metadata['version'] == active else ' '} {metadata['version']}  "
+                       f"{metadata['training_rows']} rows  accuracy {'n/a' if accuracy is None else f'{accuracy:.3f}'}")
+        return
+    try:
+        activate_performance_model(version)
+    except FileNotFoundError as e:
+        raise click.ClickException(str(e))
+    click.echo(f'Model {version} is now active.')
+
+# --- Prediction Cache ---
+# Per-process LRU cache of each student's model prediction, keyed by (student_id,
+# data_version, model version). Write routes bump data_version in student_metrics (see
+# update_student_metrics), so a changed student simply misses and stale entries age out.
+# Score breakdowns aren't cached: since student_metrics they cost the same one-row read as
+# the data_version check a cache hit would need.
+SCORE_CACHE_SIZE = int(os.environ.get('SCORE_CACHE_SIZE', 4096)) # Max cached entries
+
+class LRUCache:
+    """Thread-safe least-recently-used mapping with hit/miss/eviction counters."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+score_cache = LRUCache(SCORE_CACHE_SIZE)
+
+def get_student_data_version(student_db_id, conn=None):
+    conn = conn or get_db()
+    row = conn.execute("SELECT data_version FROM student_metrics WHERE student_id = ?", (student_db_id,)).fetchone()
+    return row[0] if row else 0
+
+_CACHE_MISS = object()
+
+def cached_student_prediction(student_db_id, conn=None):
+    """predict_student_performance() through the cache, for the student's current data_version
+    and the active model version; computed on a miss."""
+    key = (int(student_db_id), get_student_data_version(student_db_id, conn), get_model_pointer_key())
+    value = score_cache.get(key, _CACHE_MISS)
+    if value is _CACHE_MISS:
+        value = predict_student_performance(student_db_id, conn)
+        score_cache.put(key, value)
+    return value
+
+# --- Student Identity Map ---
+# Intern routes start by resolving session['user_id'] to the student, and admin write routes
+# by resolving a unique student ID. Both resolutions (with the student's course, name and
+# email) are kept per process in an LRU cache keyed by ('user', user_id) and ('unique', ID),
+# so a hit costs no query and doesn't check out a connection. Unknown keys aren't cached, so
+# a new student is found as soon as they exist. No route or import updates or deletes a
+# student row once it is inserted, so cached entries never go stale; a write path that
+# starts changing them must also clear student_identity_cache (in every process).
+
+STUDENT_IDENTITY_CACHE_SIZE = int(os.environ.get('STUDENT_IDENTITY_CACHE_SIZE', 20000)) # Entries (two per student)
+
+StudentIdentity = namedtuple('StudentIdentity', 'id user_id unique_student_id name email course_id')
+
+student_identity_cache = LRUCache(STUDENT_IDENTITY_CACHE_SIZE)
+
+def lookup_student(user_id=None, unique_student_id=None, conn=None):
+    """The StudentIdentity for a user id or a unique student ID, or None if there is no such student."""
+    key = ('user', user_id) if user_id is not None else ('unique', unique_student_id)
+    student = student_identity_cache.get(key)
+    if student is not None:
+        return student
+    row = (conn or get_db()).execute(f'''
+        SELECT id, user_id, unique_student_id, name, email, course_id FROM students
+        WHERE {'user_id' if key[0] == 'user' else 'unique_student_id'} = ?
+    ''', (key[1],)).fetchone()
+    if row is None:
+        return None
+    student = StudentIdentity(*row)
+    if student.user_id is not None:
+        student_identity_cache.put(('user', student.user_id), student)
+    student_identity_cache.put(('unique', student.unique_student_id), student)
+    return student
+
+# --- Dashboard Counters ---
+# admin_dashboard is every admin's landing page. Its five counters come from one statement
+# and are then served from memory for DASHBOARD_CACHE_TTL seconds, or until a write route
+# that changes one of them calls invalidate_dashboard_counts().
+
+DASHBOARD_CACHE_TTL = float(os.environ.get('DASHBOARD_CACHE_TTL', 10)) # Seconds
+
+_dashboard_counts = None # (date, expires_at, counts)
+_dashboard_counts_generation = 0 # Bumped by every invalidation
+_dashboard_counts_lock = threading.Lock()
+
+def get_dashboard_counts(conn=None):
+    """Returns the admin dashboard counters for today, from the cache when fresh."""
+    global _dashboard_counts
+    today = datetime.now().strftime('%Y-%m-%d')
+    cached = _dashboard_counts
+    if cached and cached[0] == today and cached[1] > time.monotonic():
+        return cached[2]
+
+    generation = _dashboard_counts_generation
+    row = (conn or get_db()).execute('''
+        SELECT (SELECT COUNT(*) FROM students),
+               (SELECT COUNT(*) FROM tasks WHERE status = 'pending'),
+               (SELECT COUNT(*) FROM courses),
+               (SELECT COUNT(*) FROM attendance WHERE date = :today AND status = 'present'),
+               (SELECT COUNT(*) FROM attendance WHERE date = :today AND status = 'absent')
+    ''', {'today': today}).fetchone()
+    counts = dict(zip(('total_students', 'pending_tasks', 'total_courses', 'today_present_count',
+                       'today_absent_count'), row))
+    with _dashboard_counts_lock:
+        # Don't cache a result read before a concurrent write invalidated it
+        if generation == _dashboard_counts_generation:
+            _dashboard_counts = (today, time.monotonic() + DASHBOARD_CACHE_TTL, counts)
+    return counts
+
+def invalidate_dashboard_counts():
+    """Call after committing changes to students, courses, task status or attendance."""
+    global _dashboard_counts, _dashboard_counts_generation
+    with _dashboard_counts_lock:
+        _dashboard_counts_generation += 1
+        _dashboard_counts = None
+
+# --- Percentile Ranks & At-risk Students ---
+# Every student's overall score ranked within their course and within the whole cohort, in
+# one sorted pass over the batch scores, kept in memory between requests. The triggers in
+# SCORE_CHANGE_SOURCES stamp each student whose score inputs change with a higher seq in
+# score_changes, so a refresh re-scores only the students changed since the previous one
+# (one indexed query when nothing changed) and re-ranks with a single lexsort.
+
+# At-risk bands: bottom N percent of each course, configurable as e.g. AT_RISK_PERCENTILES=5,10,25
+AT_RISK_PERCENTILES = tuple(float(p) for p in os.environ.get('AT_RISK_PERCENTILES', '5,10,25').split(','))
+RANKING_TOP_K = 5 # Default students per course for top-k/bottom-k
+
+class StudentRankings:
+    """Overall scores of all students (sorted by id) with their percentile rank -- the share of
+    students scoring strictly lower, 0-100 -- within their course and within the cohort.
+    Students without a course are ranked together under course id 0."""
+
+    def __init__(self, ids, course_ids, scores):
+        import numpy as np
+        self.ids, self.course_ids, self.scores = ids, course_ids, scores
+        count = len(ids)
+        # Sorted by course, then score (then id), each course is one contiguous run
+        self.order = np.lexsort((ids, scores, course_ids))
+        sorted_courses, sorted_scores = course_ids[self.order], scores[self.order]
+        self.courses, self.course_starts, course_sizes = np.unique(sorted_courses, return_index=True, return_counts=True)
+        course_start = np.repeat(self.course_starts, course_sizes)
+        # Position of the first of each run of equal scores in a course, so ties share a rank
+        new_run = np.ones(count, dtype=bool)
+        new_run[1:] = (sorted_courses[1:] != sorted_courses[:-1]) | (sorted_scores[1:] != sorted_scores[:-1])
+        run_start = np.maximum.accumulate(np.where(new_run, np.arange(count), 0))
+        self.course_percentile = np.empty(count)
+        self.course_percentile[self.order] = (run_start - course_start) / np.repeat(course_sizes, course_sizes) * 100
+        self.cohort_percentile = np.searchsorted(np.sort(scores), scores, side='left') / max(count, 1) * 100
+        self._at_risk = {} # percentile -> rows, built on first use
+
+    def row_of(self, student_db_id):
+        import numpy as np
+        row = int(np.searchsorted(self.ids, student_db_id))
+        return row if row < len(self.ids) and self.ids[row] == student_db_id else None
+
+    def course_extremes(self, k=RANKING_TOP_K, bottom=True):
+        """{course id: rows of its k lowest (or highest) scoring students, worst (best) first}."""
+        extremes = {}
+        ends = [*self.course_starts[1:].tolist(), len(self.ids)]
+        for course_id, start, end in zip(self.courses.tolist(), self.course_starts.tolist(), ends):
+            rows = self.order[start:min(start + k, end)] if bottom else self.order[max(end - k, start):end][::-1]
+            extremes[course_id] = rows.tolist()
+        return extremes
+
+    def at_risk(self, percentile):
+        """Rows of students below `percentile` within their course, lowest percentile first."""
+        import numpy as np
+        if percentile not in self._at_risk:
+            rows = np.flatnonzero(self.course_percentile < percentile)
+            self._at_risk[percentile] = rows[np.lexsort((self.scores[rows], self.course_percentile[rows]))].tolist()
+        return self._at_risk[percentile]
+
+_rankings = None # (seq, StudentRankings)
+_rankings_lock = threading.Lock()
+
+def _score_students(conn, student_ids=None):
+    """(ids, course ids, overall scores) for all students or the given subset."""
+    import numpy as np
+    ids, matrix = calculate_metric_matrix(student_ids, conn)
+    course_of = dict(_fetch_grouped(conn.cursor(), "SELECT id, COALESCE(course_id, 0) FROM students WHERE 1 = 1 {filter}",
+                                    _normalize_student_ids(student_ids), 'id'))
+    course_ids = np.array([course_of.get(student_db_id, 0) for student_db_id in ids.tolist()], dtype=np.int64)
+    return ids, course_ids, apply_performance_weights(matrix)
+
+def get_student_rankings(conn=None):
+    """Returns the current StudentRankings, re-scoring only students changed since the last call."""
+    import numpy as np
+    global _rankings
+    conn = conn or get_db()
+    with _rankings_lock:
+        # Read the seq before the scores, so the scores are at least as new as the seq recorded
+        seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM score_changes").fetchone()[0]
+        if _rankings is not None and _rankings[0] == seq:
+            return _rankings[1]
+        changed = None
+        if _rankings is not None:
+            changed = [row[0] for row in conn.execute("SELECT student_id FROM score_changes WHERE seq > ?", (_rankings[0],))]
+            if len(changed) > len(_rankings[1].ids) // 2:
+                changed = None # Cheaper to score everyone in one pass
+        if changed is None:
+            ids, course_ids, scores = _score_students(conn)
+        else:
+            previous = _rankings[1]
+            new_ids, new_course_ids, new_scores = _score_students(conn, changed)
+            keep = ~np.isin(previous.ids, changed) # Changed students missing from new_ids were deleted
+            ids = np.concatenate([previous.ids[keep], new_ids])
+            by_id = np.argsort(ids, kind='stable')
+            ids = ids[by_id]
+            course_ids = np.concatenate([previous.course_ids[keep], new_course_ids])[by_id]
+            scores = np.concatenate([previous.scores[keep], new_scores])[by_id]
+        _rankings = (seq, StudentRankings(ids, course_ids, scores))
+        return _rankings[1]
+
+def describe_ranked_students(conn, rankings, rows):
+    """Ranking rows -> dicts with the student's ID, name, course, score and percentiles."""
+    details = {row[0]: row[1:] for row in _fetch_grouped(conn.cursor(), '''
+        SELECT s.id, s.unique_student_id, s.name, c.name
+        FROM students s LEFT JOIN courses c ON c.id = s.course_id WHERE 1 = 1 {filter}
+    ''', sorted({int(rankings.ids[row]) for row in rows}), 's.id')}
+    described = []
+    for row in rows:
+        unique_student_id, name, course = details.get(int(rankings.ids[row]), (None, None, None))
+        score = float(rankings.scores[row])
+        described.append({
+            'student_id': unique_student_id,
+            'name': name,
+            'course': course,
+            'overall_score': round(score, 2),
+            'category': get_performance_category(score),
+            'course_percentile': round(float(rankings.course_percentile[row]), 1),
+            'cohort_percentile': round(float(rankings.cohort_percentile[row]), 1),
+        })
+    return described
+
+# --- Course Autocomplete Index ---
+# get_course_suggestions() used to run LOWER(name) LIKE '%q%' (a full table scan) per
+# keystroke. Course names are now kept in memory: a sorted array of lowercased names
+# answers prefix queries by binary search, and substring queries scan one string holding
+# all names in the same order with str.find, so matches come out alphabetically and the
+# scan stops at the limit. The sets of 1-3 character n-grams in the names (collected with
+# NumPy) rule out most queries with no substring match, which would scan the whole string.
+# The index is built on the first lookup (not at import, which would slow every start-up)
+# together with a version marker of the courses table (row count, highest id and total name
+# length). Lookups re-read the marker at most every COURSE_INDEX_CHECK_INTERVAL seconds and
+# rebuild when it has changed, so courses added by another worker or by `flask seed` show
+# up without a restart; invalidate_course_index() makes this process rebuild immediately.
+
+COURSE_SUGGESTION_LIMIT = 10
+COURSE_INDEX_CHECK_INTERVAL = float(os.environ.get('COURSE_INDEX_CHECK_INTERVAL', 2)) # Seconds
+
+class CourseNameIndex:
+    """Immutable index over course names. suggest() ranks prefix matches before
+    substring matches, alphabetically within each group, case-insensitively."""
+    SEPARATOR = '\0' # Can't occur in a query, so a match never spans two names
+
+    def __init__(self, names):
+        pairs = sorted((name.lower(), name) for name in names)
+        self.keys = [key for key, _ in pairs]
+        self.names = [name for _, name in pairs]
+        self.text = self.SEPARATOR.join(self.keys)
+        self.ngrams = self._collect_ngrams(self.text)
+        self.offsets = [] # Start of each key in self.text
+        offset = 0
+        for key in self.keys:
+            self.offsets.append(offset)
+            offset += len(key) + 1
+
+    def __len__(self):
+        return len(self.keys)
+
+    @staticmethod
+    def _ngram_code(gram):
+        code = 0
+        for char in gram:
+            code = (code << 21) | ord(char) # 21 bits hold any code point
+        return code
+
+    @staticmethod
+    def _collect_ngrams(text):
+        """Returns ({1: chars, 2: bigram codes, 3: trigram codes}) for the whole text."""
+        import numpy as np
+        codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+        trigrams = np.unique((codes[:-2] << np.uint64(42)) | (codes[1:-1] << np.uint64(21)) | codes[2:])
+        # Every bigram except the text's last one starts a trigram
+        bigrams = set(np.unique(trigrams >> np.uint64(21)).tolist())
+        bigrams.add(CourseNameIndex._ngram_code(text[-2:]))
+        return {1: set(text), 2: bigrams, 3: set(trigrams.tolist())}
+
+    def _may_contain(self, query):
+        if len(query) < 3:
+            grams = self.ngrams[len(query)]
+            return (query if len(query) == 1 else self._ngram_code(query)) in grams
+        return all(self._ngram_code(query[i:i + 3]) in self.ngrams[3] for i in range(len(query) - 2))
+
+    def _prefix_range(self, query):
+        start = bisect.bisect_left(self.keys, query)
+        end = bisect.bisect_left(self.keys, query[:-1] + chr(ord(query[-1]) + 1), lo=start)
+        return start, end
+
+    def suggest(self, query, limit=COURSE_SUGGESTION_LIMIT):
+        query = query.lower().replace(self.SEPARATOR, '')
+        if not query:
+            return self.names[:limit]
+        start, end = self._prefix_range(query)
+        results = list(range(start, min(end, start + limit)))
+        found = self.text.find(query) if len(results) < limit and self._may_contain(query) else -1
+        while found != -1 and len(results) < limit:
+            position = bisect.bisect_right(self.offsets, found) - 1
+            if start <= position < end:
+                position = end - 1 # Prefix matches are already listed; skip past them
+            elif found != self.offsets[position]: # (a match at the very start is a prefix match)
+                results.append(position)
+            if position + 1 >= len(self.offsets):
+                break
+            found = self.text.find(query, self.offsets[position + 1])
+        return [self.names[position] for position in results]
+
+_course_index = None # (version marker, next check time, CourseNameIndex)
+_course_index_lock = threading.Lock()
+
+def _course_index_marker(conn):
+    return tuple(conn.execute("SELECT COUNT(*), MAX(id), TOTAL(LENGTH(name)) FROM courses").fetchone())
+
+def get_course_index(conn=None):
+    global _course_index
+    state = _course_index
+    if state is not None and time.monotonic() < state[1]:
+        return state[2]
+    with _course_index_lock:
+        state = _course_index
+        if state is not None and time.monotonic() < state[1]:
+            return state[2]
+        conn = conn or get_db()
+        marker = _course_index_marker(conn)
+        if state is not None and state[0] == marker:
+            index = state[2] # Unchanged; just push the next check back
+        else:
+            index = CourseNameIndex(row[0] for row in conn.execute("SELECT name FROM courses").fetchall())
+        _course_index = (marker, time.monotonic() + COURSE_INDEX_CHECK_INTERVAL, index)
+    return index
+
+def invalidate_course_index():
+    """Call after inserting, renaming or deleting courses; this process's next lookup
+    rebuilds (other processes notice within COURSE_INDEX_CHECK_INTERVAL)."""
+    global _course_index
+    _course_index = None
+
+# --- Full-Text Search ---
+# feedback.comments and student_feedback_to_admin.subject/message are indexed by the FTS5
+# tables created in migration 5, kept in sync by triggers. search_messages() ranks hits
+# from both with BM25 and returns highlighted snippets.
+
+SEARCH_RESULT_LIMIT = 50
+# Source -> (FTS table, content table, date column, BM25 expression, subject column)
+SEARCH_SOURCES = {
+    'feedback': ('feedback_fts', 'feedback', 'feedback_date', 'bm25(feedback_fts)', None),
+    # Subject hits weigh twice as much as message hits
+    'messages': ('student_feedback_fts', 'student_feedback_to_admin', 'timestamp',
+                 'bm25(student_feedback_fts, 2.0, 1.0)', 'subject'),
+}
+# FTS5 snippet() markers; control characters can't come from typed text, so the snippet is
+# HTML-escaped first and the markers are then swapped for <mark> tags
+_SNIPPET_START, _SNIPPET_END = '\x02', '\x03'
+
+def build_search_query(text):
+    """Turns free text into an FTS5 query: every word must match, as a literal term (so
+    FTS5 operators typed by users can't cause syntax errors). A trailing * on a word makes
+    it a prefix search."""
+    terms = []
+    for word in text.split():
+        prefix = word.endswith('*')
+        word = word.rstrip('*')
+        if word:
+            terms.append('"{}"{}'.format(word.replace('"', '""'), '*' if prefix else ''))
+    return ' '.join(terms)
+
+def highlight_snippet(snippet):
+    return str(escape(snippet or '')).replace(_SNIPPET_START, '<mark>').replace(_SNIPPET_END, '</mark>')
+
+def search_messages(conn, text, student=None, date_from=None, date_to=None, sources=tuple(SEARCH_SOURCES),
+                    limit=SEARCH_RESULT_LIMIT):
+    """Full-text search over admin feedback comments and intern messages, best match first.
+    Filters: unique student ID and an inclusive YYYY-MM-DD date range (ValueError if
+    malformed). Returns dicts whose 'snippet' is HTML with the matched terms in <mark> tags."""
+    match = build_search_query(text)
+    if not match:
+        return []
+    filters, filter_params = [], []
+    if student:
+        student = lookup_student(unique_student_id=student, conn=conn)
+        if student is None:
+            return []
+        filters.append('b.student_id = ?')
+        filter_params.append(student.id)
+    if date_from:
+        filters.append('b.{date} >= ?')
+        filter_params.append(datetime.strptime(date_from, '%Y-%m-%d').strftime('%Y-%m-%d'))
+    if date_to: # Compared as "before the next day" so timestamps on date_to itself are included
+        filters.append('b.{date} < ?')
+        filter_params.append((datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d'))
+
+    # Pass 1: rank. Only rowids and BM25 scores, and only join the content table when a
+    # filter needs it; snippets are comparatively expensive and made for the winners only
+    queries, params = [], []
+    for source in sources:
+        fts, table, date_column, bm25, _ = SEARCH_SOURCES[source]
+        join = f'JOIN {table} b ON b.id = {fts}.rowid' if filters else ''
+        conditions = ''.join(f' AND {clause.format(date=date_column)}' for clause in filters)
+        queries.append(f'''
+            SELECT * FROM (
+                SELECT '{source}' AS source, {fts}.rowid AS id, {bm25} AS rank
+                FROM {fts} {join}
+                WHERE {fts} MATCH ?{conditions}
+                ORDER BY rank LIMIT ?
+            )
+        ''')
+        params += [match, *filter_params, limit]
+    if not queries:
+        return []
+    ranked = conn.execute(' UNION ALL '.join(queries) + ' ORDER BY rank LIMIT ?', (*params, limit)).fetchall()
+
+    # Pass 2: details and snippets for the ranked rows
+    details = {}
+    for source in sources:
+        ids = [row_id for row_source, row_id, _ in ranked if row_source == source]
+        if not ids:
+            continue
+        fts, table, date_column, _, subject_column = SEARCH_SOURCES[source]
+        cursor = conn.execute(f'''
+            SELECT b.id, s.unique_student_id, s.name, b.{date_column}, {f'b.{subject_column}' if subject_column else 'NULL'},
+                   snippet({fts}, -1, ?, ?, '…', 16)
+            FROM {fts}
+            JOIN {table} b ON b.id = {fts}.rowid
+            JOIN students s ON s.id = b.student_id
+            WHERE {fts} MATCH ? AND {fts}.rowid IN ({','.join('?' * len(ids))})
+        ''', (_SNIPPET_START, _SNIPPET_END, match, *ids))
+        for row_id, *values in cursor.fetchall():
+            details[source, row_id] = values
+
+    results = []
+    for source, row_id, rank in ranked:
+        if (source, row_id) not in details:
+            continue # Deleted between the two passes
+        unique_student_id, name, date, subject, snippet = details[source, row_id]
+        results.append({
+            'source': source,
+            'id': row_id,
+            'student_id': unique_student_id,
+            'name': name,
+            'date': date,
+            'subject': subject,
+            'snippet': highlight_snippet(snippet),
+            'rank': round(rank, 4),
+        })
+    return results
+
+def rebuild_search_index(conn):
+    """Re-indexes every feedback comment and intern message from the content tables."""
+    conn.execute("INSERT INTO feedback_fts (feedback_fts) VALUES ('rebuild')")
+    conn.execute("INSERT INTO student_feedback_fts (student_feedback_fts) VALUES ('rebuild')")
+    conn.commit()
+
+@app.cli.command('rebuild-search')
+def rebuild_search_command():
+    """Rebuild the full-text search index from the feedback and message tables."""
+    rebuild_search_index(get_db())
+    click.echo("Search index rebuilt.")
+
+# --- Keyset Pagination ---
+# List views fetch one page at a time with a WHERE (sort key) > (last key seen) seek
+# instead of OFFSET, so page N costs the same index seek as page 1. The sort key of the
+# first/last row on a page is handed to the client as an opaque ?after= / ?before= token.
+
+PAGE_SIZE_DEFAULT = 50
+PAGE_SIZE_MAX = 500
+
+def encode_page_token(key):
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode().rstrip('=')
+
+def decode_page_token(token, key_length):
+    """Returns the key tuple from a page token, or None if it is missing or malformed."""
+    if not token:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except ValueError:
+        return None
+    return tuple(key) if isinstance(key, list) and len(key) == key_length else None
+
+def _keyset_condition(columns, key, larger):
+    """SQL (with params) selecting rows whose (columns) sort after `key` in ascending
+    order when `larger`, before it otherwise. The last column must be unique; only the
+    first may be NULL (NULLs sort first in SQLite)."""
+    op = '>' if larger else '<'
+    first, rest = columns[0], columns[1:]
+    if key[0] is None:
+        rest_condition = f"({', '.join(rest)}) {op} ({', '.join('?' * len(rest))})" if rest else '0'
+        if larger:
+            return f'(({first} IS NULL AND {rest_condition}) OR {first} IS NOT NULL)', list(key[1:])
+        return f'({first} IS NULL AND {rest_condition})', list(key[1:])
+    condition = f"({', '.join(columns)}) {op} ({', '.join('?' * len(columns))})"
+    if larger:
+        return condition, list(key)
+    return f'({condition} OR {first} IS NULL)', list(key)
+
+def page_args(sorts, default_sort, default_direction='asc'):
+    """Reads sort, dir, per_page, after and before from the query string."""
+    sort = request.args.get('sort', default_sort)
+    if sort not in sorts:
+        sort = default_sort
+    direction = request.args.get('dir', default_direction)
+    if direction not in ('asc', 'desc'):
+        direction = default_direction
+    per_page = request.args.get('per_page', PAGE_SIZE_DEFAULT, type=int)
+    return {
+        'sort': sort,
+        'direction': direction,
+        'per_page': max(1, min(per_page, PAGE_SIZE_MAX)),
+        'after': request.args.get('after'),
+        'before': request.args.get('before'),
+    }
+
+def fetch_keyset_page(cursor, sql, params, sorts, sort, direction='asc', per_page=PAGE_SIZE_DEFAULT,
+                      after=None, before=None):
+    """Runs `sql` (with {keys} in its SELECT list and a {filter} placeholder after its WHERE)
+    for one page ordered by sorts[sort]. Rows keep the sort key as their trailing columns.
+    Returns a dict with the rows and the tokens for the previous/next pages."""
+    columns = sorts[sort]
+    after_key = decode_page_token(after, len(columns))
+    before_key = None if after_key else decode_page_token(before, len(columns))
+    backwards = before_key is not None # Walking back: seek the other way, then flip the rows
+    ascending = (direction == 'asc') != backwards
+
+    condition, condition_params = '', []
+    if after_key or before_key:
+        condition, condition_params = _keyset_condition(columns, after_key or before_key, larger=ascending)
+        condition = f' AND {condition}'
+    order = ', '.join(f"{column} {'ASC' if ascending else 'DESC'}" for column in columns)
+    cursor.execute(sql.format(keys=', '.join(columns), filter=condition) + f' ORDER BY {order} LIMIT ?',
+                   (*params, *condition_params, per_page + 1))
+    rows = cursor.fetchall()
+    has_more = len(rows) > per_page # The extra row only says whether another page exists
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    first_key = tuple(rows[0][-len(columns):]) if rows else None
+    last_key = tuple(rows[-1][-len(columns):]) if rows else None
+    has_next = has_more if not backwards else True
+    has_previous = has_more if backwards else after_key is not None
+    return {
+        'rows': rows,
+        'sort': sort,
+        'direction': direction,
+        'per_page': per_page,
+        'next': encode_page_token(last_key) if rows and has_next else None,
+        'previous': encode_page_token(first_key) if rows and has_previous else None,
+    }
+
+# --- Bulk Import ---
+# Streaming import of students, tasks and task marks from CSV or NDJSON uploads. Records
+# are parsed one line at a time from the upload stream, course names and student IDs are
+# resolved through dicts loaded once per import, and valid rows are written
+# IMPORT_CHUNK_SIZE at a time with executemany, one transaction per chunk.
+
+IMPORT_CHUNK_SIZE = 500 # Rows per executemany batch and commit
+IMPORT_MAX_REPORTED_ERRORS = 100 # Per-row errors listed in the summary; the rest are only counted
+IMPORT_FORMATS = ('csv', 'ndjson')
+TASK_STATUSES = ('pending', 'completed', 'overdue')
+
+def import_format_for(filename=None, mimetype=None):
+    """Guesses the import format from a file name or content type (None if unknown)."""
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension == '.csv' or mimetype == 'text/csv':
+        return 'csv'
+    if extension in ('.ndjson', '.jsonl') or mimetype in ('application/x-ndjson', 'application/jsonl'):
+        return 'ndjson'
+    return None
+
+def iter_import_records(stream, fmt):
+    """Yields (line_number, record) from a binary stream without reading it all into memory.
+    Records are dicts; lines that can't be parsed yield a ValueError instead."""
+    if not hasattr(stream, 'read1'):
+        stream = io.BufferedReader(stream)
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for record in reader:
+            yield reader.line_num, {key.strip(): value for key, value in record.items() if key is not None}
+    elif fmt == 'ndjson':
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_number, ValueError(f'invalid JSON: {e.msg}')
+                continue
+            yield line_number, record if isinstance(record, dict) else ValueError('expected a JSON object')
+    else:
+        raise ValueError(f"Unsupported import format {fmt!r}; expected one of {', '.join(IMPORT_FORMATS)}")
+
+def _import_field(record, name, required=True):
+    value = record.get(name)
+    value = '' if value is None else str(value).strip()
+    if not value and required:
+        raise ValueError(f'missing {name}')
+    return value or None
+
+def _import_mark(value, default=None):
+    if value is None:
+        return default
+    try:
+        mark = float(value)
+    except ValueError:
+        raise ValueError(f'invalid mark {value!r}')
+    if not 0 <= mark <= 100:
+        raise ValueError('mark must be between 0 and 100')
+    return mark
+
+def _sum_metric_deltas(totals, student_db_id, deltas):
+    row = totals.setdefault(student_db_id, [0] * len(deltas))
+    for col, delta in enumerate(deltas):
+        row[col] += delta
+
+class StudentImporter:
+    """Columns: unique_student_id, name, email, temp_password, course (optional).
+    Creates the intern's login and student row, like add_student."""
+    def __init__(self, cursor):
+        cursor.execute("SELECT name, id FROM courses")
+        self.courses = dict(cursor.fetchall())
+        cursor.execute("SELECT username FROM users UNION SELECT unique_student_id FROM students")
+        self.usernames = {row[0] for row in cursor.fetchall()}
+        cursor.execute("SELECT email FROM students")
+        self.emails = {row[0] for row in cursor.fetchall()}
+
+    def parse(self, record):
+        unique_student_id = _import_field(record, 'unique_student_id')
+        name = _import_field(record, 'name')
+        email = _import_field(record, 'email')
+        password = _import_field(record, 'temp_password')
+        course_name = _import_field(record, 'course', required=False)
+        if unique_student_id in self.usernames:
+            raise ValueError(f'student ID (username) {unique_student_id!r} already exists')
+        if email in self.emails:
+            raise ValueError(f'email {email!r} already exists')
+        if course_name and course_name not in self.courses:
+            raise ValueError(f'course {course_name!r} not found')
+        # Reserve the ID and email so duplicates later in the same file are reported too
+        self.usernames.add(unique_student_id)
+        self.emails.add(email)
+        return unique_student_id, name, email, password, self.courses.get(course_name)
+
+    def write(self, cursor, rows):
+        cursor.executemany("INSERT INTO users (username, password, role) VALUES (?, ?, 'intern')",
+                           [(row[0], row[3]) for _, row in rows])
+        cursor.executemany('''
+            INSERT INTO students (unique_student_id, name, email, course_id, user_id)
+            VALUES (?, ?, ?, ?, (SELECT id FROM users WHERE username = ?))
+        ''', [(row[0], row[1], row[2], row[4], row[0]) for _, row in rows])
+        # Start the new students' counters at zero
+        cursor.executemany("INSERT OR IGNORE INTO student_metrics (student_id) SELECT id FROM students WHERE unique_student_id = ?",
+                           [(row[0],) for _, row in rows])
+        return []
+
+class TaskImporter:
+    """Columns: student_id (the unique student ID), title, description, due_date, course,
+    status (pending/completed/overdue, default pending) and mark (default 0)."""
+    METRIC_COUNTERS = ('tasks_total', 'completed_tasks', 'marked_tasks', 'completed_mark_sum', 'completed_in_course')
+
+    def __init__(self, cursor):
+        cursor.execute("SELECT name, id FROM courses")
+        self.courses = dict(cursor.fetchall())
+        cursor.execute("SELECT unique_student_id, id, course_id FROM students")
+        self.students = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+
+    def parse(self, record):
+        unique_student_id = _import_field(record, 'student_id')
+        title = _import_field(record, 'title')
+        course_name = _import_field(record, 'course', required=False)
+        status = (_import_field(record, 'status', required=False) or 'pending').lower()
+        if unique_student_id not in self.students:
+            raise ValueError(f'student {unique_student_id!r} not found')
+        if course_name and course_name not in self.courses:
+            raise ValueError(f'course {course_name!r} not found')
+        if status not in TASK_STATUSES:
+            raise ValueError(f'invalid status {status!r}')
+        student_db_id, student_course_id = self.students[unique_student_id]
+        course_db_id = self.courses.get(course_name)
+        mark = _import_mark(_import_field(record, 'mark', required=False), default=0)
+        completed = status == 'completed'
+        in_course = completed and course_db_id is not None and course_db_id == student_course_id
+        return ((student_db_id, course_db_id, title, _import_field(record, 'description', required=False),
+                 _import_field(record, 'due_date', required=False), status, mark),
+                (1, int(completed), int(completed), mark if completed else 0, int(in_course)))
+
+    def write(self, cursor, rows):
+        cursor.executemany('''
+            INSERT INTO tasks (student_id, course_id, title, description, due_date, status, mark)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [task for _, (task, _) in rows])
+        totals = {}
+        for _, (task, deltas) in rows:
+            _sum_metric_deltas(totals, task[0], deltas)
+        update_student_metrics_many(cursor, self.METRIC_COUNTERS, [(sid, *deltas) for sid, deltas in totals.items()])
+        return []
+
+class MarkImporter:
+    """Columns: task_id, mark. Grades existing tasks and marks them completed, like the
+    Complete Tasks page; already completed tasks are re-graded."""
+    METRIC_COUNTERS = ('completed_tasks', 'marked_tasks', 'completed_mark_sum', 'completed_in_course')
+
+    def __init__(self, cursor):
+        pass
+
+    def parse(self, record):
+        task_id = _import_field(record, 'task_id')
+        try:
+            task_id = int(task_id)
+        except ValueError:
+            raise ValueError(f'invalid task_id {task_id!r}')
+        return task_id, _import_mark(_import_field(record, 'mark'))
+
+    def write(self, cursor, rows):
+        # Task ids are only known per chunk, so tasks are looked up here rather than in parse()
+        tasks = {row[0]: list(row[1:]) for row in _fetch_grouped(cursor, '''
+            SELECT t.id, t.student_id, t.status, t.mark, COALESCE(t.course_id = s.course_id, 0)
+            FROM tasks t JOIN students s ON s.id = t.student_id
+            WHERE 1 = 1 {filter}
+        ''', sorted({task_id for _, (task_id, _) in rows}), column='t.id')}
+        updates, totals, errors = [], {}, []
+        for line_number, (task_id, mark) in rows:
+            task = tasks.get(task_id)
+            if task is None:
+                errors.append((line_number, f'task {task_id} not found'))
+                continue
+            student_db_id, status, previous_mark, in_course = task
+            was_completed = status == 'completed'
+            was_marked = was_completed and previous_mark is not None
+            _sum_metric_deltas(totals, student_db_id, (
+                int(not was_completed), int(not was_marked),
+                mark - (previous_mark if was_marked else 0), in_course * int(not was_completed)))
+            task[1], task[2] = 'completed', mark # Later rows for the same task see this grade
+            updates.append((mark, task_id))
+        cursor.executemany("UPDATE tasks SET status = 'completed', mark = ? WHERE id = ?", updates)
+        update_student_metrics_many(cursor, self.METRIC_COUNTERS, [(sid, *deltas) for sid, deltas in totals.items()])
+        return errors
+
+IMPORTERS = {'students': StudentImporter, 'tasks': TaskImporter, 'marks': MarkImporter}
+
+def _write_import_chunk(conn, importer, chunk, summary):
+    try:
+        errors = importer.write(conn.cursor(), chunk)
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        # A constraint failed somewhere in the chunk: retry row by row to isolate it
+        errors = []
+        for row in chunk:
+            try:
+                errors += importer.write(conn.cursor(), [row])
+                conn.commit()
+            except sqlite3.Error as e:
+                conn.rollback()
+                errors.append((row[0], f'database error: {e}'))
+    summary['imported'] += len(chunk) - len(errors)
+    for line_number, message in errors:
+        _report_import_error(summary, line_number, message)
+    chunk.clear()
+
+def _report_import_error(summary, line_number, message):
+    summary['error_count'] += 1
+    if len(summary['errors']) < IMPORT_MAX_REPORTED_ERRORS:
+        summary['errors'].append({'line': line_number, 'error': message})
+
+def import_records(conn, kind, records, chunk_size=IMPORT_CHUNK_SIZE):
+    """Imports (line_number, record) pairs as `kind` ('students', 'tasks' or 'marks').
+    Rows that fail validation are skipped and reported; a chunk that fails to write is
+    rolled back as a whole. Returns a summary with the row counts and throughput."""
+    if kind not in IMPORTERS:
+        raise ValueError(f"Unknown import kind {kind!r}; expected one of {', '.join(IMPORTERS)}")
+    started = time.perf_counter()
+    importer = IMPORTERS[kind](conn.cursor())
+    summary = {'kind': kind, 'rows': 0, 'imported': 0, 'error_count': 0, 'errors': []}
+    chunk = []
+    for line_number, record in records:
+        summary['rows'] += 1
+        try:
+            if isinstance(record, Exception):
+                raise record
+            chunk.append((line_number, importer.parse(record)))
+        except ValueError as e:
+            _report_import_error(summary, line_number, str(e))
+            continue
+        if len(chunk) >= chunk_size:
+            _write_import_chunk(conn, importer, chunk, summary)
+    if chunk:
+        _write_import_chunk(conn, importer, chunk, summary)
+    invalidate_dashboard_counts()
+    elapsed = time.perf_counter() - started
+    summary['seconds'] = round(elapsed, 3)
+    summary['rows_per_second'] = round(summary['rows'] / elapsed) if elapsed > 0 else None
+    return summary
+
+@app.cli.command('import-data')
+@click.argument('kind', type=click.Choice(list(IMPORTERS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(IMPORT_FORMATS), help='Defaults to the file extension.')
+def import_data_command(kind, path, fmt):
+    """Import students, tasks or marks from a CSV or NDJSON file."""
+    fmt = fmt or import_format_for(path)
+    if fmt is None:
+        raise click.UsageError('Cannot tell the format from the file name; pass --format.')
+    with open(path, 'rb') as stream:
+        summary = import_records(get_db(), kind, iter_import_records(stream, fmt))
+    for error in summary['errors']:
+        click.echo(f"Line {error['line']}: {error['error']}", err=True)
+    click.echo(f"Imported {summary['imported']} of {summary['rows']} {kind} row(s) "
+               f"({summary['error_count']} error(s)) in {summary['seconds']}s, {summary['rows_per_second']} rows/s.")
+
+# --- Bulk Grading ---
+# grade_tasks() applies a whole grading session -- (task_id, mark, status) rows from JSON,
+# CSV or NDJSON -- at once: the columns are validated together with NumPy, the affected
+# tasks are looked up with one IN (...) query per SQLITE_MAX_PARAMS ids, and every change
+# is written with one executemany (plus the student_metrics deltas, summed per student) in
+# a single transaction. Rows that fail validation are reported and skipped.
+
+GRADING_MAX_ROWS = 100_000 # Rows accepted per request
+INT64_RANGE = (-2 ** 63, 2 ** 63 - 1) # SQLite INTEGER bounds
+
+def _integer_column(values):
+    """(int64 array, invalid mask) for a list of raw ids, accepting exactly what the importers'
+    int(str(value)) accepts: integers and integer strings. Booleans, floats (1.0 included),
+    strings like '1.0' and values outside INT64_RANGE are invalid (0 in the array)."""
+    import numpy as np
+    def convert(value):
+        if isinstance(value, str):
+            try:
+                value = int(value.strip())
+            except ValueError:
+                return None
+        elif isinstance(value, bool) or not isinstance(value, int):
+            return None
+        return value if INT64_RANGE[0] <= value <= INT64_RANGE[1] else None
+    converted = [convert(value) for value in values]
+    invalid = np.array([value is None for value in converted], dtype=bool)
+    return np.array([0 if value is None else value for value in converted], dtype=np.int64), invalid
+
+def _numeric_column(values):
+    """Floats for a list of raw values (numbers or strings); NaN where missing or unparseable.
+    Booleans are NaN too, not 0/1, as they are for the importers' float(str(value))."""
+    import numpy as np
+    values = [float('nan') if isinstance(value, bool) else value for value in values]
+    try:
+        return np.array([None if value == '' else value for value in values], dtype=float)
+    except (TypeError, ValueError): # Some value isn't a number: convert one by one
+        def convert(value):
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                return float('nan')
+        return np.array([convert(value) for value in values], dtype=float)
+
+def _missing_mask(values):
+    import numpy as np
+    return np.array([value is None or str(value).strip() == '' for value in values], dtype=bool)
+
+def _task_metric_contributions(completed, marks, in_course):
+    """Each task's contribution to completed_tasks, marked_tasks, completed_mark_sum and
+    completed_in_course (MarkImporter.METRIC_COUNTERS), as columns; NaN marks are NULL."""
+    import numpy as np
+    marked = completed & ~np.isnan(marks)
+    return np.column_stack([completed, marked, np.where(marked, marks, 0.0), completed & in_course]).astype(float)
+
+def grade_tasks(conn, records, only_pending=False):
+    """Grades tasks from (line_number, record) pairs, records being dicts with task_id, mark
+    and status (pending/completed/overdue, default completed; completed needs a 0-100 mark,
+    the others may leave it empty to clear it). A task may appear once per call. With
+    only_pending, tasks that are no longer pending are reported instead of re-graded.
+    Returns a summary with one result per row, in input order."""
+    import numpy as np
+    started = time.perf_counter()
+    records = list(records)
+    lines = [line_number for line_number, _ in records]
+    parsed = [record if isinstance(record, dict) else {} for _, record in records]
+    errors = np.full(len(records), None, dtype=object)
+    failed = np.zeros(len(records), dtype=bool)
+
+    def reject(mask, message):
+        """Records `message` (or message(row) for each row) on rows in `mask` that haven't failed yet."""
+        rows = np.flatnonzero(mask & ~failed)
+        errors[rows] = [message(row) for row in rows] if callable(message) else message
+        failed[rows] = True
+
+    reject(np.array([not isinstance(record, dict) for _, record in records], dtype=bool),
+           lambda row: str(records[row][1]) if isinstance(records[row][1], Exception) else 'expected an object')
+    raw_ids = [record.get('task_id') for record in parsed]
+    raw_marks = [record.get('mark') for record in parsed]
+    statuses = np.array([str(record.get('status') or 'completed').strip().lower() for record in parsed], dtype=object)
+    task_ids, invalid_ids = _integer_column(raw_ids)
+    marks = _numeric_column(raw_marks)
+    mark_missing = _missing_mask(raw_marks)
+
+    reject(_missing_mask(raw_ids), 'missing task_id')
+    reject(invalid_ids | (task_ids <= 0), 'invalid task_id')
+    reject(~np.isin(statuses, TASK_STATUSES), f"status must be one of {', '.join(TASK_STATUSES)}")
+    reject(mark_missing & (statuses == 'completed'), 'missing mark')
+    reject(~mark_missing & np.isnan(marks), 'invalid mark')
+    reject(~mark_missing & ~((marks >= 0) & (marks <= 100)), 'mark must be between 0 and 100')
+    task_ids = np.where(failed, 0, task_ids)
+
+    # Repeated task ids: the first row wins, later ones are errors
+    valid = np.flatnonzero(~failed)
+    _, first = np.unique(task_ids[valid], return_index=True)
+    repeated = np.ones(len(valid), dtype=bool)
+    repeated[first] = False
+    if repeated.any():
+        first_line = {task_ids[row]: lines[row] for row in valid[first]}
+        mask = np.zeros(len(records), dtype=bool)
+        mask[valid[repeated]] = True
+        reject(mask, lambda row: f'task {task_ids[row]} appears more than once (first on line {first_line[task_ids[row]]})')
+
+    # Current state of the tasks, aligned with the rows through the sorted id array
+    valid = np.flatnonzero(~failed)
+    found = _fetch_grouped(conn.cursor(), '''
+        SELECT t.id, t.student_id, t.status, t.mark, COALESCE(t.course_id = s.course_id, 0)
+        FROM tasks t JOIN students s ON s.id = t.student_id
+        WHERE 1 = 1 {filter} ORDER BY t.id
+    ''', np.unique(task_ids[valid]).tolist(), column='t.id')
+    found_ids = np.array([row[0] for row in found], dtype=np.int64)
+    positions = np.minimum(np.searchsorted(found_ids, task_ids), max(len(found_ids) - 1, 0))
+    exists = np.zeros(len(records), dtype=bool)
+    if len(found_ids):
+        exists = found_ids[positions] == task_ids
+    reject(~exists, lambda row: f'task {task_ids[row]} not found')
+    old_students = np.array([row[1] for row in found] or [0], dtype=np.int64)[positions]
+    old_statuses = np.array([row[2] for row in found] or [''], dtype=object)[positions]
+    old_marks = np.array([row[3] for row in found] or [None], dtype=float)[positions]
+    in_course = np.array([row[4] for row in found] or [0], dtype=bool)[positions]
+    if only_pending:
+        reject(old_statuses != 'pending', 'task is no longer pending')
+
+    ok = ~failed
+    new_marks = np.where(mark_missing, np.nan, marks)
+    unchanged = ok & (old_statuses == statuses) & ((old_marks == new_marks) | (np.isnan(old_marks) & np.isnan(new_marks)))
+    changed = np.flatnonzero(ok & ~unchanged)
+
+    if len(changed):
+        deltas = (_task_metric_contributions(statuses[changed] == 'completed', new_marks[changed], in_course[changed])
+                  - _task_metric_contributions(old_statuses[changed] == 'completed', old_marks[changed], in_course[changed]))
+        students, inverse = np.unique(old_students[changed], return_inverse=True)
+        totals = np.zeros((len(students), deltas.shape[1]))
+        np.add.at(totals, inverse, deltas)
+        cursor = conn.cursor()
+        try:
+            cursor.executemany("UPDATE tasks SET status = ?, mark = ? WHERE id = ?", zip(
+                statuses[changed].tolist(), [None if math.isnan(mark) else mark for mark in new_marks[changed].tolist()],
+                task_ids[changed].tolist()))
+            update_student_metrics_many(cursor, MarkImporter.METRIC_COUNTERS,
+                                        [(sid, *row) for sid, row in zip(students.tolist(), totals.tolist())])
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        invalidate_dashboard_counts()
+
+    outcome = np.where(ok, np.where(unchanged, 'unchanged', 'updated'), 'error')
+    results = []
+    for line_number, result, task_id, error in zip(lines, outcome.tolist(), raw_ids, errors.tolist()):
+        entry = {'line': line_number, 'task_id': task_id, 'result': result}
+        if error is not None:
+            entry['error'] = error
+        results.append(entry)
+    return {
+        'rows': len(records),
+        'updated': len(changed),
+        'unchanged': int(unchanged.sum()),
+        'error_count': int((~ok).sum()),
+        'results': results,
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
+# --- Streaming Export ---
+# CSV/NDJSON exports are generated while the client downloads them. Rows come off the
+# SQLite cursor EXPORT_FETCH_SIZE at a time and each batch is encoded and yielded before
+# the next one is fetched, so memory stays flat and the header goes out immediately.
+# attendance and tasks have no ORDER BY: with a course or date filter SQLite would have to
+# sort, reading every matching row before returning the first. They come out in index order.
+
+EXPORT_FETCH_SIZE = 1000 # Rows fetched from the cursor (and flushed to the client) at a time
+EXPORT_FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+# Dataset -> (columns, query with a {filter} placeholder, column the date range applies to)
+EXPORT_QUERIES = {
+    'attendance': (
+        ('student_id', 'name', 'course', 'date', 'status'),
+        '''
+        SELECT s.unique_student_id, s.name, c.name, a.date, a.status
+        FROM attendance a
+        JOIN students s ON s.id = a.student_id
+        LEFT JOIN courses c ON c.id = s.course_id
+        WHERE 1 = 1 {filter}
+        ''', 'a.date'),
+    'tasks': (
+        ('task_id', 'student_id', 'name', 'course', 'title', 'due_date', 'status', 'mark'),
+        '''
+        SELECT t.id, s.unique_student_id, s.name, c.name, t.title, t.due_date, t.status, t.mark
+        FROM tasks t
+        JOIN students s ON s.id = t.student_id
+        LEFT JOIN courses c ON c.id = s.course_id -- The student's course, the one the course filter matches
+        WHERE 1 = 1 {filter}
+        ''', 't.due_date'),
+    'feedback': (
+        ('feedback_id', 'student_id', 'name', 'feedback_date', 'category', 'score', 'comments'),
+        '''
+        SELECT f.id, s.unique_student_id, s.name, f.feedback_date, f.feedback_category, f.score, f.comments
+        FROM feedback f
+        JOIN students s ON s.id = f.student_id
+        WHERE 1 = 1 {filter} ORDER BY f.id
+        ''', 'f.feedback_date'),
+    'performance': (
+        ('student_id', 'name', 'course', 'overall_score', 'category', *METRIC_NAMES),
+        '''
+        SELECT s.id, s.unique_student_id, s.name, c.name
+        FROM students s
+        LEFT JOIN courses c ON c.id = s.course_id
+        WHERE 1 = 1 {filter} ORDER BY s.id
+        ''', None), # Scores are all-time, so no date range
+}
+
+def iter_export_batches(conn, dataset, course_id=None, date_from=None, date_to=None):
+    """Yields the column names, then lists of row tuples EXPORT_FETCH_SIZE at a time.
+    Filters: the student's course and an inclusive YYYY-MM-DD date range."""
+    columns, sql, date_column = EXPORT_QUERIES[dataset]
+    clauses, params = [], []
+    if course_id is not None:
+        clauses.append('s.course_id = ?')
+        params.append(course_id)
+    if date_column and date_from:
+        clauses.append(f'{date_column} >= ?')
+        params.append(date_from)
+    if date_column and date_to:
+        clauses.append(f'{date_column} <= ?')
+        params.append(date_to)
+    cursor = conn.cursor()
+    cursor.execute(sql.format(filter=''.join(f' AND {clause}' for clause in clauses)), params)
+
+    yield columns
+    while True:
+        rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+        if not rows:
+            break
+        if dataset == 'performance':
+            # Score each batch of students through the batch engine as it is fetched
+            scores = calculate_performance_scores_batch([row[0] for row in rows], conn)
+            rows = [(*row[1:], scores[row[0]]['overall_score'], scores[row[0]]['category'],
+                     *(scores[row[0]]['breakdown'][metric]['value'] for metric in METRIC_NAMES))
+                    for row in rows]
+        yield rows
+
+def encode_export(batches, fmt):
+    """Turns iter_export_batches() output into CSV or NDJSON text chunks."""
+    columns = next(batches)
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        yield buffer.getvalue()
+        for rows in batches:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(rows)
+            yield buffer.getvalue()
+    else:
+        for rows in batches:
+            yield ''.join(json.dumps(dict(zip(columns, row))) + '\n' for row in rows)
+
+def stream_export(dataset, fmt, **filters):
+    """Generator for a streaming Response. It checks out its own pooled connection because
+    it keeps running after the request context (and get_db()'s connection) is gone. It reads
+    from the analytics pool (see get_analytics_db) in one read transaction."""
+    pool = analytics_pool if ANALYTICS_READS else db_pool
+    conn = pool.checkout()
+    try:
+        conn.execute("BEGIN")
+        yield from encode_export(iter_export_batches(conn, dataset, **filters), fmt)
+    finally:
+        pool.release(conn)
+
+# --- Initialize database immediately when the script runs ---
+init_db()
+
 
 # --- Routes ---
 
@@ -396,12 +3224,11 @@ def login():
         password = request.form['password']
         selected_role = request.form['role'] # Get the selected role from the form
 
-        conn = sqlite3.connect(DATABASE)
+        conn = get_db()
         cursor = conn.cursor()
         # Check credentials and selected role
         cursor.execute("SELECT id, username, role FROM users WHERE username = ? AND password = ? AND role = ?", (username, password, selected_role))
         user = cursor.fetchone()
-        conn.close()
 
         if user:
             session['user_id'] = user[0]
@@ -421,36 +3248,16 @@ def admin_dashboard():
     if not is_admin_logged_in():
         return redirect(url_for('login'))
 
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
-
-    # Total Students
-    cursor.execute("SELECT COUNT(*) FROM students")
-    total_students = cursor.fetchone()[0]
-
-    # Pending Tasks
-    cursor.execute("SELECT COUNT(*) FROM tasks WHERE status = 'pending'")
-    pending_tasks_count = cursor.fetchone()[0]
-
-    # Total Courses
-    cursor.execute("SELECT COUNT(*) FROM courses")
-    total_courses = cursor.fetchone()[0]
-
-    # Attendance Summary for Today
-    today_date = datetime.now().strftime('%Y-%m-%d')
-    cursor.execute("SELECT COUNT(*) FROM attendance WHERE date = ? AND status = 'present'", (today_date,))
-    today_present_count = cursor.fetchone()[0]
-    cursor.execute("SELECT COUNT(*) FROM attendance WHERE date = ? AND status = 'absent'", (today_date,))
-    today_absent_count = cursor.fetchone()[0]
+    # Students, pending tasks, courses and today's attendance summary (cached briefly)
+    counts = get_dashboard_counts()
     
-    conn.close()
     return render_template('admin_dashboard.html', 
                            username=session['username'], 
-                           total_students=total_students, 
-                           pending_tasks=pending_tasks_count,
-                           total_courses=total_courses, # Pass total courses
-                           today_present_count=today_present_count, # Pass present count
-                           today_absent_count=today_absent_count) # Pass absent count
+                           total_students=counts['total_students'], 
+                           pending_tasks=counts['pending_tasks'],
+                           total_courses=counts['total_courses'], # Pass total courses
+                           today_present_count=counts['today_present_count'], # Pass present count
+                           today_absent_count=counts['today_absent_count']) # Pass absent count
 
 @app.route('/admin/profile')
 def admin_profile():
@@ -463,7 +3270,7 @@ def add_courses():
     if not is_admin_logged_in():
         return redirect(url_for('login'))
     
-    conn = sqlite3.connect(DATABASE)
+    conn = get_db()
     cursor = conn.cursor()
 
     if request.method == 'POST':
@@ -472,19 +3279,19 @@ def add_courses():
         try:
             cursor.execute("INSERT INTO courses (name, total_expected_tasks) VALUES (?, ?)", (course_name, total_expected_tasks))
             conn.commit()
+            invalidate_course_index()
+            invalidate_dashboard_counts()
             flash(f'Course "{course_name}" added successfully!', 'success')
         except sqlite3.IntegrityError:
             flash(f'Error: Course "{course_name}" already exists.', 'error')
         except Exception as e:
             flash(f'An unexpected error occurred: {e}', 'error')
         finally:
-            conn.close()
             return redirect(url_for('add_courses')) # Redirect to clear form and show message
     
     # For GET request, fetch existing courses to display
     cursor.execute("SELECT name, total_expected_tasks FROM courses ORDER BY name")
     existing_courses = cursor.fetchall()
-    conn.close()
 
     return render_template('add_courses.html', username=session['username'], existing_courses=existing_courses)
 
@@ -493,14 +3300,28 @@ def get_course_suggestions():
     if not is_admin_logged_in():
         return jsonify([]) # Return empty list if not logged in
 
-    query = request.args.get('q', '').lower()
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
-    cursor.execute("SELECT name FROM courses WHERE LOWER(name) LIKE ? ORDER BY name LIMIT 10", (f'%{query}%',))
-    suggestions = [row[0] for row in cursor.fetchall()]
-    conn.close()
-    return jsonify(suggestions)
+    query = request.args.get('q', '')
+    # Served from the in-memory index; SQLite is only read when the index is (re)built
+    return jsonify(get_course_index().suggest(query))
+
+@app.route('/admin/db-stats')
+def db_stats():
+    if not is_admin_logged_in():
+        return jsonify({'error': 'unauthorized'}), 401
+    return jsonify(get_db_pool_stats())
+
+@app.route('/admin/cache-stats')
+def cache_stats():
+    if not is_admin_logged_in():
+        return jsonify({'error': 'unauthorized'}), 401
+    return jsonify({**score_cache.stats(), 'student_identity': student_identity_cache.stats()})
 
+@app.route('/admin/metrics')
+def request_metrics():
+    authorization = request.headers.get('Authorization', '')
+    if not (is_admin_logged_in() or (METRICS_TOKEN and authorization == f'Bearer {METRICS_TOKEN}')):
+        return jsonify({'error': 'unauthorized'}), 401
+    return Response(render_prometheus_metrics(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/admin/course-validity')
 def course_validity():
@@ -519,7 +3340,7 @@ def add_task():
     if not is_admin_logged_in():
         return redirect(url_for('login'))
 
-    conn = sqlite3.connect(DATABASE)
+    conn = get_db()
     cursor = conn.cursor()
 
     if request.method == 'POST':
@@ -532,14 +3353,12 @@ def add_task():
 
         try:
             # Get the internal student_id (PK) from the unique_student_id
-            cursor.execute("SELECT id FROM students WHERE unique_student_id = ?", (assigned_student_id,))
-            student_db_id = cursor.fetchone()
+            student = lookup_student(unique_student_id=assigned_student_id, conn=conn)
             
-            if not student_db_id:
+            if not student:
                 flash(f'Error: Student with ID "{assigned_student_id}" not found.', 'error')
-                conn.close()
                 return redirect(url_for('add_task'))
-            student_db_id = student_db_id[0]
+            student_db_id = student.id
 
             # Get course_id for the task
             course_db_id = None
@@ -554,13 +3373,13 @@ def add_task():
 
             cursor.execute("INSERT INTO tasks (student_id, course_id, title, description, due_date, status, mark) VALUES (?, ?, ?, ?, ?, ?, ?)",
                            (student_db_id, course_db_id, task_title, task_description, due_date, 'pending', task_mark))
+            update_student_metrics(cursor, student_db_id, tasks_total=1)
             conn.commit()
+            invalidate_dashboard_counts()
             flash('Task added successfully!', 'success')
         except Exception as e:
             conn.rollback()
             flash(f'An unexpected error occurred: {e}', 'error')
-        finally:
-            conn.close()
         return redirect(url_for('add_task')) # Redirect to clear form and show message
 
     # For GET request, fetch students and courses for the dropdowns
@@ -568,7 +3387,6 @@ def add_task():
     students = cursor.fetchall()
     cursor.execute("SELECT name FROM courses ORDER BY name")
     courses = [row[0] for row in cursor.fetchall()]
-    conn.close()
 
     return render_template('add_task.html', username=session['username'], students=students, courses=courses)
 
@@ -591,20 +3409,18 @@ def add_student():
         temp_password = request.form['temp_password']
         assigned_course_name = request.form.get('assigned_course') # Get course name from form
 
-        conn = sqlite3.connect(DATABASE)
+        conn = get_db()
         cursor = conn.cursor()
         try:
             # Check if username (unique_student_id) or email already exists in users/students table
             cursor.execute("SELECT id FROM users WHERE username = ?", (unique_student_id,))
             if cursor.fetchone():
                 flash('Error: Student ID (username) already exists.', 'error')
-                conn.close()
                 return redirect(url_for('add_student'))
 
             cursor.execute("SELECT id FROM students WHERE email = ?", (email,))
             if cursor.fetchone():
                 flash('Error: Student email already exists.', 'error')
-                conn.close()
                 return redirect(url_for('add_student'))
 
             # 1. Create a user entry for the new intern
@@ -626,7 +3442,9 @@ def add_student():
             # 3. Add the student entry, linking to the new user
             cursor.execute("INSERT INTO students (unique_student_id, name, email, course_id, user_id) VALUES (?, ?, ?, ?, ?)",
                            (unique_student_id, name, email, course_db_id, new_user_id))
+            update_student_metrics(cursor, cursor.lastrowid) # Start the student's counters at zero
             conn.commit()
+            invalidate_dashboard_counts()
             flash('Student added successfully!', 'success')
             return redirect(url_for('student_list')) # Redirect to student list after adding
         except sqlite3.IntegrityError as e: # Catch specific integrity errors if any other unique constraint fails
@@ -635,35 +3453,78 @@ def add_student():
         except Exception as e:
             conn.rollback()
             flash(f'An unexpected error occurred: {e}', 'error')
-        finally:
-            conn.close()
 
     # For GET request, fetch courses for the dropdown
-    conn = sqlite3.connect(DATABASE)
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute("SELECT name FROM courses ORDER BY name")
     courses = [row[0] for row in cursor.fetchall()]
-    conn.close()
 
     return render_template('add_student.html', username=session['username'], courses=courses)
 
+@app.route('/admin/import', methods=['GET', 'POST'])
+def import_data():
+    """Bulk import page. POST either a multipart form (kind, file) or a raw CSV/NDJSON body
+    with ?kind=...; raw bodies and clients that accept JSON get the summary as JSON."""
+    if not is_admin_logged_in():
+        if request.method == 'POST' and request.accept_mimetypes.best == 'application/json':
+            return jsonify({'error': 'unauthorized'}), 401
+        return redirect(url_for('login'))
+    if request.method == 'GET':
+        return render_template('import_data.html', username=session['username'], kinds=list(IMPORTERS), summary=None)
+
+    kind = request.form.get('kind') or request.args.get('kind')
+    upload = request.files.get('file')
+    if upload:
+        fmt = request.form.get('format') or import_format_for(upload.filename, upload.mimetype)
+        stream = upload.stream
+        wants_json = request.accept_mimetypes.best == 'application/json'
+    else:
+        fmt = request.args.get('format') or import_format_for(mimetype=request.mimetype)
+        stream = request.stream # Read straight off the socket, never buffered whole
+        wants_json = True
+
+    try:
+        if fmt not in IMPORT_FORMATS:
+            raise ValueError('Could not tell the upload format; use a .csv or .ndjson file.')
+        summary = import_records(get_db(), kind, iter_import_records(stream, fmt))
+    except ValueError as e: # Includes UnicodeDecodeError for non UTF-8 uploads
+        if wants_json:
+            return jsonify({'error': str(e)}), 400
+        flash(f'Import failed: {e}', 'error')
+        return render_template('import_data.html', username=session['username'], kinds=list(IMPORTERS), summary=None)
+
+    if wants_json:
+        return jsonify(summary)
+    flash(f"Imported {summary['imported']} of {summary['rows']} {kind} row(s) in {summary['seconds']}s "
+          f"({summary['rows_per_second']} rows/s).", 'success' if not summary['error_count'] else 'warning')
+    return render_template('import_data.html', username=session['username'], kinds=list(IMPORTERS), summary=summary)
+
+# Sortable columns -> keyset columns (each ending in a unique column), all index-backed
+STUDENT_LIST_SORTS = {
+    'name': ('s.name', 's.unique_student_id'),
+    'student_id': ('s.unique_student_id',),
+    'email': ('s.email',),
+}
+
 @app.route('/admin/student-list')
 def student_list():
     if not is_admin_logged_in():
         return redirect(url_for('login'))
 
-    conn = sqlite3.connect(DATABASE)
+    conn = get_db()
     cursor = conn.cursor()
     # Join students with courses to display course name
-    cursor.execute('''
-        SELECT s.unique_student_id, s.name, s.email, c.name AS course_name, s.id as student_db_id
+    page = fetch_keyset_page(cursor, '''
+        SELECT s.unique_student_id, s.name, s.email, c.name AS course_name, s.id as student_db_id, {keys}
         FROM students s
         LEFT JOIN courses c ON s.course_id = c.id
-        ORDER BY s.name
-    ''')
-    students_data = cursor.fetchall()
-    conn.close()
-    return render_template('student_list.html', username=session['username'], students=students_data)
+        WHERE 1 = 1 {filter}
+    ''', (), STUDENT_LIST_SORTS, **page_args(STUDENT_LIST_SORTS, 'name'))
+    return render_template('student_list.html', username=session['username'], students=page['rows'], page=page)
+
+# Pending tasks by due date; the tie-breakers follow idx_tasks_status_due so no sort is needed
+PENDING_TASK_SORTS = {'due_date': ('t.due_date', 't.student_id', 't.id')}
 
 # New route for Pending Tasks
 @app.route('/admin/pending-tasks')
@@ -671,16 +3532,78 @@ def pending_tasks():
     if not is_admin_logged_in():
         return redirect(url_for('login'))
     
-    conn = sqlite3.connect(DATABASE)
+    conn = get_db()
     cursor = conn.cursor()
     # Fetch pending tasks, joining with students to get student name
-    cursor.execute("SELECT t.title, s.name, t.due_date, t.status FROM tasks t JOIN students s ON t.student_id = s.id WHERE t.status = 'pending' ORDER BY t.due_date")
-    pending_tasks_data = cursor.fetchall()
-    conn.close()
-    return render_template('pending_tasks.html', username=session['username'], pending_tasks=pending_tasks_data)
+    page = fetch_keyset_page(cursor, '''
+        SELECT t.title, s.name, t.due_date, t.status, {keys}
+        FROM tasks t JOIN students s ON t.student_id = s.id
+        WHERE t.status = 'pending' {filter}
+    ''', (), PENDING_TASK_SORTS, **page_args(PENDING_TASK_SORTS, 'due_date'))
+    return render_template('pending_tasks.html', username=session['username'], pending_tasks=page['rows'], page=page)
+
+# The overall performance calculation is done in calculate_overall_performance_score; this
+# endpoint adds the RandomForest model's predicted category for every student.
+@app.route('/admin/predict')
+def admin_predict():
+    if not is_admin_logged_in():
+        return jsonify({'error': 'unauthorized'}), 401
+
+    conn = get_analytics_db()
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, unique_student_id, name FROM students")
+    students = {row[0]: row[1:] for row in cursor.fetchall()}
+    ids, labels, probabilities, class_labels = predict_performance_batch(conn=conn)
+
+    predictions = []
+    for row, student_db_id in enumerate(ids.tolist()):
+        unique_student_id, name = students.get(student_db_id, (None, None))
+        predictions.append({
+            'student_id': student_db_id,
+            'unique_student_id': unique_student_id,
+            'name': name,
+            'predicted_category': labels[row],
+            'probabilities': dict(zip(class_labels, probabilities[row].round(4).tolist()))
+        })
+    metadata = get_model_metadata()
+    return jsonify({'model_version': metadata['version'], 'features': list(metadata['features']),
+                    'classes': class_labels, 'predictions': predictions})
+
+
+@app.route('/admin/export/<dataset>')
+def export_data(dataset):
+    """Streams performance scores, attendance, tasks or feedback as CSV (default) or NDJSON.
+    Query args: format=csv|ndjson, course=<course name>, date_from/date_to=YYYY-MM-DD."""
+    if not is_admin_logged_in():
+        return jsonify({'error': 'unauthorized'}), 401
+    if dataset not in EXPORT_QUERIES:
+        return jsonify({'error': f"Unknown dataset; expected one of {', '.join(EXPORT_QUERIES)}"}), 404
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"Unknown format; expected one of {', '.join(EXPORT_FORMATS)}"}), 400
+
+    # Validate everything up front: once streaming starts the status code is already sent
+    filters = {}
+    course_name = request.args.get('course')
+    if course_name:
+        course = get_db().execute("SELECT id FROM courses WHERE name = ?", (course_name,)).fetchone()
+        if not course:
+            return jsonify({'error': f'Course "{course_name}" not found'}), 404
+        filters['course_id'] = course[0]
+    for name in ('date_from', 'date_to'):
+        value = request.args.get(name)
+        if not value:
+            continue
+        if EXPORT_QUERIES[dataset][2] is None:
+            return jsonify({'error': f'{dataset} export does not take a date range'}), 400
+        try:
+            filters[name] = datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+        except ValueError:
+            return jsonify({'error': f'{name} must be YYYY-MM-DD'}), 400
+
+    return Response(stream_export(dataset, fmt, **filters), mimetype=EXPORT_FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename={dataset}.{fmt}'})
 
-# Removed predict_performance as it was for ML model.
-# The overall performance calculation is now done in calculate_overall_performance_score.
 
 @app.route('/admin/attendance', methods=['GET', 'POST'])
 def attendance():
@@ -690,7 +3613,7 @@ def attendance():
     # Determine the date for which to display attendance
     selected_date = request.args.get('selected_date', datetime.now().strftime('%Y-%m-%d'))
 
-    conn = sqlite3.connect(DATABASE)
+    conn = get_db()
     cursor = conn.cursor()
     # Fetch all students and their attendance status for the selected date (if recorded)
     # Note: s.id is included as record[0] for use in forms
@@ -701,7 +3624,6 @@ def attendance():
         ORDER BY s.name
     ''', (selected_date,))
     attendance_records = cursor.fetchall()
-    conn.close()
 
     return render_template('attendance.html', username=session['username'], current_date=selected_date, attendance_records=attendance_records)
 
@@ -719,41 +3641,164 @@ def mark_attendance():
         flash('Error: Attendance date was not provided.', 'error')
         return redirect(url_for('attendance'))
 
-    conn = sqlite3.connect(DATABASE)
+    conn = get_db()
     cursor = conn.cursor()
     try:
+        # Check if an attendance record for this student and date already exists
+        cursor.execute("SELECT id, status FROM attendance WHERE student_id = ? AND date = ?", (student_db_id, date))
+        existing_record = cursor.fetchone()
+        was_present = int(bool(existing_record) and existing_record[1] == 'present')
+
         if status == 'not_recorded':
             # Delete the attendance record if 'Clear Status' is clicked
             cursor.execute("DELETE FROM attendance WHERE student_id = ? AND date = ?", (student_db_id, date))
+            if existing_record:
+                update_student_metrics(cursor, student_db_id, attendance_total=-1, attendance_present=-was_present)
             flash(f'Attendance for student ID {student_db_id} on {date} cleared.', 'info')
         else:
-            # Check if an attendance record for this student and date already exists
-            cursor.execute("SELECT id FROM attendance WHERE student_id = ? AND date = ?", (student_db_id, date))
-            existing_record = cursor.fetchone()
-
+            is_present = int(status == 'present')
             if existing_record:
                 # Update existing record
                 cursor.execute("UPDATE attendance SET status = ? WHERE id = ?", (status, existing_record[0]))
+                update_student_metrics(cursor, student_db_id, attendance_present=is_present - was_present)
                 flash(f'Attendance for student ID {student_db_id} on {date} updated to {status}.', 'success')
             else:
                 # Insert new record
                 cursor.execute("INSERT INTO attendance (student_id, date, status) VALUES (?, ?, ?)", (student_db_id, date, status))
+                update_student_metrics(cursor, student_db_id, attendance_total=1, attendance_present=is_present)
                 flash(f'Attendance for student ID {student_db_id} on {date} marked as {status}.', 'success')
         conn.commit()
+        invalidate_dashboard_counts()
     except Exception as e:
         conn.rollback()
         flash(f'Error marking attendance: {e}', 'error')
-    finally:
-        conn.close()
     return redirect(url_for('attendance', selected_date=date)) # Redirect back to the attendance page, preserving date
 
+@app.route('/admin/mark-attendance/bulk', methods=['POST'])
+def mark_attendance_bulk():
+    """Marks a whole roster at once. Form mode: one status_<student_db_id> field per row of
+    attendance.html plus attendance_date. JSON mode: {"date": "YYYY-MM-DD",
+    "records": [{"student_id": 1, "status": "present"}, ...]}; returns the summary."""
+    if not is_admin_logged_in():
+        if request.is_json:
+            return jsonify({'error': 'unauthorized'}), 401
+        return redirect(url_for('login'))
+
+    if request.is_json:
+        payload = request.get_json(silent=True)
+        if not isinstance(payload, dict):
+            return jsonify({'error': 'expected a {"date", "records"} object'}), 400
+        date = payload.get('date') or datetime.now().strftime('%Y-%m-%d')
+        records = payload.get('records') or []
+        if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+            return jsonify({'error': 'records must be a list of {"student_id", "status"} objects'}), 400
+        statuses = [(record.get('student_id'), record.get('status')) for record in records]
+    else:
+        date = request.form.get('attendance_date') or datetime.now().strftime('%Y-%m-%d')
+        # Rows left on "No change" submit an empty value and are ignored
+        statuses = [(key[len('status_'):], value) for key, value in request.form.items()
+                    if key.startswith('status_') and value]
+
+    try:
+        # Stored in canonical YYYY-MM-DD form so date() rollups and lookups by date match it
+        date = datetime.strptime(str(date), '%Y-%m-%d').strftime('%Y-%m-%d')
+    except ValueError:
+        if request.is_json:
+            return jsonify({'error': f'invalid date {date!r}, expected YYYY-MM-DD'}), 400
+        flash(f'Error: invalid attendance date {date!r}.', 'error')
+        return redirect(url_for('attendance'))
+
+    try:
+        summary = apply_bulk_attendance(get_db(), date, statuses)
+    except Exception as e:
+        if request.is_json:
+            return jsonify({'error': f'Error marking attendance: {e}'}), 500
+        flash(f'Error marking attendance: {e}', 'error')
+        return redirect(url_for('attendance', selected_date=date))
+
+    if request.is_json:
+        return jsonify(summary)
+    flash(f"Attendance for {date}: {summary['marked']} marked, {summary['cleared']} cleared, "
+          f"{summary['unchanged']} unchanged.", 'success')
+    for error in summary['errors']:
+        flash(f"Student ID {error['student_id']}: {error['error']}", 'warning')
+    return redirect(url_for('attendance', selected_date=date))
+
+ATTENDANCE_STATUSES = ('present', 'absent', 'not_recorded') # 'not_recorded' clears the day
+
+def apply_bulk_attendance(conn, date, statuses):
+    """Applies (student_db_id, status) pairs for one YYYY-MM-DD date in a single transaction:
+    one upsert executemany for marks, one DELETE executemany for clears, and bulk
+    student_metrics updates. Rows whose status doesn't change are skipped, and a student
+    listed more than once is reported as an error rather than guessing which status wins.
+    Returns a summary dict."""
+    cursor = conn.cursor()
+    summary = {'date': date, 'marked': 0, 'cleared': 0, 'unchanged': 0, 'errors': []}
+
+    requested, seen, duplicates = {}, set(), set()
+    for student_db_id, status in statuses:
+        try:
+            student_db_id = int(student_db_id)
+        except (TypeError, ValueError):
+            summary['errors'].append({'student_id': student_db_id, 'error': 'invalid student id'})
+            continue
+        if student_db_id in seen:
+            duplicates.add(student_db_id)
+            continue
+        seen.add(student_db_id)
+        if status not in ATTENDANCE_STATUSES:
+            summary['errors'].append({'student_id': student_db_id, 'error': f'invalid status {status!r}'})
+            continue
+        requested[student_db_id] = status
+    for student_db_id in sorted(duplicates):
+        requested.pop(student_db_id, None)
+        summary['errors'].append({'student_id': student_db_id, 'error': 'appears more than once'})
+
+    known_ids = {row[0] for row in _fetch_grouped(cursor, "SELECT id FROM students WHERE 1 = 1 {filter}",
+                                                   sorted(requested), column='id')}
+    for student_db_id in sorted(set(requested) - known_ids):
+        summary['errors'].append({'student_id': student_db_id, 'error': 'student not found'})
+        del requested[student_db_id]
+
+    # Current status of each requested student on that date, for the student_metrics deltas
+    existing = dict(_fetch_grouped(cursor, "SELECT student_id, status FROM attendance WHERE date = ? {filter}",
+                                   sorted(requested), params=(date,)))
+    marks, clears, metric_rows = [], [], []
+    for student_db_id, status in requested.items():
+        previous = existing.get(student_db_id)
+        if status == (previous or 'not_recorded'):
+            summary['unchanged'] += 1
+            continue
+        was_present = int(previous == 'present')
+        if status == 'not_recorded':
+            clears.append((student_db_id, date))
+            metric_rows.append((student_db_id, -1, -was_present))
+        else:
+            marks.append((student_db_id, date, status))
+            metric_rows.append((student_db_id, 0 if previous else 1, int(status == 'present') - was_present))
+
+    try:
+        cursor.executemany('''
+            INSERT INTO attendance (student_id, date, status) VALUES (?, ?, ?)
+            ON CONFLICT(student_id, date) DO UPDATE SET status = excluded.status
+        ''', marks)
+        cursor.executemany("DELETE FROM attendance WHERE student_id = ? AND date = ?", clears)
+        update_student_metrics_many(cursor, ('attendance_total', 'attendance_present'), metric_rows)
+        conn.commit()
+        invalidate_dashboard_counts()
+    except Exception:
+        conn.rollback()
+        raise
+    summary['marked'] = len(marks)
+    summary['cleared'] = len(clears)
+    return summary
 
 @app.route('/admin/add-feedback', methods=['GET', 'POST'])
 def add_feedback():
     if not is_admin_logged_in():
         return redirect(url_for('login'))
 
-    conn = sqlite3.connect(DATABASE)
+    conn = get_db()
     cursor = conn.cursor()
 
     if request.method == 'POST':
@@ -765,13 +3810,11 @@ def add_feedback():
         task_id = request.form.get('task_id') # Optional: link to a specific task
 
         try:
-            cursor.execute("SELECT id FROM students WHERE unique_student_id = ?", (student_unique_id,))
-            student_db_id = cursor.fetchone()
-            if not student_db_id:
+            student = lookup_student(unique_student_id=student_unique_id, conn=conn)
+            if not student:
                 flash(f'Error: Student with ID "{student_unique_id}" not found.', 'error')
-                conn.close()
                 return redirect(url_for('add_feedback'))
-            student_db_id = student_db_id[0]
+            student_db_id = student.id
 
             # Optional: Get actual task_id if provided and valid
             actual_task_id = None
@@ -785,18 +3828,16 @@ def add_feedback():
 
             cursor.execute("INSERT INTO feedback (student_id, admin_id, comments, feedback_date, feedback_category, task_id) VALUES (?, ?, ?, ?, ?, ?)",
                            (student_db_id, admin_id, feedback_comments, feedback_date, feedback_category, actual_task_id))
+            update_student_metrics(cursor, student_db_id, **feedback_category_metric_deltas(feedback_category))
             conn.commit()
             flash('Feedback added successfully!', 'success')
         except Exception as e:
             conn.rollback()
             flash(f'An unexpected error occurred: {e}', 'error')
-        finally:
-            conn.close()
         return redirect(url_for('add_feedback'))
     
     cursor.execute("SELECT unique_student_id, name FROM students ORDER BY name")
     students = cursor.fetchall()
-    conn.close()
     return render_template('add_feedback.html', username=session['username'], students=students)
 
 @app.route('/admin/add-behaviour-rating', methods=['GET', 'POST'])
@@ -804,7 +3845,7 @@ def add_behaviour_rating():
     if not is_admin_logged_in():
         return redirect(url_for('login'))
 
-    conn = sqlite3.connect(DATABASE)
+    conn = get_db()
     cursor = conn.cursor()
 
     if request.method == 'POST':
@@ -814,36 +3855,33 @@ def add_behaviour_rating():
         admin_id = session['user_id']
 
         try:
-            cursor.execute("SELECT id FROM students WHERE unique_student_id = ?", (student_unique_id,))
-            student_db_id = cursor.fetchone()
-            if not student_db_id:
+            student = lookup_student(unique_student_id=student_unique_id, conn=conn)
+            if not student:
                 flash(f'Error: Student with ID "{student_unique_id}" not found.', 'error')
-                conn.close()
                 return redirect(url_for('add_behaviour_rating'))
-            student_db_id = student_db_id[0]
+            student_db_id = student.id
 
             # Check if rating for this student and date already exists
-            cursor.execute("SELECT id FROM behaviour_ratings WHERE student_id = ? AND date = ?", (student_db_id, rating_date))
+            cursor.execute("SELECT id, rating FROM behaviour_ratings WHERE student_id = ? AND date = ?", (student_db_id, rating_date))
             existing_rating = cursor.fetchone()
 
             if existing_rating:
                 cursor.execute("UPDATE behaviour_ratings SET rating = ? WHERE id = ?", (rating, existing_rating[0]))
+                update_student_metrics(cursor, student_db_id, behaviour_sum=rating - existing_rating[1])
                 flash(f'Behaviour rating for {student_unique_id} on {rating_date} updated to {rating}.', 'success')
             else:
                 cursor.execute("INSERT INTO behaviour_ratings (student_id, date, rating, admin_id) VALUES (?, ?, ?, ?)",
                                (student_db_id, rating_date, rating, admin_id))
+                update_student_metrics(cursor, student_db_id, behaviour_count=1, behaviour_sum=rating)
                 flash(f'Behaviour rating for {student_unique_id} on {rating_date} added as {rating}.', 'success')
             conn.commit()
         except Exception as e:
             conn.rollback()
             flash(f'An unexpected error occurred: {e}', 'error')
-        finally:
-            conn.close()
         return redirect(url_for('add_behaviour_rating'))
 
     cursor.execute("SELECT unique_student_id, name FROM students ORDER BY name")
     students = cursor.fetchall()
-    conn.close()
     return render_template('add_behaviour_rating.html', username=session['username'], students=students, today_date=datetime.now().strftime('%Y-%m-%d'))
 
 
@@ -852,11 +3890,30 @@ def admin_performance_overview():
     if not is_admin_logged_in():
         return redirect(url_for('login'))
     
-    conn = sqlite3.connect(DATABASE)
+    # Optional rolling window: ?window=7d|30d|90d, or a custom ?date_from=&date_to= range
+    window = request.args.get('window') or None
+    date_from = request.args.get('date_from') or None
+    date_to = request.args.get('date_to') or None
+    try:
+        bounds = score_window_bounds(window, date_from, date_to)
+    except ValueError as e:
+        flash(f'Invalid score window: {e}', 'error')
+        window = date_from = date_to = bounds = None
+    if window:
+        window_label = f'last {SCORE_WINDOWS[window]} days'
+    elif bounds:
+        window_label = f"{date_from or 'start'} to {date_to or 'latest'}"
+    else:
+        window_label = None
+
+    conn = get_analytics_db()
     cursor = conn.cursor()
     cursor.execute("SELECT id, unique_student_id, name FROM students ORDER BY name")
     all_students_data = cursor.fetchall()
-    conn.close()
+    # Score every student in one pass instead of calling calculate_overall_performance_score per row
+    all_performance = calculate_performance_scores_batch(conn=conn)
+    window_performance = calculate_performance_scores_batch(conn=conn, window=bounds) if bounds else None
+    rankings = get_student_rankings(conn)
 
     performance_summaries = []
     for student in all_students_data:
@@ -864,36 +3921,190 @@ def admin_performance_overview():
         unique_student_id = student[1]
         student_name = student[2]
         
-        overall_performance = calculate_overall_performance_score(student_db_id)
-        performance_summaries.append({
+        overall_performance = all_performance[student_db_id]
+        summary = {
             'unique_student_id': unique_student_id,
             'name': student_name,
             'overall_score': overall_performance['overall_score'],
             'category': overall_performance['category']
-        })
+        }
+        row = rankings.row_of(student_db_id)
+        if row is not None:
+            summary['course_percentile'] = round(float(rankings.course_percentile[row]), 1)
+            summary['cohort_percentile'] = round(float(rankings.cohort_percentile[row]), 1)
+            summary['at_risk'] = summary['course_percentile'] < min(AT_RISK_PERCENTILES)
+        if window_performance is not None:
+            summary['window_score'] = window_performance[student_db_id]['overall_score']
+            summary['window_category'] = window_performance[student_db_id]['category']
+        performance_summaries.append(summary)
 
     return render_template('admin_performance_overview.html', 
                            username=session['username'], 
-                           performance_summaries=performance_summaries)
+                           performance_summaries=performance_summaries,
+                           score_windows=SCORE_WINDOWS,
+                           window=window, date_from=date_from, date_to=date_to, window_label=window_label,
+                           at_risk_percentile=f'{min(AT_RISK_PERCENTILES):g}')
+
+@app.route('/admin/performance/history')
+def performance_history():
+    """Snapshot series for one student (?student=<unique id>&limit=N), for trend charts."""
+    if not is_admin_logged_in():
+        return jsonify({'error': 'unauthorized'}), 401
+    conn = get_analytics_db()
+    student = lookup_student(unique_student_id=request.args.get('student', ''), conn=conn)
+    if student is None:
+        return jsonify({'error': 'unknown student'}), 404
+    limit = max(1, min(request.args.get('limit', 90, type=int), 3650))
+    return jsonify(load_performance_history(conn, student.id, limit))
+
+@app.route('/admin/weight-profiles', methods=['GET', 'POST'])
+def weight_profiles():
+    """GET lists the saved weight profiles; POST saves one (JSON {"name", "weights", "thresholds"})."""
+    if not is_admin_logged_in():
+        return jsonify({'error': 'unauthorized'}), 401
+    conn = get_db()
+    if request.method == 'POST':
+        try:
+            return jsonify(save_weight_profile(conn, request.get_json(silent=True))), 201
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    return jsonify(load_weight_profiles(conn))
+
+@app.route('/admin/weight-profiles/<name>', methods=['DELETE'])
+def delete_weight_profile_route(name):
+    if not is_admin_logged_in():
+        return jsonify({'error': 'unauthorized'}), 401
+    if not delete_weight_profile(get_db(), name):
+        return jsonify({'error': f'Unknown weight profile: {name}'}), 404
+    return '', 204
+
+@app.route('/admin/scenarios', methods=['GET', 'POST'])
+def weight_scenarios():
+    """Re-scores every student under weight profiles. GET takes saved profile names
+    (?profile=a&profile=b, default all saved); POST takes {"profiles": [...]}, where each
+    entry is a saved profile's name or an inline profile object."""
+    if not is_admin_logged_in():
+        return jsonify({'error': 'unauthorized'}), 401
+    conn = get_db()
+    if request.method == 'POST':
+        requested = (request.get_json(silent=True) or {}).get('profiles')
+        if not isinstance(requested, list) or not requested:
+            return jsonify({'error': 'profiles must be a non-empty list'}), 400
+    else:
+        requested = request.args.getlist('profile') or [profile['name'] for profile in load_weight_profiles(conn)]
+
+    try:
+        saved = {profile['name']: profile for profile in
+                 load_weight_profiles(conn, [entry for entry in requested if isinstance(entry, str)])}
+        profiles = [saved[entry] if isinstance(entry, str) else validate_weight_profile(entry) for entry in requested]
+    except KeyError as e:
+        return jsonify({'error': f'Unknown weight profile: {e.args[0]}'}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(score_weight_profiles(profiles, get_analytics_db()))
+
+@app.route('/admin/rankings')
+def student_rankings():
+    """Top-k or bottom-k students of each course (?k=5&order=bottom|top), or one student's
+    percentile ranks (?student=<unique id>)."""
+    if not is_admin_logged_in():
+        return jsonify({'error': 'unauthorized'}), 401
+    conn = get_analytics_db()
+    rankings = get_student_rankings(conn)
+    if request.args.get('student'):
+        student = lookup_student(unique_student_id=request.args['student'], conn=conn)
+        row = rankings.row_of(student.id) if student else None
+        if row is None:
+            return jsonify({'error': 'unknown student'}), 404
+        return jsonify(describe_ranked_students(conn, rankings, [row])[0])
+
+    order = request.args.get('order', 'bottom')
+    if order not in ('bottom', 'top'):
+        return jsonify({'error': 'order must be bottom or top'}), 400
+    k = max(1, min(request.args.get('k', RANKING_TOP_K, type=int), 1000))
+    extremes = rankings.course_extremes(k, bottom=order == 'bottom')
+    described = describe_ranked_students(conn, rankings, [row for rows in extremes.values() for row in rows])
+    courses, position = [], 0
+    for rows in extremes.values():
+        students = described[position:position + len(rows)]
+        position += len(rows)
+        courses.append({'course': students[0]['course'], 'students': students})
+    return jsonify({'order': order, 'k': k, 'courses': courses})
+
+@app.route('/admin/at-risk')
+def at_risk_students():
+    """Students in the bottom AT_RISK_PERCENTILES of their course (or ?percentile=N), lowest first."""
+    if not is_admin_logged_in():
+        return jsonify({'error': 'unauthorized'}), 401
+    percentiles = AT_RISK_PERCENTILES
+    if request.args.get('percentile'):
+        percentile = request.args.get('percentile', type=float)
+        if percentile is None or not 0 < percentile <= 100:
+            return jsonify({'error': 'percentile must be a number between 0 and 100'}), 400
+        percentiles = (percentile,)
+    conn = get_analytics_db()
+    rankings = get_student_rankings(conn)
+    return jsonify({'students': len(rankings.ids), 'bands': [
+        {'percentile': percentile, 'students': describe_ranked_students(conn, rankings, rankings.at_risk(percentile))}
+        for percentile in percentiles
+    ]})
+
+@app.route('/admin/search')
+def search():
+    """Full-text search page. Query args: q, student (unique ID), date_from, date_to,
+    source (feedback|messages, default both). JSON when format=json."""
+    wants_json = request.args.get('format') == 'json'
+    if not is_admin_logged_in():
+        if wants_json:
+            return jsonify({'error': 'unauthorized'}), 401
+        return redirect(url_for('login'))
+
+    text = request.args.get('q', '').strip()
+    filters = {
+        'student': request.args.get('student', '').strip() or None,
+        'date_from': request.args.get('date_from') or None,
+        'date_to': request.args.get('date_to') or None,
+    }
+    source = request.args.get('source')
+    sources = (source,) if source in SEARCH_SOURCES else tuple(SEARCH_SOURCES)
+    limit = max(1, min(request.args.get('limit', SEARCH_RESULT_LIMIT, type=int), PAGE_SIZE_MAX))
+
+    started = time.perf_counter()
+    try:
+        results = search_messages(get_db(), text, sources=sources, limit=limit, **filters) if text else []
+    except ValueError:
+        if wants_json:
+            return jsonify({'error': 'date_from and date_to must be YYYY-MM-DD'}), 400
+        flash('Dates must be in YYYY-MM-DD format.', 'error')
+        results = []
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+
+    if wants_json:
+        return jsonify({'query': text, 'results': results, 'elapsed_ms': elapsed_ms})
+    for result in results:
+        result['snippet'] = Markup(result['snippet']) # Escaped in highlight_snippet()
+    return render_template('search.html', username=session['username'], query=text, source=source,
+                           filters=filters, results=results, elapsed_ms=elapsed_ms)
+
+STUDENT_FEEDBACK_SORTS = {'timestamp': ('sf.timestamp', 'sf.id')}
 
 @app.route('/admin/view-student-feedback')
 def admin_view_student_feedback():
     if not is_admin_logged_in():
         return redirect(url_for('login'))
     
-    conn = sqlite3.connect(DATABASE)
+    conn = get_db()
     cursor = conn.cursor()
-    cursor.execute('''
-        SELECT sf.subject, sf.message, sf.timestamp, s.name AS student_name, s.unique_student_id
+    page = fetch_keyset_page(cursor, '''
+        SELECT sf.subject, sf.message, sf.timestamp, s.name AS student_name, s.unique_student_id, {keys}
         FROM student_feedback_to_admin sf
         JOIN students s ON sf.student_id = s.id
-        ORDER BY sf.timestamp DESC
-    ''')
-    student_feedback_records = cursor.fetchall()
-    conn.close()
+        WHERE 1 = 1 {filter}
+    ''', (), STUDENT_FEEDBACK_SORTS, **page_args(STUDENT_FEEDBACK_SORTS, 'timestamp', 'desc'))
     return render_template('admin_view_student_feedback.html', 
                            username=session['username'], 
-                           student_feedback_records=student_feedback_records)
+                           student_feedback_records=page['rows'],
+                           page=page)
 
 # --- NEW ROUTE: Admin Task Completion ---
 @app.route('/admin/complete-tasks', methods=['GET', 'POST'])
@@ -901,79 +4112,86 @@ def admin_complete_tasks():
     if not is_admin_logged_in():
         return redirect(url_for('login'))
 
-    conn = sqlite3.connect(DATABASE)
+    conn = get_db()
     cursor = conn.cursor()
 
     if request.method == 'POST':
-        tasks_to_update = 0
-        for key, value in request.form.items():
-            if key.startswith('completed_task_') and value == 'on':
-                task_id = key.replace('completed_task_', '')
-                mark_key = f'mark_{task_id}'
-                mark = request.form.get(mark_key, 0) # Get mark, default to 0 if not provided
-                
-                try:
-                    mark = float(mark)
-                    if not (0 <= mark <= 100):
-                        flash(f'Warning: Mark for task {task_id} must be between 0 and 100. Not updated.', 'warning')
-                        continue # Skip this task if mark is invalid
-                except ValueError:
-                    flash(f'Warning: Invalid mark for task {task_id}. Not updated.', 'warning')
-                    continue # Skip if mark is not a valid number
-
-                try:
-                    cursor.execute("UPDATE tasks SET status = 'completed', mark = ? WHERE id = ? AND status = 'pending'", (mark, task_id))
-                    if cursor.rowcount > 0:
-                        tasks_to_update += 1
-                except Exception as e:
-                    flash(f'Error updating task {task_id}: {e}', 'error')
-        
-        conn.commit()
-        if tasks_to_update > 0:
-            flash(f'{tasks_to_update} task(s) marked as completed and marks assigned!', 'success')
+        # Checked rows become one grading batch: validated together and written in one transaction
+        checked = [key.replace('completed_task_', '') for key, value in request.form.items()
+                   if key.startswith('completed_task_') and value == 'on']
+        records = [(task_id, {'task_id': task_id, 'mark': request.form.get(f'mark_{task_id}', 0)}) for task_id in checked]
+        summary = grade_tasks(conn, records, only_pending=True)
+        problems = [f"task {result['task_id']}: {result['error']}" for result in summary['results'] if 'error' in result]
+        if problems:
+            shown = '; '.join(problems[:5]) + (f' (and {len(problems) - 5} more)' if len(problems) > 5 else '')
+            flash(f'Warning: {len(problems)} task(s) not updated: {shown}', 'warning')
+        if summary['updated'] > 0:
+            flash(f"{summary['updated']} task(s) marked as completed and marks assigned!", 'success')
         else:
             flash('No tasks were updated.', 'info')
-        
-        conn.close()
+
         return redirect(url_for('admin_complete_tasks'))
 
-    # GET request: Display all pending tasks
-    cursor.execute('''
-        SELECT t.id, t.title, t.description, t.due_date, s.name AS student_name, s.unique_student_id
+    # GET request: Display pending tasks, one page at a time
+    page = fetch_keyset_page(cursor, '''
+        SELECT t.id, t.title, t.description, t.due_date, s.name AS student_name, s.unique_student_id, {keys}
         FROM tasks t
         JOIN students s ON t.student_id = s.id
-        WHERE t.status = 'pending'
-        ORDER BY t.due_date, s.name
-    ''')
-    pending_tasks = cursor.fetchall()
-    conn.close()
-    return render_template('complete_tasks.html', username=session['username'], pending_tasks=pending_tasks)
-
+        WHERE t.status = 'pending' {filter}
+    ''', (), PENDING_TASK_SORTS, **page_args(PENDING_TASK_SORTS, 'due_date'))
+    return render_template('complete_tasks.html', username=session['username'], pending_tasks=page['rows'], page=page)
+
+@app.route('/admin/complete-tasks/bulk', methods=['POST'])
+def admin_grade_tasks_bulk():
+    """Bulk grading: a JSON list of {"task_id", "mark", "status"} objects (or {"grades": [...]}),
+    or a CSV/NDJSON body or upload with those columns. Returns grade_tasks()'s per-row summary."""
+    if not is_admin_logged_in():
+        return jsonify({'error': 'unauthorized'}), 401
+    upload = request.files.get('file')
+    try:
+        if request.is_json:
+            payload = request.get_json(silent=True)
+            grades = payload.get('grades') if isinstance(payload, dict) else payload
+            if not isinstance(grades, list):
+                raise ValueError('Expected a JSON list of grades or {"grades": [...]}')
+            records = list(enumerate(grades, start=1))
+        else:
+            fmt = (request.form.get('format') or import_format_for(upload.filename, upload.mimetype) if upload
+                   else request.args.get('format') or import_format_for(mimetype=request.mimetype))
+            if fmt not in IMPORT_FORMATS:
+                raise ValueError('Send JSON, or a CSV/NDJSON body or .csv/.ndjson upload.')
+            records = iter_import_records(upload.stream if upload else request.stream, fmt)
+            records = list(itertools.islice(records, GRADING_MAX_ROWS + 1))
+        if len(records) > GRADING_MAX_ROWS:
+            return jsonify({'error': f'At most {GRADING_MAX_ROWS} rows per request'}), 413
+        return jsonify(grade_tasks(get_db(), records))
+    except ValueError as e: # Includes UnicodeDecodeError for non UTF-8 bodies
+        return jsonify({'error': str(e)}), 400
 
 @app.route('/student/dashboard')
 def intern_dashboard():
     if not is_intern_logged_in():
         return redirect(url_for('login'))
 
-    conn = sqlite3.connect(DATABASE)
+    conn = get_db()
     cursor = conn.cursor()
     
-    # Get the student_id associated with the logged-in intern's user_id
-    cursor.execute("SELECT id, name, email FROM students WHERE user_id = ?", (session['user_id'],))
-    student_data_row = cursor.fetchone()
+    # Get the student associated with the logged-in intern's user_id
+    student = lookup_student(user_id=session['user_id'], conn=conn)
     
     assigned_tasks = []
     suggested_courses = []
     today_attendance_status = "Not Recorded"
     overall_performance_data = {'overall_score': 0, 'category': 'N/A'}
+    model_prediction = None
     student_profile_data = {} # To hold profile details
 
-    if student_data_row:
-        current_student_db_id = student_data_row[0]
+    if student:
+        current_student_db_id = student.id
         student_profile_data = {
             'id': current_student_db_id, # Use actual DB ID here for consistency
-            'name': student_data_row[1],
-            'email': student_data_row[2]
+            'name': student.name,
+            'email': student.email
         }
         
         # Fetch assigned tasks for the intern
@@ -992,9 +4210,14 @@ def intern_dashboard():
             today_attendance_status = attendance_result[0]
 
         # Calculate overall performance score and breakdown
-        overall_performance_data = calculate_overall_performance_score(current_student_db_id)
+        overall_performance_data = calculate_student_performance(current_student_db_id, conn)
+
+        # RandomForest prediction (see FlatForest); the page still works without the model
+        try:
+            model_prediction = cached_student_prediction(current_student_db_id, conn)
+        except (OSError, ImportError) as e:
+            app.logger.warning('Performance model unavailable: %s', e)
         
-    conn.close()
     return render_template('intern_dashboard.html', 
                            username=session['username'], 
                            tasks=assigned_tasks,
@@ -1002,6 +4225,7 @@ def intern_dashboard():
                            today_attendance_status=today_attendance_status,
                            predicted_performance=overall_performance_data['category'], # Pass category for card
                            overall_score=overall_performance_data['overall_score'], # Pass score for progress bar
+                           model_prediction=model_prediction[0] if model_prediction else None,
                            student_profile_data=student_profile_data)
 
 # --- Student-specific Routes for Navigation ---
@@ -1011,16 +4235,14 @@ def intern_tasks():
     if not is_intern_logged_in():
         return redirect(url_for('login'))
     
-    conn = sqlite3.connect(DATABASE)
+    conn = get_db()
     cursor = conn.cursor()
-    cursor.execute("SELECT id FROM students WHERE user_id = ?", (session['user_id'],))
-    student_id_row = cursor.fetchone()
+    student = lookup_student(user_id=session['user_id'], conn=conn)
     tasks = []
-    if student_id_row:
-        current_student_db_id = student_id_row[0]
+    if student:
+        current_student_db_id = student.id
         cursor.execute("SELECT title, description, due_date, status, mark FROM tasks WHERE student_id = ? ORDER BY due_date", (current_student_db_id,))
         tasks = cursor.fetchall()
-    conn.close()
     return render_template('intern_tasks.html', username=session['username'], tasks=tasks)
 
 @app.route('/student/attendance')
@@ -1028,17 +4250,15 @@ def intern_attendance():
     if not is_intern_logged_in():
         return redirect(url_for('login'))
     
-    conn = sqlite3.connect(DATABASE)
+    conn = get_db()
     cursor = conn.cursor()
-    cursor.execute("SELECT id FROM students WHERE user_id = ?", (session['user_id'],))
-    student_id_row = cursor.fetchone()
+    student = lookup_student(user_id=session['user_id'], conn=conn)
     attendance_records = []
-    if student_id_row:
-        current_student_db_id = student_id_row[0]
+    if student:
+        current_student_db_id = student.id
         # Fetch all attendance records for the student
         cursor.execute("SELECT date, status FROM attendance WHERE student_id = ? ORDER BY date DESC", (current_student_db_id,))
         attendance_records = cursor.fetchall()
-    conn.close()
     return render_template('intern_attendance.html', username=session['username'], attendance_records=attendance_records)
 
 @app.route('/student/courses')
@@ -1046,11 +4266,10 @@ def intern_courses():
     if not is_intern_logged_in():
         return redirect(url_for('login'))
     
-    conn = sqlite3.connect(DATABASE)
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute("SELECT name FROM courses ORDER BY name")
     suggested_courses = [row[0] for row in cursor.fetchall()]
-    conn.close()
     return render_template('intern_courses.html', username=session['username'], suggested_courses=suggested_courses)
 
 @app.route('/student/performance') # This is now the factor-wise analysis page for the intern
@@ -1058,35 +4277,51 @@ def intern_performance():
     if not is_intern_logged_in():
         return redirect(url_for('login'))
     
-    conn = sqlite3.connect(DATABASE)
+    conn = get_db()
     cursor = conn.cursor()
-    cursor.execute("SELECT id FROM students WHERE user_id = ?", (session['user_id'],))
-    student_id_row = cursor.fetchone()
+    student = lookup_student(user_id=session['user_id'], conn=conn)
     
     performance_data = None
     average_task_mark = 0.0 # Initialize
-    if student_id_row:
-        current_student_db_id = student_id_row[0]
-        performance_data = calculate_overall_performance_score(current_student_db_id)
-        average_task_mark = calculate_average_task_mark(current_student_db_id)
+    window_scores = [] # (label, date range, performance) for the recent-performance table
+    history = [] # Nightly snapshots, oldest first
+    date_from = request.args.get('date_from') or None
+    date_to = request.args.get('date_to') or None
+    if student:
+        current_student_db_id = student.id
+        performance_data = calculate_student_performance(current_student_db_id, conn)
+        average_task_mark = performance_data['breakdown']['task_mark']['value']
+
+        for label in SCORE_WINDOWS:
+            bounds = score_window_bounds(label)
+            window_scores.append((f'Last {SCORE_WINDOWS[label]} days', ' to '.join(bounds),
+                                  calculate_student_performance(current_student_db_id, conn, bounds)))
+        if date_from or date_to:
+            try:
+                bounds = score_window_bounds(date_from=date_from, date_to=date_to)
+                window_scores.append(('Custom range', f"{date_from or 'start'} to {date_to or 'latest'}",
+                                      calculate_student_performance(current_student_db_id, conn, bounds)))
+            except ValueError as e:
+                flash(f'Invalid date range: {e}', 'error')
+        history = load_performance_history(conn, current_student_db_id, limit=30)
         
-    conn.close()
     return render_template('intern_performance.html', 
                            username=session['username'], 
                            performance_data=performance_data,
-                           average_task_mark=round(average_task_mark, 2)) # Pass average task mark
+                           average_task_mark=round(average_task_mark, 2), # Pass average task mark
+                           window_scores=window_scores, date_from=date_from, date_to=date_to,
+                           history=history)
 
 @app.route('/student/profile')
 def intern_profile():
     if not is_intern_logged_in():
         return redirect(url_for('login'))
     
-    conn = sqlite3.connect(DATABASE)
+    conn = get_db()
     cursor = conn.cursor()
     # Fetch student's profile details
     cursor.execute("SELECT s.unique_student_id, s.name, s.email, c.name FROM students s LEFT JOIN courses c ON s.course_id = c.id WHERE s.user_id = ?", (session['user_id'],))
     profile_data = cursor.fetchone()
-    conn.close()
 
     student_profile = {}
     if profile_data:
@@ -1098,35 +4333,36 @@ def intern_profile():
         }
     return render_template('intern_profile.html', username=session['username'], student_profile=student_profile)
 
+INTERN_FEEDBACK_SORTS = {'date': ('f.feedback_date', 'f.id')}
+
 @app.route('/student/feedback') # This is for admin-to-student feedback
 def intern_feedback():
     if not is_intern_logged_in():
         return redirect(url_for('login'))
     
-    conn = sqlite3.connect(DATABASE)
+    conn = get_db()
     cursor = conn.cursor()
-    cursor.execute("SELECT id FROM students WHERE user_id = ?", (session['user_id'],))
-    student_id_row = cursor.fetchone()
+    student = lookup_student(user_id=session['user_id'], conn=conn)
     feedback_records = []
-    if student_id_row:
-        current_student_db_id = student_id_row[0]
-        cursor.execute('''
-            SELECT f.comments, f.score, f.feedback_date, t.title AS task_title, u.username AS admin_username, f.id AS feedback_id, f.feedback_category
+    page = None
+    if student:
+        current_student_db_id = student.id
+        page = fetch_keyset_page(cursor, '''
+            SELECT f.comments, f.score, f.feedback_date, t.title AS task_title, u.username AS admin_username, f.id AS feedback_id, f.feedback_category, {keys}
             FROM feedback f
             LEFT JOIN tasks t ON f.task_id = t.id
             JOIN users u ON f.admin_id = u.id
-            WHERE f.student_id = ? ORDER BY f.feedback_date DESC
-        ''', (current_student_db_id,))
-        feedback_records = cursor.fetchall()
-    conn.close()
-    return render_template('intern_feedback.html', username=session['username'], feedback_records=feedback_records)
+            WHERE f.student_id = ? {filter}
+        ''', (current_student_db_id,), INTERN_FEEDBACK_SORTS, **page_args(INTERN_FEEDBACK_SORTS, 'date', 'desc'))
+        feedback_records = page['rows']
+    return render_template('intern_feedback.html', username=session['username'], feedback_records=feedback_records, page=page)
 
 @app.route('/student/send-feedback', methods=['GET', 'POST'])
 def intern_send_feedback():
     if not is_intern_logged_in():
         return redirect(url_for('login'))
     
-    conn = sqlite3.connect(DATABASE)
+    conn = get_db()
     cursor = conn.cursor()
 
     if request.method == 'POST':
@@ -1134,10 +4370,9 @@ def intern_send_feedback():
         message = request.form['message']
         student_id = None
         
-        cursor.execute("SELECT id FROM students WHERE user_id = ?", (session['user_id'],))
-        student_id_row = cursor.fetchone()
-        if student_id_row:
-            student_id = student_id_row[0]
+        student = lookup_student(user_id=session['user_id'], conn=conn)
+        if student:
+            student_id = student.id
         
         if student_id:
             try:
@@ -1152,10 +4387,8 @@ def intern_send_feedback():
                 flash(f'An error occurred while sending feedback: {e}', 'error')
         else:
             flash('Could not find your student profile. Please contact support.', 'error')
-        conn.close()
         return redirect(url_for('intern_send_feedback'))
 
-    conn.close()
     return render_template('intern_send_feedback.html', username=session['username'])
 
 
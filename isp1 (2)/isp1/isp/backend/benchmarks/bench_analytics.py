@@ -0,0 +1,94 @@
+"""Writer latency while reports run, with and without the analytics read path.
+
+Builds a synthetic database (see synthetic_data.py), then for each mode runs --writers
+threads grading small batches of tasks through /admin/complete-tasks/bulk while --readers
+threads load the performance overview and the attendance export, and reports the grading
+requests' latency, time in write statements/commits and time waiting for a connection, from
+the same per-endpoint metrics /admin/metrics serves. Modes: 'shared' (ANALYTICS_READS off,
+reports use the writers' pool), 'analytics' (read-only pool on the live file) and 'replica'
+(read-only pool on a backup copy).
+
+    python benchmarks/bench_analytics.py --students 2000 --readers 20 --seconds 20
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+import synthetic_data # Changes into a scratch directory before importing app
+from synthetic_data import app
+
+WRITER_ENDPOINT = 'admin_grade_tasks_bulk'
+REPORT_URLS = ('/admin/performance', '/admin/export/attendance')
+
+def admin_client():
+    client = app.app.test_client()
+    with client.session_transaction() as session:
+        session.update(user_id=1, username='admin', role='admin')
+    return client
+
+def run_mode(seconds, readers, writers, batch, task_ids):
+    app.reset_request_metrics()
+    stop = threading.Event()
+    reports = [0]
+
+    def read():
+        client = admin_client()
+        while not stop.is_set():
+            for url in REPORT_URLS:
+                client.get(url).get_data()
+                reports[0] += 1
+
+    def write(seed):
+        client, rng = admin_client(), random.Random(seed)
+        while not stop.is_set():
+            grades = [{'task_id': task_id, 'mark': round(rng.uniform(0, 100), 1)}
+                      for task_id in rng.sample(task_ids, batch)]
+            response = client.post('/admin/complete-tasks/bulk', json=grades)
+            if response.status_code != 200:
+                raise RuntimeError(f'grading returned {response.status_code}')
+
+    threads = [threading.Thread(target=read) for _ in range(readers)]
+    threads += [threading.Thread(target=write, args=(n,)) for n in range(writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    metrics = app._endpoint_metrics[WRITER_ENDPOINT]
+    def quantiles(attr):
+        values = sorted(metrics.samples[attr])
+        return ' '.join(f'{app._quantile(values, q) * 1000:8.1f}' for q in (0.5, 0.95))
+    return (f'{metrics.count:6d} gradings {reports[0]:5d} reports | latency p50/p95 {quantiles("duration")} ms | '
+            f'writes {quantiles("write_time")} ms | connection wait {quantiles("db_wait")} ms')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=2000)
+    parser.add_argument('--days', type=int, default=120)
+    parser.add_argument('--readers', type=int, default=20, help=f'report threads (the shared pool has {app.DB_POOL_SIZE} connections)')
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--batch', type=int, default=20, help='tasks graded per request')
+    parser.add_argument('--seconds', type=float, default=20)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    database = os.path.join(directory, 'bench_analytics.db')
+    synthetic_data.generate(database, students=args.students, days=args.days)
+    app.DATABASE = database
+    app.REQUEST_BUDGET_MS = app.REQUEST_QUERY_BUDGET = 0
+    task_ids = [row[0] for row in app.open_db_connection(database).execute('SELECT id FROM tasks')]
+
+    modes = {'shared': (False, None), 'analytics': (True, None), 'replica': (True, os.path.join(directory, 'replica.db'))}
+    for mode, (analytics_reads, replica) in modes.items():
+        app.ANALYTICS_READS, app.ANALYTICS_REPLICA = analytics_reads, replica
+        if replica:
+            app.refresh_analytics_replica()
+        print(f'{mode:<10} {run_mode(args.seconds, args.readers, args.writers, args.batch, task_ids)}')
+
+if __name__ == '__main__':
+    main()
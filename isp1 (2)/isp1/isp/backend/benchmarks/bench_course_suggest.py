@@ -0,0 +1,76 @@
+"""Latency of the in-memory course autocomplete index vs the old LIKE '%q%' query.
+
+Builds --courses synthetic course names in a scratch SQLite database, checks that the
+index returns the same matches as LIKE (prefix matches ranked first), then times both
+for a mix of short, long, prefix, substring and no-match queries.
+
+    python benchmarks/bench_course_suggest.py --courses 100000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(tempfile.mkdtemp()) # Importing app initialises database.db in the working directory
+
+import app # noqa: E402
+
+WORDS = ('Intro', 'Advanced', 'Applied', 'Data', 'Web', 'Machine', 'Learning', 'Python', 'Flask',
+         'Systems', 'Networks', 'Design', 'Cloud', 'Security', 'Analytics', 'Statistics', 'Mobile')
+QUERIES = ('p', 'da', 'web', 'Machine Le', 'learning', 'ics 4', 'sec', 'zzz', 'ytho', 'a')
+
+def course_names(count, rng):
+    return [f"{' '.join(rng.sample(WORDS, rng.randint(1, 3)))} {number}" for number in range(count)]
+
+def like_suggestions(conn, query):
+    rows = conn.execute("SELECT name FROM courses WHERE LOWER(name) LIKE ? ORDER BY name",
+                        (f'%{query.lower()}%',)).fetchall()
+    names = [row[0] for row in rows]
+    # Same ranking as the index: prefix matches, then substring matches, by lowercased name
+    names.sort(key=lambda name: (not name.lower().startswith(query.lower()), name.lower()))
+    return names[:app.COURSE_SUGGESTION_LIMIT]
+
+def percentiles_us(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1e6)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--courses', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=200, help='timed lookups per query')
+    args = parser.parse_args()
+
+    names = course_names(args.courses, random.Random(42))
+    conn = sqlite3.connect(':memory:')
+    conn.execute("CREATE TABLE courses (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL)")
+    conn.executemany("INSERT INTO courses (name) VALUES (?)", [(name,) for name in names])
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    index = app.CourseNameIndex(names)
+    build_ms = (time.perf_counter() - started) * 1000
+    memory_mb = tracemalloc.get_traced_memory()[0] / 1e6
+    tracemalloc.stop()
+    print(f"build: {build_ms:.0f} ms, {memory_mb:.1f} MB for {len(index)} courses")
+
+    print(f"{'query':>12} {'LIKE p50 us':>12} {'index p50 us':>13} {'index p99 us':>13}  same")
+    for query in QUERIES:
+        same = index.suggest(query) == like_suggestions(conn, query)
+        like_p50, _ = percentiles_us(lambda: like_suggestions(conn, query), max(3, args.repeat // 20))
+        index_p50, index_p99 = percentiles_us(lambda: index.suggest(query), args.repeat)
+        print(f"{query!r:>12} {like_p50:>12.0f} {index_p50:>13.1f} {index_p99:>13.1f}  {same}")
+
+if __name__ == '__main__':
+    main()
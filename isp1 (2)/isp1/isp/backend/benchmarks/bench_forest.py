@@ -0,0 +1,66 @@
+"""Latency of FlatForest vs scikit-learn's predict_proba on performance_model.pkl.
+
+Checks that both produce identical probabilities, then times each for batch sizes 1,
+100 and 10,000 on random feature rows drawn from the model's input ranges.
+
+    python benchmarks/bench_forest.py --repeat 50
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(tempfile.mkdtemp()) # Importing app initialises database.db in the working directory
+warnings.filterwarnings('ignore') # sklearn version/feature-name warnings are not what we measure
+
+import app # noqa: E402
+
+app.MODEL_POINTER = os.path.join(os.getcwd(), 'no-model.json') # Always the bundled model, whatever `flask train-model` activated
+
+BATCH_SIZES = (1, 100, 10_000)
+
+def random_features(rng, rows):
+    return np.column_stack([
+        rng.random(rows), # attendance_rate
+        rng.random(rows), # task_mark_ratio
+        rng.choice([0.0, 1.0, 2.0, 3.0, 4.0, 5.0], rows) + rng.random(rows) * 0.5, # behaviour_rating
+    ])
+
+def median_ms(fn, X, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(X)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=30, help='timed calls per batch size')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    model = app.get_performance_model()
+    forest = app.get_forest_evaluator()
+    print(f"load + compile: {(time.perf_counter() - started) * 1000:.1f} ms "
+          f"({len(forest.roots)} trees, {len(forest.feature)} nodes, depth {forest.max_depth})")
+
+    rng = np.random.default_rng(42)
+    print(f"{'batch':>8} {'sklearn ms':>12} {'flat ms':>10} {'speedup':>8}  exact")
+    for rows in BATCH_SIZES:
+        X = random_features(rng, rows)
+        exact = np.array_equal(model.predict_proba(X), forest.predict_proba(X))
+        repeat = max(3, args.repeat // (10 if rows >= 10_000 else 1))
+        sklearn_ms = median_ms(model.predict_proba, X, repeat)
+        flat_ms = median_ms(forest.predict_proba, X, repeat)
+        print(f"{rows:>8} {sklearn_ms:>12.3f} {flat_ms:>10.3f} {sklearn_ms / flat_ms:>7.1f}x  {exact}")
+
+if __name__ == '__main__':
+    main()
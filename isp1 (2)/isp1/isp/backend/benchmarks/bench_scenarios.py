@@ -0,0 +1,80 @@
+"""What-if scoring of many weight profiles across a synthetic student body.
+
+Builds a synthetic database (see synthetic_data.py), generates --profiles random weight
+profiles and times score_weight_profiles(): the metric matrix load plus one matrix product
+for all profiles. Also times the scalar alternative -- every profile re-scored student by
+student -- on a sample, extrapolated to the full run.
+
+    python benchmarks/bench_scenarios.py --students 10000 --profiles 50
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+import synthetic_data # Changes into a scratch directory before importing app
+from synthetic_data import app
+
+def random_profiles(count, rng):
+    profiles = []
+    for n in range(count):
+        weights = rng.dirichlet(np.ones(len(app.METRIC_NAMES)))
+        weights[-1] = 1 - weights[:-1].sum() # Make the sum exactly 1 after rounding
+        average = float(rng.uniform(40, 60))
+        profiles.append(app.validate_weight_profile({
+            'name': f'profile{n}',
+            'weights': dict(zip(app.METRIC_NAMES, weights.tolist())),
+            'thresholds': {'Excellent': average + 35, 'Good': average + 20, 'Average': average},
+        }))
+    return profiles
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=10_000)
+    parser.add_argument('--days', type=int, default=30, help='attendance days per student (doesn\'t affect scoring cost)')
+    parser.add_argument('--profiles', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    database = os.path.join(tempfile.mkdtemp(), 'bench_scenarios.db')
+    synthetic_data.generate(database, students=args.students, days=args.days)
+    app.DATABASE = database
+    profiles = random_profiles(args.profiles, np.random.default_rng(7))
+
+    with app.app.app_context():
+        conn = app.get_db()
+        samples = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            result = app.score_weight_profiles(profiles, conn)
+            samples.append((time.perf_counter() - started) * 1000)
+        ids, matrix = app.calculate_metric_matrix(conn=conn)
+
+    matmul = []
+    weights = np.array([[profile['weights'][metric] for profile in profiles] for metric in app.METRIC_NAMES])
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        np.clip(matrix @ weights, 0, 100)
+        matmul.append((time.perf_counter() - started) * 1000)
+
+    sample = min(500, len(ids))
+    started = time.perf_counter()
+    for profile in profiles:
+        for row in range(sample):
+            score = max(0, min(100, sum(matrix[row, col] * profile['weights'][metric]
+                                        for col, metric in enumerate(app.METRIC_NAMES))))
+            app.get_performance_category(score, profile['thresholds'])
+    scalar_ms = (time.perf_counter() - started) * 1000 * len(ids) / max(sample, 1)
+
+    changed = statistics.mean(profile['changed'] for profile in result['profiles'])
+    print(f"{result['students']} students x {args.profiles} profiles")
+    print(f"score_weight_profiles: {statistics.median(samples):8.1f} ms median, {min(samples):.1f} ms min "
+          f"(matrix product alone {statistics.median(matmul):.2f} ms)")
+    print(f"scalar loop (extrapolated): {scalar_ms:8.0f} ms")
+    print(f"students changing category per profile: {changed:.0f} on average")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Latency of the FTS5 search over a synthetic corpus of intern messages and feedback.
+
+Creates a scratch database through the app's migrations, inserts --messages intern
+messages and as many feedback comments (indexed by the FTS triggers as they go), then
+times search_messages() for common, rare, prefix, multi-word and filtered queries and
+compares against a LIKE '%term%' scan.
+
+    python benchmarks/bench_search.py --messages 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(tempfile.mkdtemp()) # Importing app initialises database.db in the working directory
+
+import app # noqa: E402
+
+STUDENTS = 2000
+BATCH = 10_000
+COMMON = ('task', 'deadline', 'help', 'project', 'meeting', 'report', 'question', 'review', 'update', 'submit')
+FILLER = ('please', 'could', 'the', 'for', 'about', 'with', 'this', 'week', 'team', 'work', 'again', 'thanks')
+RARE = tuple(f'module{n}' for n in range(500)) # Each appears in ~1/500 of the documents
+QUERIES = (
+    ('common word', 'deadline', {}),
+    ('rare word', 'module137', {}),
+    ('prefix', 'dead*', {}),
+    ('two words', 'project review', {}),
+    ('student filter', 'meeting', {'student': 'BENCH0042'}),
+    ('date filter', 'report', {'date_from': '2024-06-01', 'date_to': '2024-06-07'}),
+    ('no match', 'xylophone', {}),
+)
+
+def sentence(rng):
+    words = [rng.choice(FILLER) for _ in range(rng.randint(6, 14))]
+    words[rng.randrange(len(words))] = rng.choice(COMMON)
+    if rng.random() < 0.3:
+        words[rng.randrange(len(words))] = rng.choice(RARE)
+    return ' '.join(words)
+
+def populate(conn, count, rng):
+    conn.executemany("INSERT INTO users (username, password, role) VALUES (?, 'x', 'intern')",
+                     [(f'BENCH{n:04d}',) for n in range(STUDENTS)])
+    conn.executemany('''
+        INSERT INTO students (unique_student_id, name, email, user_id)
+        SELECT username, username, username || '@example.com', id FROM users WHERE username = ?
+    ''', [(f'BENCH{n:04d}',) for n in range(STUDENTS)])
+    conn.commit()
+    for start in range(0, count, BATCH):
+        size = min(BATCH, count - start)
+        conn.executemany(
+            "INSERT INTO student_feedback_to_admin (student_id, subject, message, timestamp) VALUES (?, ?, ?, ?)",
+            [(rng.randint(1, STUDENTS), sentence(rng)[:40], sentence(rng),
+              f'2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} 10:00:00') for _ in range(size)])
+        conn.executemany(
+            "INSERT INTO feedback (student_id, admin_id, comments, feedback_date, feedback_category) VALUES (?, 1, ?, ?, 'Good')",
+            [(rng.randint(1, STUDENTS), sentence(rng), f'2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}')
+             for _ in range(size)])
+        conn.commit()
+
+def timings_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[max(int(len(samples) * 0.99) - 1, 0)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=1_000_000, help='intern messages (and feedback rows) to insert')
+    parser.add_argument('--repeat', type=int, default=50, help='timed searches per query')
+    args = parser.parse_args()
+
+    app.DATABASE = 'bench_search.db'
+    app.init_db()
+    conn = app.open_db_connection()
+    started = time.perf_counter()
+    populate(conn, args.messages, random.Random(42))
+    elapsed = time.perf_counter() - started
+    print(f"inserted {2 * args.messages} indexed rows in {elapsed:.1f}s ({2 * args.messages / elapsed:.0f} rows/s)")
+
+    print(f"{'query':>15} {'hits':>5} {'p50 ms':>8} {'p99 ms':>8} {'LIKE ms':>8}")
+    for label, text, filters in QUERIES:
+        hits = len(app.search_messages(conn, text, **filters))
+        p50, p99 = timings_ms(lambda: app.search_messages(conn, text, **filters), args.repeat)
+        like_ms, _ = timings_ms(lambda: conn.execute(
+            "SELECT id FROM student_feedback_to_admin WHERE message LIKE ? LIMIT 50", (f"%{text.rstrip('*')}%",)).fetchall(), 3)
+        print(f"{label:>15} {hits:>5} {p50:>8.2f} {p99:>8.2f} {like_ms:>8.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Cold start benchmark for app.py.
+
+Imports the app in fresh interpreter processes against a throwaway database and reports
+how long the import takes: once for a brand new database (schema migrations run) and
+then repeatedly for an up-to-date one (the path every worker takes on start-up).
+
+    python benchmarks/bench_startup.py --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs inside the child process; prints one JSON line with the measurements
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter() - started
+print(json.dumps({'import_seconds': imported, 'numpy_loaded': 'numpy' in sys.modules}))
+'''
+
+SEED_PROBE = '''
+import json, time
+import app
+started = time.perf_counter()
+with app.app.app_context():
+    app.seed_db(app.get_db())
+print(json.dumps({'seed_seconds': time.perf_counter() - started}))
+'''
+
+def run_probe(code, workdir):
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    result = subprocess.run([sys.executable, '-c', code], cwd=workdir, env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10, help='warm start samples (default 10)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        first = run_probe(PROBE, workdir)
+        seed = run_probe(SEED_PROBE, workdir)
+        warm = [run_probe(PROBE, workdir) for _ in range(args.runs)]
+
+    warm_times = [sample['import_seconds'] * 1000 for sample in warm]
+    print(f"new database (migrations): {first['import_seconds'] * 1000:8.1f} ms")
+    print(f"flask seed:                {seed['seed_seconds'] * 1000:8.1f} ms")
+    print(f"up-to-date database:       {statistics.median(warm_times):8.1f} ms median, "
+          f"{min(warm_times):.1f} ms min, {max(warm_times):.1f} ms max over {args.runs} run(s)")
+    print(f"numpy imported at start-up: {any(sample['numpy_loaded'] for sample in warm)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""Regression benchmark suite: every calculate_* helper and every admin/intern page.
+
+Generates a synthetic database (see synthetic_data.py), or reuses one given with --database,
+then times each calculate_* function in app.py and each GET route through the Flask test
+client, logged in as the admin or as a synthetic intern. Results are compared against a
+stored baseline: any benchmark whose median is more than --threshold slower (and at least
+--min-delta-ms slower, to ignore timer noise) is reported and the script exits with status 1,
+as it does when a benchmark that has a baseline now fails (e.g. a route stops returning 200).
+
+    python benchmarks/bench_suite.py                   # compare against baselines/bench_suite.json
+    python benchmarks/bench_suite.py --save-baseline   # record a new baseline
+    python benchmarks/bench_suite.py --filter route:admin_ --repeat 50
+
+Baselines are only comparable on the same machine with the same dataset parameters, which
+are stored alongside them and checked before comparing.
+"""
+import argparse
+import inspect
+import itertools
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from flask import url_for
+
+import synthetic_data # Changes into a scratch directory before importing app
+from synthetic_data import app
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, 'baselines', 'bench_suite.json')
+SAMPLE_STUDENTS = 50 # Per-student helpers rotate through this many students
+SKIPPED_ENDPOINTS = {'static', 'index', 'login', 'logout', 'request_metrics'}
+ROUTE_ARGS = { # Query strings for routes that need them to do real work
+    'search': {'q': 'deadline'},
+    'get_course_suggestions': {'q': 'Cou'},
+    'attendance': {'selected_date': synthetic_data.START_DATE.isoformat()},
+}
+URL_VALUES = {'export_data': [{'dataset': name} for name in app.EXPORT_QUERIES]}
+
+def timed(fn, repeat, warmup=1):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {'median_ms': statistics.median(samples), 'p95_ms': samples[max(int(len(samples) * 0.95) - 1, 0)]}
+
+def function_benchmarks(student_ids):
+    """(name, callable) for every calculate_* function, per-student ones cycling through student_ids."""
+    for name, fn in sorted(vars(app).items()):
+        if not (name.startswith('calculate_') and inspect.isfunction(fn)):
+            continue
+        first = next(iter(inspect.signature(fn).parameters), None)
+        if first == 'student_db_id':
+            ids = itertools.cycle(student_ids)
+            yield f'function:{name}', lambda fn=fn, ids=ids: fn(next(ids))
+        elif first == 'student_ids':
+            yield f'function:{name}', fn
+            yield f'function:{name}[{SAMPLE_STUDENTS}]', lambda fn=fn: fn(student_ids)
+
+def route_benchmarks(admin, intern):
+    """(name, callable) for every GET route under /admin and /student."""
+    for rule in sorted(app.app.url_map.iter_rules(), key=lambda r: r.rule):
+        if rule.endpoint in SKIPPED_ENDPOINTS or 'GET' not in rule.methods:
+            continue
+        client = admin if rule.rule.startswith('/admin') else intern
+        for values in URL_VALUES.get(rule.endpoint, [{}]):
+            with app.app.test_request_context():
+                url = url_for(rule.endpoint, **values, **ROUTE_ARGS.get(rule.endpoint, {}))
+            label = rule.endpoint + ''.join(f'[{v}]' for v in values.values())
+
+            def get(client=client, url=url):
+                response = client.get(url)
+                response.get_data() # Drain streamed responses
+                if response.status_code != 200:
+                    raise RuntimeError(f'GET {url} returned {response.status_code}')
+            yield f'route:{label}', get
+
+def logged_in_client(conn, username):
+    user_id, role = conn.execute('SELECT id, role FROM users WHERE username = ?', (username,)).fetchone()
+    client = app.app.test_client()
+    with client.session_transaction() as session:
+        session.update(user_id=user_id, username=username, role=role)
+    return client
+
+def compare(results, baseline, threshold, min_delta_ms):
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        delta = result['median_ms'] - before['median_ms']
+        if delta > min_delta_ms and result['median_ms'] > before['median_ms'] * (1 + threshold):
+            regressions.append((name, before['median_ms'], result['median_ms']))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', help='existing synthetic database to benchmark (default: generate one)')
+    parser.add_argument('--students', type=int, default=2000)
+    parser.add_argument('--days', type=int, default=120)
+    parser.add_argument('--tasks-per-student', type=int, default=synthetic_data.DEFAULTS['tasks_per_student'])
+    parser.add_argument('--repeat', type=int, default=20, help='timed calls per benchmark')
+    parser.add_argument('--filter', default='', help='only run benchmarks whose name contains this')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline JSON file')
+    parser.add_argument('--save-baseline', action='store_true', help='write the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed slowdown as a fraction (default 0.25)')
+    parser.add_argument('--min-delta-ms', type=float, default=0.05, help='ignore slowdowns smaller than this')
+    args = parser.parse_args()
+
+    params = {'students': args.students, 'days': args.days, 'tasks_per_student': args.tasks_per_student}
+    if args.database:
+        database = os.path.join(synthetic_data.INVOKED_FROM, args.database)
+        params = {'database': os.path.basename(database)}
+    else:
+        database = os.path.join(tempfile.mkdtemp(), 'bench_suite.db')
+        started = time.perf_counter()
+        counts = synthetic_data.generate(database, **params)
+        print(f"generated {sum(counts.values())} rows in {time.perf_counter() - started:.1f}s")
+    app.DATABASE = database
+    app.REQUEST_BUDGET_MS = app.REQUEST_QUERY_BUDGET = 0 # Timings are the output here, not log lines
+    app.app.logger.disabled = True # Failing routes are reported below in one line each
+
+    results, failures = {}, {}
+    with app.app.app_context():
+        conn = app.get_db()
+        student_ids = [row[0] for row in conn.execute('SELECT id FROM students ORDER BY id LIMIT ?', (SAMPLE_STUDENTS,))]
+        intern = conn.execute('SELECT u.username FROM students s JOIN users u ON u.id = s.user_id WHERE s.id = ?',
+                              (student_ids[0],)).fetchone()[0]
+        benchmarks = list(function_benchmarks(student_ids))
+        benchmarks += route_benchmarks(logged_in_client(conn, 'admin'), logged_in_client(conn, intern))
+        for name, fn in benchmarks:
+            if args.filter not in name:
+                continue
+            try:
+                results[name] = timed(fn, args.repeat)
+            except Exception as e:
+                failures[name] = f'{type(e).__name__}: {e}'
+                print(f'{name:<60} FAILED {failures[name]}')
+                continue
+            print(f"{name:<60} {results[name]['median_ms']:>9.3f} ms median {results[name]['p95_ms']:>9.3f} ms p95")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump({'params': params, 'results': results}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'baseline written to {args.baseline}')
+        return
+    if not os.path.exists(args.baseline):
+        print(f'no baseline at {args.baseline}; run with --save-baseline to create one')
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline['params'] != params:
+        sys.exit(f"baseline was recorded with {baseline['params']}, not {params}; not comparing")
+    regressions = compare(results, baseline['results'], args.threshold, args.min_delta_ms)
+    for name, before, after in regressions:
+        print(f'REGRESSION {name}: {before:.3f} ms -> {after:.3f} ms ({after / before - 1:+.0%})')
+    broken = [name for name in failures if name in baseline['results']]
+    for name in broken:
+        print(f'REGRESSION {name}: {failures[name]}')
+    if regressions or broken:
+        sys.exit(1)
+    print(f'no regressions beyond {args.threshold:.0%} against {args.baseline}')
+
+if __name__ == '__main__':
+    main()
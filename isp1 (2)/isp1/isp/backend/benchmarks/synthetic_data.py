@@ -0,0 +1,195 @@
+"""Deterministic synthetic dataset generator for benchmarks and load testing.
+
+Builds a database through the app's own migrations and fills it with students (each with
+an intern login), courses, daily attendance, tasks, admin feedback and behaviour ratings.
+Every student has a hidden ability that drives their attendance, task completion, marks,
+behaviour and feedback, so scores and predictions spread out like real data. The same
+--seed and parameters always produce the same rows.
+
+    python benchmarks/synthetic_data.py synthetic.db --students 10000 --days 300
+
+builds a 10k-student database with 3M attendance rows. Interns log in as STU000001,
+STU000002, ... with password 'internpass'; the admin account is admin/adminpass.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+INVOKED_FROM = os.getcwd()
+os.chdir(tempfile.mkdtemp()) # Importing app initialises database.db in the working directory
+
+import app # noqa: E402
+
+BATCH = 50_000 # Rows per executemany call
+BULK_TABLES = ('attendance', 'tasks', 'feedback', 'behaviour_ratings') # Indexes and triggers rebuilt after loading
+START_DATE = date(2024, 1, 1)
+FEEDBACK_CATEGORIES = ('Poor', 'Average', 'Good', 'Excellent')
+FEEDBACK_COMMENTS = {
+    'Poor': 'Missed several deadlines; please review the task notes and ask for help early.',
+    'Average': 'Steady work this week, but the reports need more detail.',
+    'Good': 'Good progress on the project and clear communication with the team.',
+    'Excellent': 'Excellent work on the review; keep helping the rest of the team.',
+}
+DEFAULTS = {
+    'students': 1000,
+    'courses': 20,
+    'days': 60,
+    'tasks_per_student': 10,
+    'feedback_density': 0.05, # Chance of an admin feedback entry on each attendance day
+    'behaviour_density': 0.1, # Chance of a behaviour rating on each attendance day
+    'seed': 42,
+}
+
+def student_code(n):
+    return f'STU{n:06d}'
+
+def _batched(rows, size=BATCH):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _insert(conn, sql, rows):
+    count = 0
+    for batch in _batched(rows):
+        conn.executemany(sql, batch)
+        count += len(batch)
+    return count
+
+def generate(database, students=DEFAULTS['students'], courses=DEFAULTS['courses'], days=DEFAULTS['days'],
+             tasks_per_student=DEFAULTS['tasks_per_student'], feedback_density=DEFAULTS['feedback_density'],
+             behaviour_density=DEFAULTS['behaviour_density'], seed=DEFAULTS['seed']):
+    """Creates `database` (which must not exist yet) and returns the row count per table."""
+    if os.path.exists(database):
+        raise FileExistsError(f'{database} already exists')
+    previous_database, app.DATABASE = app.DATABASE, database
+    try:
+        app.init_db()
+        conn = app.open_db_connection(database)
+    finally:
+        app.DATABASE = previous_database
+    # Throwaway data, so skip the journal while loading; a crash just means regenerating
+    conn.execute('PRAGMA journal_mode = OFF')
+    conn.execute('PRAGMA synchronous = OFF')
+    # Building secondary indexes and the tables the triggers maintain (full-text index, daily
+    # metrics) once at the end beats updating them row by row
+    derived = conn.execute(
+        "SELECT type, name, sql FROM sqlite_master WHERE type IN ('index', 'trigger') AND sql IS NOT NULL AND tbl_name IN (%s)"
+        % ', '.join('?' * len(BULK_TABLES)), BULK_TABLES).fetchall()
+    for kind, name, _ in derived:
+        conn.execute(f'DROP {kind.upper()} {name}')
+
+    rng = np.random.default_rng(seed)
+    ability = rng.beta(5, 2, students) # Hidden per-student ability in [0, 1]
+    student_course = rng.integers(1, courses + 1, students) # Course ids are 1..courses on a fresh database
+    dates = [(START_DATE + timedelta(days=d)).isoformat() for d in range(days)]
+    counts = {}
+
+    with conn:
+        conn.execute("INSERT INTO users (username, password, role) VALUES ('admin', 'adminpass', 'admin')")
+        admin_id = 1
+        counts['courses'] = _insert(conn, 'INSERT INTO courses (name, total_expected_tasks) VALUES (?, ?)',
+                                    ((f'Course {c:03d}', tasks_per_student) for c in range(1, courses + 1)))
+        counts['users'] = 1 + _insert(conn, "INSERT INTO users (username, password, role) VALUES (?, 'internpass', 'intern')",
+                                      ((student_code(n),) for n in range(1, students + 1)))
+        # User ids are 2..students+1 on a fresh database, student ids 1..students
+        counts['students'] = _insert(
+            conn, 'INSERT INTO students (unique_student_id, name, email, course_id, user_id) VALUES (?, ?, ?, ?, ?)',
+            ((student_code(n), f'Student {n}', f'{student_code(n).lower()}@example.com', int(student_course[n - 1]), n + 1)
+             for n in range(1, students + 1)))
+
+        # Attendance is by far the largest table, so SQLite expands each student's days from a
+        # string of 1/0 flags rather than Python building a tuple per row
+        all_dates = json.dumps(dates)
+        def attendance_rows():
+            for s in range(students):
+                present = rng.random(days) < 0.5 + 0.45 * ability[s]
+                yield s + 1, (present.astype(np.uint8) + ord('0')).tobytes().decode(), all_dates
+        _insert(conn, '''
+            INSERT INTO attendance (student_id, date, status)
+            SELECT ?, d.value, CASE substr(?2, d.key + 1, 1) WHEN '1' THEN 'present' ELSE 'absent' END
+            FROM json_each(?3) d
+        ''', attendance_rows())
+        counts['attendance'] = students * days
+
+        def task_rows():
+            for s in range(students):
+                completed = (rng.random(tasks_per_student) < ability[s]).tolist()
+                marks = np.clip(rng.normal(40 + 55 * ability[s], 10, tasks_per_student), 0, 100).round(1).tolist()
+                due = rng.integers(0, max(days, 1), tasks_per_student).tolist()
+                course_id = int(student_course[s])
+                for t in range(tasks_per_student):
+                    yield (s + 1, course_id, f'Task {t + 1}', f'Synthetic task {t + 1}',
+                           (START_DATE + timedelta(days=due[t])).isoformat(),
+                           'completed' if completed[t] else 'pending', marks[t] if completed[t] else None)
+        counts['tasks'] = _insert(
+            conn, 'INSERT INTO tasks (student_id, course_id, title, description, due_date, status, mark) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            task_rows())
+
+        def feedback_rows():
+            for s in range(students):
+                feedback_days = np.flatnonzero(rng.random(days) < feedback_density)
+                levels = np.clip(ability[s] * 4 + rng.normal(0, 0.6, len(feedback_days)), 0, 3).astype(int)
+                for d, level in zip(feedback_days.tolist(), levels.tolist()):
+                    category = FEEDBACK_CATEGORIES[level]
+                    yield s + 1, admin_id, level * 3 + 1, FEEDBACK_COMMENTS[category], dates[d], category
+        counts['feedback'] = _insert(
+            conn, 'INSERT INTO feedback (student_id, admin_id, score, comments, feedback_date, feedback_category) VALUES (?, ?, ?, ?, ?, ?)',
+            feedback_rows())
+
+        def behaviour_rows():
+            for s in range(students):
+                rated_days = np.flatnonzero(rng.random(days) < behaviour_density)
+                ratings = np.clip(np.rint(1 + 4 * ability[s] + rng.normal(0, 0.7, len(rated_days))), 1, 5).astype(int)
+                for d, rating in zip(rated_days.tolist(), ratings.tolist()):
+                    yield s + 1, dates[d], rating, admin_id
+        counts['behaviour_ratings'] = _insert(
+            conn, 'INSERT INTO behaviour_ratings (student_id, date, rating, admin_id) VALUES (?, ?, ?, ?)',
+            behaviour_rows())
+
+        for _, _, sql in derived:
+            conn.execute(sql)
+        app.rebuild_student_metrics(conn, commit=False)
+        app.rebuild_student_daily_metrics(conn, commit=False)
+    app.rebuild_search_index(conn)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA optimize')
+    conn.close()
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('database', help='path of the database to create')
+    parser.add_argument('--students', type=int, default=DEFAULTS['students'])
+    parser.add_argument('--courses', type=int, default=DEFAULTS['courses'])
+    parser.add_argument('--days', type=int, default=DEFAULTS['days'], help='attendance days per student')
+    parser.add_argument('--tasks-per-student', type=int, default=DEFAULTS['tasks_per_student'])
+    parser.add_argument('--feedback-density', type=float, default=DEFAULTS['feedback_density'],
+                        help='chance of a feedback entry per student per day')
+    parser.add_argument('--behaviour-density', type=float, default=DEFAULTS['behaviour_density'],
+                        help='chance of a behaviour rating per student per day')
+    parser.add_argument('--seed', type=int, default=DEFAULTS['seed'])
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    counts = generate(os.path.join(INVOKED_FROM, args.database), args.students, args.courses, args.days, args.tasks_per_student,
+                      args.feedback_density, args.behaviour_density, args.seed)
+    elapsed = time.perf_counter() - started
+    total = sum(counts.values())
+    print(', '.join(f'{table}: {count}' for table, count in counts.items()))
+    print(f'{total} rows in {elapsed:.1f}s ({total / elapsed:.0f} rows/s)')
+
+if __name__ == '__main__':
+    main()